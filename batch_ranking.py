@@ -0,0 +1,181 @@
+"""
+Batched scoring of queue backlogs.
+
+After downtime, or in the "past" scan scope, hundreds of projects wait in the
+work queue. Ranking them one by one sends the full company context with every
+single project. In backlog mode one request carries up to ``batch_size``
+compact project summaries and returns only a JSON array of scores:
+
+    {"rankings": [{"id": "39012345", "score": 12}, ...]}
+
+Projects that score clearly below the limit get their ranking written straight
+into the ranking cache, so the queue loop finds a cache hit when it gets to
+them. Projects close to or above the limit are left alone and ranked
+individually as usual, with explanation and bid teaser. The same applies to
+projects the batch response is missing, or has no valid score for.
+
+Both ProjectRankers provide what rank_batch() needs: client, cache,
+ranking_versions(), versions, duplicates, tokens, parse_stats, prompt_context,
+batch_prefix(), batch_model and score_limit.
+"""
+import time
+from typing import Dict, List, Optional
+
+import ranking_cache
+import structured_output
+import token_budget
+
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rankings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "score": {"type": "integer"}
+                },
+                "required": ["id", "score"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["rankings"],
+    "additionalProperties": False
+}
+
+# Appended to the normal ranking instructions, the scoring criteria stay the same
+BATCH_INSTRUCTIONS = """Batch Request
+
+This request contains several projects at once, each starting with "### Project <id>".
+Score every project on its own with the criteria above (0-100). Instead of the single-project
+response format, do not write explanations or bid teasers and return only this JSON, with one
+entry per project:
+{"rankings": [{"id": "<id>", "score": <int between 0-100>}]}"""
+
+def summarize(project_data: Dict, description_tokens: int = 300, model: str = 'gpt-4o-mini') -> str:
+    """Compact project summary for a batch prompt"""
+    project_id = project_data.get('project_id') or project_data.get('id')
+    skills = ', '.join(skill.get('name', '') for skill in project_data.get('jobs', []))
+    description = token_budget.condense(project_data.get('description') or '', description_tokens, model)
+    return (f"### Project {project_id}\n"
+            f"Title: {project_data.get('title', '')}\n"
+            f"Country: {project_data.get('country', 'Unknown')}\n"
+            f"Skills: {skills}\n"
+            f"Description: {description}")
+
+def rank_batch(ranker, projects: List[Dict], band: int = 15, description_tokens: int = 300) -> Dict[str, int]:
+    """
+    Score projects in one request and cache the rankings of the clear misses
+
+    Args:
+        ranker: bidder.ProjectRanker or freelancer_api.ProjectRanker
+        projects: project_data dicts as passed to rank_project()
+        band: Scores within this many points below the score limit are left for individual ranking
+        description_tokens: Token budget per description in the batch prompt
+
+    Returns:
+        Dict with the number of projects 'sent', 'cached' (clear misses) and 'individual'
+        (left for the normal ranking: close to the limit, missing or invalid)
+    """
+    pending = {}
+    for project_data in projects:
+        project_id = str(project_data.get('project_id') or project_data.get('id'))
+        versions = ranker.ranking_versions(project_data)
+        cache_key = ranking_cache.ranking_cache_key(project_id, versions)
+        # Cached rankings and reposts are handled by rank_project() without an LLM call anyway
+        if ranker.cache.get('openai', cache_key):
+            continue
+        if ranker.duplicates and ranker.duplicates.find(project_data, versions[1:]):
+            continue
+        pending[project_id] = (project_data, versions, cache_key)
+    if len(pending) < 2:
+        return {'sent': 0, 'cached': 0, 'individual': len(pending)}
+
+    messages = [
+        *ranker.prompt_context.prefix('ranking_batch', ranker.batch_prefix),
+        {"role": "user", "content": '\n\n'.join(summarize(project_data, description_tokens, ranker.batch_model)
+                                                for project_data, _, _ in pending.values())}
+    ]
+    started = time.monotonic()
+    try:
+        response = ranker.client.chat.completions.create(
+            model=ranker.batch_model,
+            messages=messages,
+            response_format=structured_output.response_format('project_batch_ranking', BATCH_SCHEMA),
+            temperature=0.7,
+            max_tokens=20 * len(pending) + 50,
+            timeout=120
+        )
+    except Exception as e:
+        print(f"⚠️ Batch ranking failed, ranking {len(pending)} project(s) individually: {str(e)}")
+        return {'sent': len(pending), 'cached': 0, 'individual': len(pending)}
+    seconds = time.monotonic() - started
+    ranker.tokens.record(','.join(pending), ranker.batch_model, messages, response, kind='ranking_batch',
+                         seconds=seconds)
+
+    try:
+        parsed = structured_output.parse(response.choices[0].message.content or '', BATCH_SCHEMA,
+                                         ranker.parse_stats)
+    except structured_output.StructuredOutputError as e:
+        print(f"⚠️ Could not parse batch ranking, ranking {len(pending)} project(s) individually: {str(e)}")
+        return {'sent': len(pending), 'cached': 0, 'individual': len(pending)}
+
+    cached = 0
+    for entry in parsed['rankings']:
+        project_id = str(entry['id']).strip()
+        score = entry['score']
+        if project_id not in pending or not 0 <= score <= 100 or score >= ranker.score_limit - band:
+            continue
+        project_data, versions, cache_key = pending.pop(project_id)
+        ranking = {
+            'score': score,
+            'explanation': (f"Score {score} is well below the score limit {ranker.score_limit}, scored in a batch "
+                            f"of {len(projects)} projects without explanation."),
+            'batched': True,
+            'model': ranker.batch_model,
+            'bid_teaser': {},
+            'success': True
+        }
+        ranker.cache.set('openai', cache_key, ranking)
+        if ranker.versions:
+            ranker.versions.record(project_id, cache_key, versions, score)
+        if ranker.duplicates:
+            ranker.duplicates.add(project_id, project_data, ranking, versions[1:])
+        cached += 1
+    return {'sent': cached + len(pending), 'cached': cached, 'individual': len(pending)}
+
+def rank_backlog(ranker, work_queue, item: Dict, seen: set, batch_size: int = 20,
+                 min_batch: int = 5) -> Optional[Dict[str, int]]:
+    """
+    Batch-score a claimed queue item together with the items waiting behind it
+
+    Only kicks in when at least ``min_batch`` items are available, a normal queue
+    keeps ranking one project at a time. The other items stay pending, the queue
+    loop claims them as usual and rank_project() finds the cached rankings.
+
+    Args:
+        item: The item just claimed from the work queue
+        seen: Project ids already sent in a batch during this loop, updated in place
+
+    Returns:
+        Result of rank_batch(), None if no batch was sent
+    """
+    if item['project_id'] in seen:
+        return None
+    upcoming = [item] + [queued for queued in work_queue.peek(batch_size - 1) if queued['project_id'] not in seen]
+    if len(upcoming) < min_batch:
+        return None
+    seen.update(queued['project_id'] for queued in upcoming)
+    return ranker.rank_batch([queued['payload']['project_data'] for queued in upcoming])
+
+def settings_from_config(settings) -> Optional[tuple]:
+    """(batch_size, min_batch) for a run, None if batching is disabled (settings.batch or RANKING_BATCH_SIZE)"""
+    if not getattr(settings, 'batch', True):
+        return None
+    import config
+    batch_size = getattr(config, 'RANKING_BATCH_SIZE', 20)
+    if not batch_size or batch_size < 2:
+        return None
+    return batch_size, max(2, getattr(config, 'RANKING_BATCH_MIN', 5))
@@ -3,12 +3,159 @@ import json
 from datetime import datetime
 import config
 import time
-import openai
 import os
 import pickle
 from pathlib import Path
-import tqdm
 import random
+from argparse import Namespace
+import coordinator
+from work_queue import WorkQueue, RetryPolicy
+from skill_matcher import SkillMatcher
+from filter_planner import FilterChain, FilterContext, FilterRule
+import prescorer
+import similarity_index
+import near_duplicates
+import ranking_cache
+import prompt_context
+import token_budget
+import structured_output
+import ranking_stream
+import model_cascade
+import batch_ranking
+import single_flight
+import job_store
+import job_writer
+
+# Our expertise/skills with their corresponding job IDs
+OUR_SKILLS = [
+    # Web Development
+    {'name': 'PHP', 'id': 3},
+    {'name': 'Python', 'id': None},
+    {'name': 'Laravel', 'id': 1315},
+    {'name': 'Symfony', 'id': 292},
+    {'name': 'Vue.js', 'id': 1613},
+    {'name': 'React', 'id': 759},
+    {'name': 'JavaScript', 'id': 7},
+    {'name': 'TypeScript', 'id': 1109},
+    {'name': 'HTML', 'id': 20},
+    {'name': 'CSS', 'id': 10},
+    {'name': 'Bootstrap', 'id': 319},
+    {'name': 'Tailwind CSS', 'id': 1698},
+    
+    # Backend Development
+    {'name': 'API Development', 'id': 1103},
+    {'name': 'RESTful API', 'id': 1029},
+    {'name': 'Backend Development', 'id': 1295},
+    {'name': 'Web Services', 'id': 93},
+    {'name': 'Database Design', 'id': 583},
+    {'name': 'SQL', 'id': 30},
+    {'name': 'MySQL', 'id': 13},
+    {'name': 'PostgreSQL', 'id': 33},
+    {'name': 'MongoDB', 'id': 527},
+    
+    # Financial Applications
+    {'name': 'Financial Software', 'id': 1139},
+    {'name': 'Accounting Software', 'id': 320},
+    {'name': 'Payment Gateway Integration', 'id': 1241},
+    {'name': 'Stripe', 'id': 1402},
+    {'name': 'PayPal', 'id': 1050},
+    {'name': 'Fintech', 'id': 1597},
+    {'name': 'Banking Software', 'id': 1306},
+    
+    # Dashboard & Analytics
+    {'name': 'Dashboard Development', 'id': 1323},
+    {'name': 'Data Visualization', 'id': 701},
+    {'name': 'Business Intelligence', 'id': 304},
+    {'name': 'Analytics', 'id': 1111},
+    
+    # Corporate Websites
+    {'name': 'WordPress', 'id': 17},
+    {'name': 'CMS Development', 'id': 1483},
+    {'name': 'Corporate Website', 'id': 1264},
+    {'name': 'Responsive Design', 'id': 669},
+    {'name': 'Web Design', 'id': 9},
+    {'name': 'UX/UI Design', 'id': 1424}
+]
+
+# Static parts of the ranking prompt; their hash is part of the ranking cache key.
+# The ranking uses structured outputs (JSON schema), which need gpt-4o-mini or newer
+RANKING_MODEL = "gpt-4o-mini"
+RANKING_SYSTEM_PROMPT = """You are an project managere for the web-agency Vyftec that scores software projects for Vyftec based on how well they match the company's expertise."""
+
+RANKING_INSTRUCTIONS = """Please return your response in this JSON format:
+{
+  "score": <int between 0-100>,
+  "explanation": <string, 400-800 characters>,
+  "bid_teaser": <object, see Bid Teaser, or null>
+}
+
+We will provide project titles, skills required, and descriptions, data about the employer. Your response should include:
+- A score (0-100) indicating the project's fit. 
+- A score explanation summarizing the key correlations.
+
+Score Calculation
+
+Evaluate the project based on:
+Technology Match: Compare required technologies with Vyftec's expertise. Dont consider the selected skills of the employer in the job only the description and title of the project.
+Experience Level: Assess if the project suits junior, mid-level, or senior developers.
+Regional Fit: Preferably German-speaking projects, with Switzerland as the best match, followed by English-speaking projects.
+Industry Fit: Don't consider industries, we provide services to all businesses and industries.
+
+Ensure a realistic evaluation: Do not artificially increase scores. Many projects may not be a good fit, and a low score is acceptable.
+Do not consider the project required skills, only the project technologies and skills mentioned in the description and title. Do also not consider
+the price of the project as it can be misleading.
+Everything that is dashboard, ERP, CRM, etc. is a very good fit also if some technologies dont match.
+
+Score Explanation
+
+Provide a concise explanation (400 - 800 characters) detailing the alignment between the project requirements and Vyftec's expertise and build the score accordingly.
+
+Score Output
+
+Return a score between 0 and 100. It is built upon the insights of the explanation text. Ensuring that single, exchangeable technologies do not overly impact the score. For example, C++ would make it impossible as its a core base technology where we have no experience at all. But knowledge of a specific API is not, as Vyftec excels at API integrations. """
+
+# Static parts of the bid text prompt
+BID_MODEL = "gpt-3.5-turbo"
+BID_SYSTEM_PROMPT = """You are an AI assistant for Vyftec, helping to write high-quality bid teasers for software development projects."""
+
+BID_FORMAT = """{
+  "bid_teaser": {
+    "first_paragraph": "<string, 100-250 characters>",
+    "second_paragraph": "<string, 70-180 characters>",
+    "third_paragraph": "<string>",
+    "question": "<string>"
+  }
+}"""
+
+BID_TEASER_GUIDE = """Instructions:
+- First Paragraph: Focus on answering direct questions or outlining the solution. Keep it short, logical, and engaging.
+- Second Paragraph: Compress the explanation text to 70-180 characters.
+- Third Paragraph: Use one of these templates based on project category:
+  General: "We develop financial apps, corporate websites, and powerful backends tailored to business needs. ..."
+  Websites & Dashboards: "We specialize in creating impressive corporate websites and powerful dashboards ..."
+  Finance: "We create cutting-edge financial apps and automated trading systems. ..."
+- Question: Ask one clear, contextual question about the project.
+
+Include relevant links in the third paragraph:
+Corporate Websites: https://vyftec.com/corporate-websites
+Dashboards: https://vyftec.com/dashboards
+Financial Apps: https://vyftec.com/financial-apps
+"""
+
+BID_INSTRUCTIONS = f"""Please generate a bid teaser text in the following JSON format:
+{BID_FORMAT}
+
+{BID_TEASER_GUIDE}"""
+
+def ranking_instructions(score_limit: int) -> str:
+    """Ranking instructions; the bid teaser is written in the same call for projects at or above the score limit"""
+    return f"""{RANKING_INSTRUCTIONS}
+
+Bid Teaser
+
+Only if the score is {score_limit} or higher, also write a bid teaser for the project, otherwise set "bid_teaser" to null. The bid teaser has first_paragraph, second_paragraph, third_paragraph and question.
+
+{BID_TEASER_GUIDE}"""
 
 def format_timestamp(timestamp):
     if not timestamp:
@@ -64,12 +211,21 @@ class FileCache:
     
     def set(self, cache_type, key, data):
         cache_path = self._get_cache_path(cache_type, key)
+        # Write to a temp file and rename so other workers never read a partial pickle
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
         try:
-            with open(cache_path, 'wb') as f:
+            with open(tmp_path, 'wb') as f:
                 pickle.dump(data, f)
+            os.replace(tmp_path, cache_path)
         except (pickle.PickleError, IOError) as e:
             print(f"Cache write error: {str(e)}")
     
+    def delete(self, cache_type, key):
+        try:
+            os.remove(self._get_cache_path(cache_type, key))
+        except FileNotFoundError:
+            pass
+    
     def clear(self, cache_type=None):
         if cache_type:
             cache_dir = f"{self.cache_dir}/{cache_type}"
@@ -91,6 +247,12 @@ class FileCache:
                         print(f"🗑️ Deleted job file: {file.name}")
                     except Exception as e:
                         print(f"❌ Error deleting job file {file.name}: {str(e)}")
+            # And the job store, jobs_api.py would keep serving the deleted jobs otherwise
+            try:
+                job_store.shared().clear()
+                print("🗑️ Cleared the job store")
+            except Exception as e:
+                print(f"❌ Error clearing the job store: {str(e)}")
     
     def get_stats(self):
         stats = {}
@@ -110,17 +272,115 @@ class FileCache:
         return stats
 
 class ProjectRanker:
-    def __init__(self, api_key: str, cache_expiry: int = 3600):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, cache_expiry: int = 3600, duplicates=None, versions=None, score_limit: int = 50,
+                 stream_margin: int = None, cascade: model_cascade.Cascade = None):
+        # Imported lazily so a supervised restart doesn't pay for the SDK import
+        # before the first project is even fetched
+        import openai
+        # config.OPENAI_BASE_URL (or the OPENAI_BASE_URL env var) points the client elsewhere, e.g. openai_stub.py
+        self.client = openai.OpenAI(api_key=api_key, base_url=getattr(config, 'OPENAI_BASE_URL', None))
         self.conversation_id = "chatcmpl-BDpJQA3iphEQ1bVrfRin9e55MjyV4"
         self.cache = FileCache(cache_dir='cache', expiry=cache_expiry)
         self.max_retries = 3
         self.retry_delay = 5
+        # Optional near_duplicates.NearDuplicateIndex, reposts reuse earlier rankings
+        self.duplicates = duplicates
+        # Rankings are cached per project content, prompt and context version
+        self.versions = versions
+        # Company context is read once and reloaded when the file changes
+        self.prompt_context = prompt_context.shared('vyftec-context.md')
+        # Long descriptions are condensed to this many tokens, every call is metered
+        self.description_tokens = getattr(config, 'PROMPT_DESCRIPTION_TOKENS', 1500)
+        self.tokens = token_budget.from_config()
+        self.parse_stats = structured_output.ParseStats()
+        # Projects at or above the limit get their bid teaser from the ranking call
+        self.score_limit = score_limit
+        # With a margin the response is streamed and cut off once the score is that far below the limit
+        self.stream_margin = stream_margin
+        # Optional model cascade: cheap first pass for every project, strong model for the finalists
+        self.cascade = cascade
+        # Rankings of the same project that run at the same time share one LLM call
+        self.single_flight = single_flight.shared()
+        self.bid_model = cascade.final_model if cascade else BID_MODEL
+        # Backlogs are scored in batches with the first-pass model (needs structured outputs)
+        self.batch_model = cascade.first_model if cascade else getattr(config, 'RANKING_BATCH_MODEL', 'gpt-4o-mini')
+        models = (cascade.first_model, cascade.final_model, cascade.band) if cascade else RANKING_MODEL
+        self.prompt_version = ranking_cache.fingerprint(
+            models, self._ranking_prefix(''), self._create_ranking_prompt({}), self.description_tokens,
+            structured_output.RANKING_SCHEMA
+        )
+    
+    def context_fingerprint(self) -> str:
+        """Hash of vyftec-context.md (the ranking prompt includes it)"""
+        return self.prompt_context.fingerprint()
+    
+    def ranking_versions(self, project_data: dict) -> tuple:
+        """(content, prompt, context) hashes a ranking of this project depends on"""
+        return (ranking_cache.content_fingerprint(project_data), self.prompt_version,
+                self.context_fingerprint())
 
-    def rank_project(self, project_data: dict, progress_bar=None) -> dict:
-        project_id = project_data.get('project_id', None) or project_data.get('id', 'unknown_id')
-        cache_key = f"project_id_{project_id}"
+    def _ranking_prefix(self, context: str) -> list:
+        """
+        Static start of every ranking request, the project follows as last message.
+        Kept byte-identical between calls so the API can reuse its prompt cache.
+        """
+        return [
+            {"role": "system", "content": RANKING_SYSTEM_PROMPT},
+            {"role": "user", "content": f"""Company Context:\n{context}"""},
+            {"role": "user", "content": ranking_instructions(self.score_limit)}
+        ]
+
+    def batch_prefix(self, context: str) -> list:
+        """Static start of a batch ranking request (batch_ranking.py)"""
+        return [
+            {"role": "system", "content": RANKING_SYSTEM_PROMPT},
+            {"role": "user", "content": f"""Company Context:\n{context}"""},
+            {"role": "user", "content": f"{ranking_instructions(self.score_limit)}\n\n{batch_ranking.BATCH_INSTRUCTIONS}"}
+        ]
+
+    def rank_batch(self, projects: list) -> dict:
+        """Score a backlog in one request and cache the clear misses, see batch_ranking.rank_batch()"""
+        band = self.cascade.band if self.cascade else getattr(config, 'RANKING_BATCH_BAND', 15)
+        return batch_ranking.rank_batch(self, projects, band=band,
+                                        description_tokens=getattr(config, 'RANKING_BATCH_DESCRIPTION_TOKENS', 300))
+
+    @staticmethod
+    def _bid_prefix(context: str) -> list:
+        """Static start of every bid text request"""
+        return [
+            {"role": "system", "content": BID_SYSTEM_PROMPT},
+            {"role": "user", "content": f"""Company Context:\n{context}"""},
+            {"role": "user", "content": BID_INSTRUCTIONS}
+        ]
+
+    def rank_project(self, project_data: dict, progress_bar=None, max_attempts: int = None,
+                     allow_reuse: bool = True) -> dict:
+        """
+        Score a project with the LLM.
+        
+        max_attempts overrides self.max_retries; the work queue passes 1 so a failure
+        returns immediately and is rescheduled instead of sleeping inline.
+        
+        allow_reuse=False skips the near-duplicate shortcut, so a re-score after a prompt or
+        context change always asks the LLM.
         
+        Concurrent calls for the same project (other threads or worker processes) share a
+        single LLM call, see single_flight.py.
+        """
+        project_id = project_data.get('project_id', None) or project_data.get('id', 'unknown_id')
+        cache_key = ranking_cache.ranking_cache_key(project_id, self.ranking_versions(project_data))
+        # Cache hits don't need the single-flight lease
+        cached_ranking = self._cached_ranking(cache_key, project_id, progress_bar)
+        if cached_ranking:
+            return cached_ranking
+        return self.single_flight.do(
+            cache_key,
+            lambda: self._rank_project(project_data, progress_bar, max_attempts, allow_reuse),
+            lambda: self.cache.get('openai', cache_key)
+        )
+
+    def _cached_ranking(self, cache_key: str, project_id, progress_bar=None) -> dict:
+        """Cached ranking for the key, None if there is none or it is a failed one"""
         cached_ranking = self.cache.get('openai', cache_key)
         if cached_ranking:
             if cached_ranking.get('score', 0) == 0 and "failed" in cached_ranking.get('explanation', '').lower():
@@ -130,17 +390,32 @@ class ProjectRanker:
                 if progress_bar:
                     progress_bar.set_description_str(f"💾 CACHE: Loading AI ranking for project ID {project_id}")
                 return cached_ranking
+        return None
+
+    def _rank_project(self, project_data: dict, progress_bar=None, max_attempts: int = None,
+                      allow_reuse: bool = True) -> dict:
+        max_attempts = max_attempts or self.max_retries
+        project_id = project_data.get('project_id', None) or project_data.get('id', 'unknown_id')
+        versions = self.ranking_versions(project_data)
+        cache_key = ranking_cache.ranking_cache_key(project_id, versions)
         
-        # Read vyftec-context.md
-        try:
-            with open('vyftec-context.md', 'r') as file:
-                vyftec_context = file.read()
-        except Exception as e:
-            print(f"Warning: Could not read vyftec-context.md: {str(e)}")
-            vyftec_context = ""
+        cached_ranking = self._cached_ranking(cache_key, project_id, progress_bar)
+        if cached_ranking:
+            return cached_ranking
+        
+        # Reposts of a project we already ranked with the current prompt and context reuse that ranking
+        if self.duplicates and allow_reuse:
+            reused = self.duplicates.reuse_ranking(project_id, project_data, versions[1:])
+            if reused:
+                if progress_bar:
+                    progress_bar.set_description_str(f"♻️ Reusing ranking of near-duplicate project {reused['duplicate_of']}")
+                self.cache.set('openai', cache_key, reused)
+                if self.versions:
+                    self.versions.record(project_id, cache_key, versions, reused.get('score'))
+                return reused
         
         # Step 1: Generate score and explanation
-        for attempt in range(1, self.max_retries + 1):
+        for attempt in range(1, max_attempts + 1):
             try:
                 if progress_bar:
                     project_title = project_data.get('title', 'Untitled Project')
@@ -149,95 +424,93 @@ class ProjectRanker:
                     else:
                         progress_bar.set_description_str(f"🤖 AI: Generating score for project ID {project_id}")
                 
-                prompt = self._create_ranking_prompt(project_data)
+                description, condensed = self._condensed_description(project_data)
+                prompt = self._create_ranking_prompt(project_data, description)
+                messages = [
+                    *self.prompt_context.prefix(f'ranking_{self.score_limit}', self._ranking_prefix),
+                    {
+                        "role": "user",
+                        "content": f"""Project Information:\n{prompt}"""
+                    }
+                ]
                 
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": """You are an project managere for the web-agency Vyftec that scores software projects for Vyftec based on how well they match the company's expertise."""
-                        },
-                        {
-                            "role": "user",
-                            "content": f"""Company Context:\n{vyftec_context}"""
-                        },
-                        {
-                            "role": "user",
-                            "content": f"""Project Information:\n{prompt}"""
-                        },
-                        {
-                            "role": "user",
-                            "content": """Please return your response in this JSON format:
-{
-  "score": <int between 0-100>,
-  "explanation": <string, 400-800 characters>
-}
-
-We will provide project titles, skills required, and descriptions, data about the employer. Your response should include:
-- A score (0-100) indicating the project's fit. 
-- A score explanation summarizing the key correlations.
-
-Score Calculation
-
-Evaluate the project based on:
-Technology Match: Compare required technologies with Vyftec's expertise. Dont consider the selected skills of the employer in the job only the description and title of the project.
-Experience Level: Assess if the project suits junior, mid-level, or senior developers.
-Regional Fit: Preferably German-speaking projects, with Switzerland as the best match, followed by English-speaking projects.
-Industry Fit: Don't consider industries, we provide services to all businesses and industries.
-
-Ensure a realistic evaluation: Do not artificially increase scores. Many projects may not be a good fit, and a low score is acceptable.
-Do not consider the project required skills, only the project technologies and skills mentioned in the description and title. Do also not consider
-the price of the project as it can be misleading.
-Everything that is dashboard, ERP, CRM, etc. is a very good fit also if some technologies dont match.
-
-Score Explanation
-
-Provide a concise explanation (400 - 800 characters) detailing the alignment between the project requirements and Vyftec's expertise and build the score accordingly.
-
-Score Output
-
-Return a score between 0 and 100. It is built upon the insights of the explanation text. Ensuring that single, exchangeable technologies do not overly impact the score. For example, C++ would make it impossible as its a core base technology where we have no experience at all. But knowledge of a specific API is not, as Vyftec excels at API integrations. """
-                        }
-                    ],
-                    temperature=0.7,
-                    max_tokens=500,
-                    timeout=60
-                )
+                stages = []
+                if self.cascade:
+                    # First pass only returns the score, finalists are escalated to the strong model
+                    reply = self._request_ranking(project_id, messages, condensed, self.cascade.first_model,
+                                                  first_pass=True)
+                    self.cascade.record('first_pass', reply['seconds'])
+                    stages.append({'stage': 'first_pass', 'model': reply['model'],
+                                   'seconds': round(reply['seconds'], 2), 'score': reply['score']})
+                    if self.cascade.escalate(reply['score'], self.score_limit):
+                        reply = self._request_ranking(project_id, messages, condensed, self.cascade.final_model)
+                        self.cascade.record('final', reply['seconds'])
+                        stages.append({'stage': 'final', 'model': reply['model'],
+                                       'seconds': round(reply['seconds'], 2), 'score': reply['score']})
+                else:
+                    reply = self._request_ranking(project_id, messages, condensed)
                 
-                # Parse the response
-                try:
-                    response_text = response.choices[0].message.content.strip()
-                    if not response_text:
-                        raise ValueError("Empty response from ChatGPT")
-                    
-                    # Clean the response text by removing any markdown code block indicators
-                    response_text = response_text.replace('```json', '').replace('```', '').strip()
-                    
-                    result = json.loads(response_text)
-                    score = result.get('score', 0)
-                    explanation = result.get('explanation', '')
-                    
-                    if not isinstance(score, int) or not 0 <= score <= 100:
-                        raise ValueError(f"Invalid score format: {score}")
-                    
-                    if not explanation or len(explanation) < 100:
-                        raise ValueError(f"Invalid explanation format: {explanation[:100]}...")
-                    
-                except (json.JSONDecodeError, ValueError) as e:
-                    print(f"Error parsing ChatGPT response: {str(e)}")
-                    print(f"Raw response: {response_text}")
-                    raise ValueError(f"Invalid response format: {str(e)}")
+                if reply['cancelled']:
+                    # Clearly rejected, the rest of the response was never generated
+                    score = reply['score']
+                    result = {
+                        'score': score,
+                        'explanation': (f"Score {score} is well below the score limit {self.score_limit}, "
+                                        f"the explanation was skipped."),
+                        'stopped_early': True
+                    }
+                else:
+                    # Parse the response, near-valid JSON is repaired locally instead of asking again
+                    response_text = reply['text']
+                    try:
+                        result = structured_output.parse(response_text, structured_output.RANKING_SCHEMA,
+                                                         self.parse_stats, salvage={'bid_teaser': None})
+                        score = result['score']
+                        explanation = result['explanation']
+                        
+                        if not 0 <= score <= 100:
+                            raise structured_output.StructuredOutputError(f"Invalid score format: {score}")
+                        
+                        if not explanation or len(explanation) < 100:
+                            raise structured_output.StructuredOutputError(f"Invalid explanation format: {explanation[:100]}...")
+                        
+                    except structured_output.StructuredOutputError as e:
+                        print(f"Error parsing ChatGPT response: {str(e)}")
+                        print(f"Raw response: {response_text}")
+                        raise
                 
                 result['success'] = True
-                result['bid_teaser'] = {}  # Initialize empty bid teaser
+                result['model'] = reply['model']
+                if stages:
+                    stages[-1]['score'] = score
+                    result['stages'] = stages
+                result['bid_teaser'] = result.get('bid_teaser') or {}
+                if score >= self.score_limit and not result['bid_teaser'].get('first_paragraph'):
+                    # The model skipped the teaser, write it separately
+                    try:
+                        result['bid_teaser'] = self.generate_bid_text(project_data, score, result['explanation'],
+                                                                      progress_bar)['bid_teaser']
+                    except Exception as e:
+                        print(f"⚠️ Could not generate bid text for project {project_id}: {str(e)}")
                 self.cache.set('openai', cache_key, result)
+                if self.versions:
+                    self.versions.record(project_id, cache_key, versions, score)
+                if self.duplicates:
+                    self.duplicates.add(project_id, project_data, result, versions[1:])
                 return result
                 
+            except structured_output.StructuredOutputError as e:
+                # Asking again right away rarely fixes the format, the work queue retries later
+                return {
+                    'score': 0,
+                    'explanation': f"Ranking failed: Invalid response format: {str(e)}",
+                    'success': False,
+                    'bid_teaser': {}
+                }
             except Exception as e:
                 if progress_bar:
-                    progress_bar.set_description_str(f"❌ Error (attempt {attempt}/{self.max_retries}): {str(e)}")
-                if attempt < self.max_retries:
+                    progress_bar.set_description_str(f"❌ Error (attempt {attempt}/{max_attempts}): {str(e)}")
+                if attempt < max_attempts:
                     time.sleep(self.retry_delay * attempt)
                 else:
                     return {
@@ -247,6 +520,55 @@ Return a score between 0 and 100. It is built upon the insights of the explanati
                         'bid_teaser': {}
                     }
 
+    def _request_ranking(self, project_id, messages: list, condensed: bool, model: str = RANKING_MODEL,
+                         first_pass: bool = False) -> dict:
+        """
+        Send the ranking request to ``model``, streamed if a stream margin is set. A first pass
+        is always streamed and closed as soon as the score is known.
+
+        Returns:
+            Dict with the response 'text', 'cancelled', the early 'score' of a cancelled stream,
+            'model' and 'seconds'
+        """
+        response_format = structured_output.response_format('project_ranking', structured_output.RANKING_SCHEMA)
+        kind = 'ranking_first_pass' if first_pass else 'ranking'
+        started = time.monotonic()
+        if self.stream_margin is None and not first_pass:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                temperature=0.7,
+                max_tokens=900,  # Explanation plus bid teaser
+                timeout=60
+            )
+            seconds = time.monotonic() - started
+            self.tokens.record(project_id, model, messages, response, kind=kind, condensed=condensed,
+                               seconds=seconds)
+            return {'text': response.choices[0].message.content or '', 'cancelled': False, 'score': None,
+                    'model': model, 'seconds': seconds}
+        
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format=response_format,
+            temperature=0.7,
+            max_tokens=20 if first_pass else 900,
+            timeout=60,
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+        if first_pass:
+            reply = ranking_stream.read(stream, stop_after_score=True)
+        else:
+            reply = ranking_stream.read(stream, cancel_below=self.score_limit - self.stream_margin)
+        reply['model'] = model
+        reply['seconds'] = time.monotonic() - started
+        self.tokens.record(project_id, model, messages, kind=kind, condensed=condensed, usage=reply['usage'],
+                           completion=reply['text'], stopped_early=reply['cancelled'] and not first_pass,
+                           seconds=reply['seconds'])
+        return reply
+
     def generate_bid_text(self, project_data: dict, score: int, explanation: str, progress_bar=None) -> dict:
         project_id = project_data.get('project_id', None) or project_data.get('id', 'unknown_id')
         cache_key = f"bid_text_{project_id}"
@@ -258,54 +580,34 @@ Return a score between 0 and 100. It is built upon the insights of the explanati
                 progress_bar.set_description_str(f"💾 CACHE: Loading bid text for project ID {project_id}")
             return cached_bid
         
-        # Read vyftec-context.md
-        try:
-            with open('vyftec-context.md', 'r') as file:
-                vyftec_context = file.read()
-        except Exception as e:
-            print(f"Warning: Could not read vyftec-context.md: {str(e)}")
-            vyftec_context = ""
+        # A repost gets the bid text we already wrote for the original
+        if self.duplicates:
+            duplicate = self.duplicates.find(project_data)
+            if duplicate and duplicate['bid_teaser'].get('first_paragraph'):
+                self.duplicates.record_reuse(project_id, duplicate['project_id'], duplicate['distance'], 'bid_teaser')
+                result = {'bid_teaser': duplicate['bid_teaser']}
+                self.cache.set('openai', cache_key, result)
+                print(f"♻️ Reused bid text of near-duplicate project {duplicate['project_id']}")
+                return result
         
         if progress_bar:
             progress_bar.set_description_str(f"🤖 AI: Generating bid text for project ID {project_id}")
         
+        description, condensed = self._condensed_description(project_data, 'No description')
+        messages = [
+            *self.prompt_context.prefix('bid', self._bid_prefix),
+            {"role": "user", "content": f"""Project Title:\n{project_data.get('title', 'Untitled Project')}"""},
+            {"role": "user", "content": f"""Project Description:\n{description}"""},
+            {"role": "user", "content": f"""Matching Score: {score}\nMatching Explanation:\n{explanation}"""},
+        ]
         bid_response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": f"""You are an AI assistant for Vyftec, helping to write high-quality bid teasers for software development projects."""},
-                {"role": "user", "content": f"""Company Context:\n{vyftec_context}"""},
-                {"role": "user", "content": f"""Project Title:\n{project_data.get('title', 'Untitled Project')}"""},
-                {"role": "user", "content": f"""Project Description:\n{project_data.get('description', 'No description')}"""},
-                {"role": "user", "content": f"""Matching Score: {score}\nMatching Explanation:\n{explanation}"""},
-                {"role": "user", "content": """Please generate a bid teaser text in the following JSON format:
-{
-  "bid_teaser": {
-    "first_paragraph": "<string, 100-250 characters>",
-    "second_paragraph": "<string, 70-180 characters>",
-    "third_paragraph": "<string>",
-    "question": "<string>"
-  }
-}
-
-Instructions:
-- First Paragraph: Focus on answering direct questions or outlining the solution. Keep it short, logical, and engaging.
-- Second Paragraph: Compress the explanation text to 70-180 characters.
-- Third Paragraph: Use one of these templates based on project category:
-  General: "We develop financial apps, corporate websites, and powerful backends tailored to business needs. ..."
-  Websites & Dashboards: "We specialize in creating impressive corporate websites and powerful dashboards ..."
-  Finance: "We create cutting-edge financial apps and automated trading systems. ..."
-- Question: Ask one clear, contextual question about the project.
-
-Include relevant links in the third paragraph:
-Corporate Websites: https://vyftec.com/corporate-websites
-Dashboards: https://vyftec.com/dashboards
-Financial Apps: https://vyftec.com/financial-apps
-"""}
-            ],
+            model=self.bid_model,
+            messages=messages,
             temperature=0.7,
             max_tokens=500,
             timeout=60
         )
+        self.tokens.record(project_id, self.bid_model, messages, bid_response, kind='bid', condensed=condensed)
         
         try:
             bid_text = bid_response.choices[0].message.content.strip()
@@ -315,6 +617,8 @@ Financial Apps: https://vyftec.com/financial-apps
             bid_result = json.loads(bid_text)
             result = {'bid_teaser': bid_result.get('bid_teaser', {})}
             self.cache.set('openai', cache_key, result)
+            if self.duplicates and result['bid_teaser']:
+                self.duplicates.set_bid_teaser(project_id, result['bid_teaser'])
             print(f"✅ Generated bid text for project {project_id}")
             return result
             
@@ -323,7 +627,15 @@ Financial Apps: https://vyftec.com/financial-apps
             print(f"Raw bid response: {bid_text}")
             return {'bid_teaser': {}}
 
-    def _create_ranking_prompt(self, project_data: dict) -> str:
+    def _condensed_description(self, project_data: dict, default: str = 'No description available') -> tuple:
+        """(description within the token budget, whether it had to be shortened)"""
+        description = project_data.get('description') or default
+        condensed = token_budget.condense(description, self.description_tokens, RANKING_MODEL)
+        return condensed, condensed is not description
+
+    def _create_ranking_prompt(self, project_data: dict, description: str = None) -> str:
+        if description is None:
+            description = self._condensed_description(project_data)[0]
         return f"""Please evaluate this Freelancer.com project for Vyftec:
 
 Project Details:
@@ -344,38 +656,10 @@ Bid Count: {project_data.get('bid_stats', {}).get('bid_count', 0)}
 
 Project Description:
 ------------------
-{project_data.get('description', 'No description available')}
+{description}
 
 Evaluate this project for Vyftec with a score from 0-100 and detailed explanation."""
 
-    def _extract_score(self, response_text: str) -> int:
-        try:
-            import re
-            score_patterns = [
-                r'Score:\s*(\d{1,3})',
-                r'(\d{1,3})/100',
-                r'Rating:\s*(\d{1,3})',
-                r'Bewertung:\s*(\d{1,3})'
-            ]
-            
-            for pattern in score_patterns:
-                matches = re.search(pattern, response_text)
-                if matches:
-                    score = int(matches.group(1))
-                    if 0 <= score <= 100:
-                        return score
-            
-            scores = re.findall(r'\b([0-9]{1,3})\b', response_text)
-            for score in scores:
-                score = int(score)
-                if 0 <= score <= 100:
-                    return score
-                    
-            return 0
-            
-        except Exception as e:
-            return 0
-
 def get_active_projects(limit: int = 20, params=None) -> dict:
     """
     Get active projects from Freelancer API with optional filtering.
@@ -605,9 +889,9 @@ def get_user_reputation(user_id: int, cache: FileCache) -> dict:
     }
 
 def save_job_to_json(project_data: dict, ranking_data: dict) -> None:
+    """Queue the job of a qualifying project, job_writer.py stores it in the background"""
     try:
         project_id = project_data.get('id', 'unknown')
-        print(f"\nDebug: Attempting to save job {project_id} to JSON...")
         
         project_url = config.PROJECT_URL_TEMPLATE.format(project_id)
         employer_earnings = 0
@@ -630,32 +914,13 @@ def save_job_to_json(project_data: dict, ranking_data: dict) -> None:
             }
         }
 
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"job_{project_id}_{timestamp}.json"
-        jobs_dir = Path('jobs')
-        jobs_dir.mkdir(parents=True, exist_ok=True)
-        file_path = jobs_dir / filename
-
-        print(f"Debug: Saving to file: {file_path}")
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(job_data, f, indent=4, ensure_ascii=False)
-        
-        print(f"✅ Saved job data for project {project_id} to {filename}")
+        # One entry per project, a re-ranked project replaces its earlier job
+        job_writer.shared('jobs').submit(job_data)
         
     except Exception as e:
         print(f"❌ Error saving job data for project {project_id}: {str(e)}")
-        print(f"Debug: Full error traceback:")
-        import traceback
-        print(traceback.format_exc())
 
 def process_ranked_project(project_data: dict, ranking_data: dict, bid_limit: int = 40, score_limit: int = 50) -> None:
-    print(f"\nDebug: Processing ranked project...")
-    print(f"Debug: Project ID: {project_data.get('id', 'unknown')}")
-    print(f"Debug: Score: {ranking_data.get('score', 0)}")
-    print(f"Debug: Bid count: {project_data.get('bid_stats', {}).get('bid_count', 0)}")
-    print(f"Debug: Has bid text: {bool(ranking_data.get('explanation', '').strip())}")
-    
     score = ranking_data.get('score', 0)
     bid_count = project_data.get('bid_stats', {}).get('bid_count', 0)
     has_bid_text = bool(ranking_data.get('explanation', '').strip())
@@ -666,16 +931,12 @@ def process_ranked_project(project_data: dict, ranking_data: dict, bid_limit: in
         has_bid_text
     )
     
-    print(f"Debug: Meets criteria: {meets_criteria}")
-    
     if meets_criteria:
-        print(f"Debug: Saving job to JSON...")
         save_job_to_json(project_data, ranking_data)
-    else:
-        print(f"Debug: Project did not meet criteria:")
-        print(f"  - Score >= {score_limit}: {score >= score_limit}")
-        print(f"  - Bid count < {bid_limit}: {bid_count < bid_limit}")
-        print(f"  - Has bid text: {has_bid_text}")
+        print(f"💾 Saving job {project_data.get('id', 'unknown')} (score {score})")
+    elif score >= score_limit:
+        reason = f"{bid_count} bids" if bid_count >= bid_limit else "no bid text"
+        print(f"⏭️ Not saving project {project_data.get('id', 'unknown')} despite score {score}: {reason}")
 
 def format_score_with_ascii_art(score):
     def get_color_for_score(score):
@@ -811,8 +1072,259 @@ def draw_box(content, min_width=80, max_width=150):
     box.append(f"└{horizontal_line}┘")
     return '\n'.join(box)
 
-def main():
-    # Get user input for configuration
+def build_filter_chain(settings: Namespace, cache: FileCache, failed_users: set, skill_matcher: SkillMatcher,
+                       prescore=None, knn_index=None):
+    """
+    Declare the project filters and compile them into a cost-ordered chain.
+    
+    Returns:
+        (FilterChain, loaders for the FilterContext of each project)
+    """
+    # Sets instead of scanning the config lists for every project
+    rich_country_codes = set(config.RICH_COUNTRIES)
+    rich_country_names = set(config.RICH_COUNTRIES_FULL.values())
+    required_earnings_score = getattr(config, 'REQUIRED_EARNINGS_SCORE', 0)
+    
+    def load_user_details(context):
+        return get_user_details(context.project.get('owner_id'), cache, failed_users)
+    
+    def load_location(context):
+        city = "Unknown"
+        country = "Unknown"
+        user_details = context.get('user_details')
+        if 'result' in user_details:
+            location = user_details['result'].get('location', {})
+            if location and 'city' in location:
+                city = location.get('city', 'Unknown')
+            if location and 'country' in location:
+                country = location['country'].get('name', 'Unknown')
+        return city or "Unknown", country or "Unknown"
+    
+    def load_reputation(context):
+        return get_user_reputation(context.project.get('owner_id'), cache)
+    
+    def load_user_rep(context):
+        reputation_data = context.get('reputation')
+        return reputation_data.get('result', {}).get(str(context.project.get('owner_id')), {})
+    
+    def load_skill_match(context):
+        return skill_matcher.match(skill.get('name', '') for skill in context.project.get('jobs', []))
+    
+    def load_prescore(context):
+        return prescore.check(context.project, settings.score_limit, context.get('skill_match'))
+    
+    def load_knn(context):
+        return knn_index.check(context.project, settings.score_limit)
+    
+    loaders = {
+        'user_details': load_user_details,
+        'location': load_location,
+        'reputation': load_reputation,
+        'user_rep': load_user_rep,
+        'skill_match': load_skill_match,
+        'prescore': load_prescore,
+        'knn': load_knn
+    }
+    
+    def check_bid_limit(context):
+        bid_count = context.project.get('bid_stats', {}).get('bid_count', 0)
+        if bid_count >= settings.bid_limit:
+            return f"\033[91m⏭️\033[0m Skipped: Too many bids ({bid_count} >= {settings.bid_limit})"
+    
+    def check_submitdate(context):
+        if not context.project.get('submitdate'):
+            return f"\033[91m⏭️\033[0m Skipped: No submission date"
+    
+    def check_country_code(context):
+        # Projects without a country code are decided by the owner's location
+        country_code = context.project.get('country', '')
+        if country_code and country_code not in rich_country_codes:
+            return f"\033[93m🌍\033[0m Skipped: Country code {country_code} not in target list"
+    
+    def check_skills(context):
+        if not context.get('skill_match')['matched']:
+            return f"\033[94m🔧\033[0m Skipped: No matching skills found"
+    
+    def check_prescore(context):
+        # Far below the score limit: the LLM call isn't worth it
+        estimate = context.get('prescore')
+        if not estimate['rank']:
+            return (f"\033[94m🧮\033[0m Skipped: Pre-score {estimate['score']} below {estimate['threshold']:g} "
+                    f"(skills {estimate['skills']:.2f}, context {estimate['context']:.2f}, avoid {estimate['avoid']:.2f})")
+    
+    def check_knn(context):
+        # Similar projects were all ranked far below the score limit
+        estimate = context.get('knn')
+        if not estimate['rank']:
+            return (f"\033[94m🧭\033[0m Skipped: {len(estimate['neighbors'])} similar projects scored ~{estimate['score']} "
+                    f"(below {estimate['threshold']:g}, confidence {estimate['confidence']:.2f})")
+    
+    def check_user_country(context):
+        # Only skip if we have a valid country and it's not in the target list
+        city, country = context.get('location')
+        if country != "Unknown" and country not in rich_country_names:
+            return f"\033[93m🌍\033[0m Skipped: Country {country} not in target list"
+    
+    def check_reputation(context):
+        if 'result' not in context.get('reputation'):
+            return f"\033[95m👤\033[0m Skipped: Failed to fetch reputation data"
+    
+    def check_earnings_score(context):
+        earnings_score = context.get('user_rep').get('earnings_score', 0) or 0
+        if earnings_score < required_earnings_score:
+            return f"\033[95m👤\033[0m Skipped: Earnings score {earnings_score} below {required_earnings_score}"
+    
+    rules = [
+        FilterRule('bid_limit', check_bid_limit),
+        FilterRule('submitdate', check_submitdate),
+        FilterRule('skills', check_skills, cost_hint=0.00005)
+    ]
+    if prescore:
+        rules.append(FilterRule('prescore', check_prescore, cost_hint=0.001))
+    if knn_index:
+        rules.append(FilterRule('knn', check_knn, cost_hint=0.01))
+    if settings.country_check:
+        rules += [
+            FilterRule('country_code', check_country_code),
+            FilterRule('user_country', check_user_country, cost_hint=0.5)
+        ]
+    rules += [
+        FilterRule('reputation', check_reputation, cost_hint=0.5),
+        FilterRule('earnings_score', check_earnings_score, cost_hint=0.5)
+    ]
+    
+    return FilterChain(rules), loaders
+
+def display_ranked_project(project: dict, ranking: dict, city: str, country: str, ranker) -> None:
+    """Print the project box with the AI score and explanation"""
+    project_id = project.get('id')
+    owner_id = project.get('owner_id')
+    score = ranking['score']
+    
+    # Generate colored ASCII art score
+    score_ascii_art = format_score_with_ascii_art(score)
+    
+    # Create project details for display
+    project_details = f"""
+📌 {project.get('title', 'No Title')}
+🔗 {config.PROJECT_URL_TEMPLATE.format(project_id)}
+
+┌────────────────────────────────┬────────────────────────────────┬────────────────────────────────┬────────────────────────────────┐
+│ 🤖 SCORE:                       │ 🔧 PROJEKT-FÄHIGKEITEN:         │ 💼 ARBEITGEBER:                 │ 🤖 KI-KONTEXT:                 │
+│ {score_ascii_art}               │                                │                                │   • Konversation: {ranker.conversation_id} │
+│ 💰 BUDGET: ${project.get('budget', {}).get('minimum', 0)} - ${project.get('budget', {}).get('maximum', 0)} │                                │                                │ 🔗 LINKS:                      │
+│                                │                                │                                │   • Projekt: {config.PROJECT_URL_TEMPLATE.format(project_id)} │
+│                                │                                │                                │   • Arbeitgeber: {config.USER_URL_TEMPLATE.format(project.get('owner_username', owner_id))} │
+├────────────────────────────────┼────────────────────────────────┼────────────────────────────────┼────────────────────────────────┤
+│ 🔢 GEBOTE: {str(project.get('bid_stats', {}).get('bid_count', 0)).ljust(20)} │                                │ 🌍 STANDORT: {f"{city}, {country}"[:20].ljust(20)} │                                │
+"""
+    
+    # Add skills
+    skills_text = ""
+    for skill in project.get('jobs', []):
+        skills_text += f"│                                │   • {skill.get('name', 'Unknown')[:24].ljust(24)}  │                                │                                │\n"
+    
+    project_details += skills_text
+    project_details += f"""└────────────────────────────────┴────────────────────────────────┴────────────────────────────────┴────────────────────────────────┘
+
+📋 BESCHREIBUNG:
+{project.get('description', 'Keine Beschreibung verfügbar')}
+
+🤖 KI-BEWERTUNG:
+{ranking['explanation']}
+"""
+    
+    # Display the box
+    print(draw_box(project_details))
+
+def rank_queued_projects(work_queue: WorkQueue, ranker, settings: Namespace, worker_id: str = None,
+                         should_stop=None, retry_policy: RetryPolicy = None, prescore=None,
+                         knn_index=None) -> int:
+    """
+    Rank every queued project that is available right now, display it and save it
+    if it qualifies. Each project gets a single LLM attempt; failures are put back
+    into the queue with a backoff delay and the loop moves on.
+    
+    Returns:
+        Number of projects ranked successfully
+    """
+    ranked = 0
+    batching = batch_ranking.settings_from_config(settings)
+    batched = set()
+    while not (should_stop and should_stop()):
+        item = work_queue.claim(worker_id)
+        if item is None:
+            break
+        
+        payload = item['payload']
+        project = payload['project']
+        project_data = payload['project_data']
+        city = payload.get('city', 'Unknown')
+        country = payload.get('country', 'Unknown')
+        
+        # Backlog: score the next projects in one request, clear misses are cached for rank_project()
+        if batching:
+            batch = batch_ranking.rank_backlog(ranker, work_queue, item, batched, *batching)
+            if batch and batch['sent']:
+                print(f"📦 Batch-scored {batch['sent']} queued projects: {batch['cached']} clearly below the limit, "
+                      f"{batch['individual']} ranked individually")
+        
+        # Get project ranking; a re-score always makes a real call with the new prompt and context
+        ranking = ranker.rank_project(project_data, max_attempts=1, allow_reuse=not payload.get('rescore'))
+        
+        if not ranking.get('success', True):
+            delay = retry_policy.next_delay(item['attempts']) if retry_policy else 60
+            state = work_queue.fail(item['project_id'], ranking.get('explanation', ''), delay=delay)
+            if state == 'failed':
+                print(f"\033[96m🤖\033[0m Skipped: Failed to generate ranking, giving up after {item['attempts']} attempts")
+            else:
+                print(f"\033[96m🤖\033[0m Deferred: Ranking failed (attempt {item['attempts']}), retrying in {delay:.0f}s")
+            continue
+        
+        score = ranking['score']
+        
+        # Background re-score after a prompt/context change: only save projects that newly qualify
+        if payload.get('rescore'):
+            previous_score = payload.get('previous_score')
+            print(f"🔁 Re-scored project {item['project_id']}: {previous_score} → {score}")
+            if knn_index:
+                knn_index.add(item['project_id'], project_data, score)
+            if score >= settings.score_limit and (previous_score is None or previous_score < settings.score_limit):
+                display_ranked_project(project, ranking, city, country, ranker)
+                process_ranked_project(project_data, ranking, settings.bid_limit, settings.score_limit)
+            work_queue.complete(item['project_id'], ranking)
+            ranked += 1
+            continue
+        
+        display_ranked_project(project, ranking, city, country, ranker)
+        if ranking.get('duplicate_of'):
+            print(f"♻️ Reused ranking of near-duplicate project {ranking['duplicate_of']} "
+                  f"(similarity {ranking['duplicate_similarity']:.2f})")
+        
+        # Compare the local estimates with the LLM score
+        if prescore and payload.get('prescore'):
+            prescore.record_llm_score(item['project_id'], payload['prescore'], score, settings.score_limit)
+        if knn_index:
+            knn = payload.get('knn')
+            if knn and knn.get('score') is not None:
+                print(f"🧭 kNN estimate {knn['score']} (confidence {knn['confidence']:.2f}) vs. AI score {score}")
+            knn_index.add(item['project_id'], project_data, score)
+        
+        # Process and save ranked projects
+        if score >= settings.score_limit:
+            print(f"✅ New Project")
+            print(f"   Score: {score}")
+            print(f"   Location: {city}, {country}")
+            process_ranked_project(project_data, ranking, settings.bid_limit, settings.score_limit)
+        else:
+            print(f"⏭️ Skipped: Score {score} below threshold {settings.score_limit}")
+        
+        work_queue.complete(item['project_id'], ranking)
+        ranked += 1
+    return ranked
+
+def prompt_settings() -> Namespace:
+    """Ask for the run configuration interactively (legacy behaviour of main())"""
     print("\n=== Configuration ===")
     bid_limit = int(input("Enter bid limit (default: 40): ").strip() or "40")
     score_limit = int(input("Enter score limit (default: 50): ").strip() or "50")
@@ -822,78 +1334,124 @@ def main():
     # Clear cache option at startup
     clear_cache_response = input("Cache löschen vor Start? (j/n): ").strip().lower()
     
+    return Namespace(
+        bid_limit=bid_limit,
+        score_limit=score_limit,
+        country_check=country_check,
+        scan_scope=scan_scope,
+        clear_cache=clear_cache_response in ['j', 'ja', 'y', 'yes'],
+        poll_interval=1.0,
+        prescore=True,
+        prescore_margin=None,
+        knn=True,
+        near_duplicates=True,
+        rescore=True,
+        stream=True,
+        cascade=True,
+        batch=True
+    )
+
+def run(settings: Namespace, stop_event=None) -> None:
+    """
+    Run the polling loop with the given settings.
+    
+    Args:
+        settings: Run configuration (see prompt_settings() / daemon.parse_settings())
+        stop_event: Optional threading.Event; when set the loop finishes the current
+            project and returns. Without it, Ctrl-C ends the loop as before.
+    """
+    scan_scope = settings.scan_scope
+    poll_interval = getattr(settings, 'poll_interval', 1.0)
+    
+    def should_stop():
+        return stop_event is not None and stop_event.is_set()
+    
+    def pause(seconds):
+        if stop_event is not None:
+            stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+    
     print("Starting project list test...")
     seen_projects = set()  # Track all projects we've seen
     failed_users = set()  # Track users we've failed to fetch
     cache = FileCache(cache_dir='cache', expiry=3600)
-    ranker = ProjectRanker(config.OPENAI_API_KEY)
-    
-    # Define our expertise/skills with their corresponding job IDs
-    our_skills = [
-        # Web Development
-        {'name': 'PHP', 'id': 3},
-        {'name': 'Python', 'id': None},
-        {'name': 'Laravel', 'id': 1315},
-        {'name': 'Symfony', 'id': 292},
-        {'name': 'Vue.js', 'id': 1613},
-        {'name': 'React', 'id': 759},
-        {'name': 'JavaScript', 'id': 7},
-        {'name': 'TypeScript', 'id': 1109},
-        {'name': 'HTML', 'id': 20},
-        {'name': 'CSS', 'id': 10},
-        {'name': 'Bootstrap', 'id': 319},
-        {'name': 'Tailwind CSS', 'id': 1698},
-        
-        # Backend Development
-        {'name': 'API Development', 'id': 1103},
-        {'name': 'RESTful API', 'id': 1029},
-        {'name': 'Backend Development', 'id': 1295},
-        {'name': 'Web Services', 'id': 93},
-        {'name': 'Database Design', 'id': 583},
-        {'name': 'SQL', 'id': 30},
-        {'name': 'MySQL', 'id': 13},
-        {'name': 'PostgreSQL', 'id': 33},
-        {'name': 'MongoDB', 'id': 527},
-        
-        # Financial Applications
-        {'name': 'Financial Software', 'id': 1139},
-        {'name': 'Accounting Software', 'id': 320},
-        {'name': 'Payment Gateway Integration', 'id': 1241},
-        {'name': 'Stripe', 'id': 1402},
-        {'name': 'PayPal', 'id': 1050},
-        {'name': 'Fintech', 'id': 1597},
-        {'name': 'Banking Software', 'id': 1306},
-        
-        # Dashboard & Analytics
-        {'name': 'Dashboard Development', 'id': 1323},
-        {'name': 'Data Visualization', 'id': 701},
-        {'name': 'Business Intelligence', 'id': 304},
-        {'name': 'Analytics', 'id': 1111},
-        
-        # Corporate Websites
-        {'name': 'WordPress', 'id': 17},
-        {'name': 'CMS Development', 'id': 1483},
-        {'name': 'Corporate Website', 'id': 1264},
-        {'name': 'Responsive Design', 'id': 669},
-        {'name': 'Web Design', 'id': 9},
-        {'name': 'UX/UI Design', 'id': 1424}
-    ]
+    # Each pipeline has its own prompt: the other pipeline's rankings must not look outdated to it
+    ranking_versions = ranking_cache.RankingVersions('cache/ranking_versions_bidder.sqlite3')
+    ranker = ProjectRanker(config.OPENAI_API_KEY, duplicates=near_duplicates.from_settings(settings),
+                           versions=ranking_versions, score_limit=settings.score_limit,
+                           stream_margin=getattr(config, 'RANKING_STREAM_MARGIN', 20)
+                           if getattr(settings, 'stream', True) else None,
+                           cascade=model_cascade.from_settings(settings))
+    
+    # Sharded worker mode: only process our part of the work, dedup across workers
+    shard = coordinator.from_settings(settings)
+    claims = coordinator.SharedSeenStore() if shard else None
+    if shard:
+        print(f"🧩 Worker {shard.worker_id} running in '{shard.shard_mode}' shard mode")
+    worker_id = shard.worker_id if shard else None
+    
+    # Durable queue between filtering and ranking, failed rankings are retried with backoff
+    # One queue per pipeline, their payloads differ
+    work_queue = WorkQueue('cache/work_queue_bidder.sqlite3')
+    retry_policy = RetryPolicy(work_queue=work_queue)
+    
+    our_skills = OUR_SKILLS
     
     # Extract job IDs and skill names for API request
     skill_ids = [skill['id'] for skill in our_skills]
     skill_names = [skill['name'] for skill in our_skills]
-    skill_names_lower = [name.lower() for name in skill_names]
+    
+    # Compiled once instead of renormalizing our skills for every project
+    skill_matcher = SkillMatcher(our_skills)
+    
+    # Local relevance estimate, projects far below the score limit never reach the LLM
+    prescore = prescorer.from_settings(settings, skill_matcher)
+    # Scores of similar, already ranked projects: skip confident misses, rank likely hits first
+    knn_index = similarity_index.from_settings(settings)
+    filter_chain, filter_loaders = build_filter_chain(settings, cache, failed_users, skill_matcher, prescore,
+                                                      knn_index)
     
     # Process the user's choice to clear cache
-    if clear_cache_response in ['j', 'ja', 'y', 'yes']:
+    if settings.clear_cache:
         print("🧹 Lösche alle Cache-Dateien...")
         cache.clear()
         print("✅ Cache wurde vollständig geleert.")
     else:
         print("ℹ️ Cache bleibt erhalten.")
     
+    # Rankings made with an older prompt or context are redone in the background
+    rescore_monitor = None
+    if getattr(settings, 'rescore', True):
+        rescore_monitor = ranking_cache.RescoreMonitor(ranking_versions, ranker, work_queue,
+                                                       getattr(config, 'RESCORE_MAX_AGE_HOURS', 72) * 3600)
+    
+    def rescore_if_changed():
+        result = rescore_monitor.check() if rescore_monitor else None
+        if result and result['invalidated']:
+            print(f"🔁 Prompt/context changed: {result['invalidated']} cached ranking(s) invalidated, "
+                  f"{result['queued']} queued for re-scoring")
+    
     try:
-        while True:
+        rescore_if_changed()
+        
+        # Resume rankings that were queued before a crash or restart; items the crashed run had
+        # in progress are claimable right away instead of after the visibility timeout
+        work_queue.recover(worker_id)
+        work_queue.purge_done()
+        purged_at = time.time()
+        queued = work_queue.stats()
+        if queued['pending'] or queued['in_progress']:
+            print(f"📥 Resuming {queued['pending'] + queued['in_progress']} queued project(s) from the work queue")
+            rank_queued_projects(work_queue, ranker, settings, worker_id, should_stop, retry_policy, prescore,
+                                 knn_index)
+        
+        while not should_stop():
+            # Finished items are only kept for a week, see WorkQueue.purge_done()
+            if time.time() - purged_at > 3600:
+                work_queue.purge_done()
+                purged_at = time.time()
+            
             # Adjust API parameters based on scan scope
             params = {
                 'limit': 50,
@@ -917,17 +1475,21 @@ def main():
             if scan_scope == 'recent':
                 params['timeframe'] = 'last_24_hours'
             
+            # In skills shard mode every worker queries its own slice of our job IDs
+            if shard and shard.shard_mode == 'skills':
+                params['jobs[]'] = shard.shard_items([skill_id for skill_id in skill_ids if skill_id])
+            
             result = get_active_projects(limit=20, params=params)
             
             if 'result' not in result or 'projects' not in result['result']:
-                print("\nNo projects in response, waiting 1 second...")
-                time.sleep(1)
+                print(f"\nNo projects in response, waiting {poll_interval:g} seconds...")
+                pause(poll_interval)
                 continue
                 
             projects = result['result']['projects']
             if not projects:
-                print("\nEmpty projects list, waiting 1 second...")
-                time.sleep(1)
+                print(f"\nEmpty projects list, waiting {poll_interval:g} seconds...")
+                pause(poll_interval)
                 continue
             
             new_projects_found = 0
@@ -936,6 +1498,8 @@ def main():
             
             # Process all projects
             for project in projects:
+                if should_stop():
+                    break
                 current_project += 1
                 project_id = project.get('id')
                 if not project_id:
@@ -945,97 +1509,39 @@ def main():
                 if project_id in seen_projects:
                     continue
                 
-                print(f"\nProcessing project {current_project}/{total_projects}: {project.get('title', 'No Title')} ({config.PROJECT_URL_TEMPLATE.format(project_id)})")
+                # Leave projects owned by another worker alone (ownership moves on rebalance)
+                if shard and not shard.owns_project(project_id):
+                    continue
                 
-                # Check bid count first
-                bid_count = project.get('bid_stats', {}).get('bid_count', 0)
-                if bid_count >= bid_limit:
-                    print(f"\033[91m⏭️\033[0m Skipped: Too many bids ({bid_count} >= {bid_limit})")
+                # Another worker already took this project
+                if claims and not claims.claim(project_id, shard.worker_id):
                     seen_projects.add(project_id)
                     continue
                 
-                # Check country if enabled
-                if country_check:
-                    # First check project's country code
-                    country_code = project.get('country', '')
-                    country = "Unknown"
-                    
-                    if country_code:
-                        if country_code not in config.RICH_COUNTRIES:
-                            print(f"\033[93m🌍\033[0m Skipped: Country code {country_code} not in target list")
-                            seen_projects.add(project_id)
-                            continue
-                    else:
-                        # No country code found, silently continue to check user details
-                        pass
+                print(f"\nProcessing project {current_project}/{total_projects}: {project.get('title', 'No Title')} ({config.PROJECT_URL_TEMPLATE.format(project_id)})")
                 
                 # Check if project is already cached
                 cached_project = cache.get('project_details', f"id_{project_id}")
                 is_new_project = cached_project is None
                 
                 if is_new_project:
-                    # Get user details first to check country
-                    owner_id = project.get('owner_id')
-                    user_details = get_user_details(owner_id, cache, failed_users)
-                    
-                    city = "Unknown"
-                    
-                    if 'result' in user_details:
-                        user_data = user_details['result']
-                        location = user_data.get('location', {})
-                        if location and 'city' in location:
-                            city = location.get('city', 'Unknown')
-                        if location and 'country' in location:
-                            country = location['country'].get('name', 'Unknown')
-                    
-                    # Only skip if we have a valid country and it's not in the target list
-                    if country_check and country != "Unknown" and country not in config.RICH_COUNTRIES_FULL.values():
-                        print(f"\033[93m🌍\033[0m Skipped: Country {country} not in target list")
+                    # Run the filter rules, cheapest and most selective first
+                    context = FilterContext(project, filter_loaders)
+                    passed, rule_name, message = filter_chain.evaluate(context)
+                    if not passed:
+                        print(message)
                         seen_projects.add(project_id)
                         continue
-
-                    # Check if at least one skill matches our skills
-                    project_skills = [skill.get('name', '').lower() for skill in project.get('jobs', [])]
-                    
-                    # Normalize skill names for better matching
-                    def normalize_skill(skill):
-                        return skill.lower().replace('-', ' ').replace('_', ' ').strip()
-                    
-                    normalized_project_skills = [normalize_skill(skill) for skill in project_skills]
-                    normalized_our_skills = [normalize_skill(skill) for skill in skill_names_lower]
                     
-                    # Check for exact matches
-                    exact_matches = set(normalized_project_skills) & set(normalized_our_skills)
-                    if exact_matches:
-                        has_matching_skill = True
-                    else:
-                        # Check for partial matches (e.g., "javascript" in "javascript developer")
-                        has_matching_skill = False
-                        for project_skill in normalized_project_skills:
-                            for our_skill in normalized_our_skills:
-                                if our_skill in project_skill or project_skill in our_skill:
-                                    has_matching_skill = True
-                                    break
-                            if has_matching_skill:
-                                break
-                    
-                    if not has_matching_skill:
-                        print(f"\033[94m🔧\033[0m Skipped: No matching skills found")
-                        seen_projects.add(project_id)
-                        continue
+                    estimate = context.get('prescore') if context.loaded('prescore') else None
+                    if estimate and estimate['audit']:
+                        print(f"🔍 Audit: Pre-score {estimate['score']} would skip this project, ranking it anyway")
+                    knn = context.get('knn') if knn_index else None
                     
                     new_projects_found += 1
                     
-                    # Get user reputation
-                    reputation_data = get_user_reputation(owner_id, cache)
-                    
-                    if 'result' not in reputation_data:
-                        print(f"\033[95m👤\033[0m Skipped: Failed to fetch reputation data")
-                        seen_projects.add(project_id)
-                        continue
-                        
-                    rep_result = reputation_data['result']
-                    user_rep = rep_result.get(str(owner_id), {})
+                    city, country = context.get('location')
+                    user_rep = context.get('user_rep')
                     earnings_score = user_rep.get('earnings_score', 0)
                     
                     # Prepare project data for ranking
@@ -1052,68 +1558,46 @@ def main():
                         'id': project_id
                     }
                     
-                    # Get project ranking
-                    ranking = ranker.rank_project(project_data)
-                    
-                    if not ranking.get('success', True):
-                        print(f"\033[96m🤖\033[0m Skipped: Failed to generate ranking")
-                        seen_projects.add(project_id)
-                        continue
-                    
-                    score = ranking['score']
-                    
-                    # Generate colored ASCII art score
-                    score_ascii_art = format_score_with_ascii_art(score)
-                    
-                    # Create project details for display
-                    project_details = f"""
-📌 {project.get('title', 'No Title')}
-🔗 {config.PROJECT_URL_TEMPLATE.format(project_id)}
-
-┌────────────────────────────────┬────────────────────────────────┬────────────────────────────────┬────────────────────────────────┐
-│ 🤖 SCORE:                       │ 🔧 PROJEKT-FÄHIGKEITEN:         │ 💼 ARBEITGEBER:                 │ 🤖 KI-KONTEXT:                 │
-│ {score_ascii_art}               │                                │                                │   • Konversation: {ranker.conversation_id} │
-│ 💰 BUDGET: ${project.get('budget', {}).get('minimum', 0)} - ${project.get('budget', {}).get('maximum', 0)} │                                │                                │ 🔗 LINKS:                      │
-│                                │                                │                                │   • Projekt: {config.PROJECT_URL_TEMPLATE.format(project_id)} │
-│                                │                                │                                │   • Arbeitgeber: {config.USER_URL_TEMPLATE.format(project.get('owner_username', owner_id))} │
-├────────────────────────────────┼────────────────────────────────┼────────────────────────────────┼────────────────────────────────┤
-│ 🔢 GEBOTE: {str(project.get('bid_stats', {}).get('bid_count', 0)).ljust(20)} │                                │ 🌍 STANDORT: {f"{city}, {country}"[:20].ljust(20)} │                                │
-"""
-                    
-                    # Add skills
-                    skills_text = ""
-                    for skill in project.get('jobs', []):
-                        skills_text += f"│                                │   • {skill.get('name', 'Unknown')[:24].ljust(24)}  │                                │                                │\n"
-                    
-                    project_details += skills_text
-                    project_details += f"""└────────────────────────────────┴────────────────────────────────┴────────────────────────────────┴────────────────────────────────┘
-
-📋 BESCHREIBUNG:
-{project.get('description', 'Keine Beschreibung verfügbar')}
-
-🤖 KI-BEWERTUNG:
-{ranking['explanation']}
-"""
-                    
-                    # Display the box
-                    print(draw_box(project_details))
-                    
-                    # Process and save ranked projects
-                    if score >= score_limit:
-                        print(f"✅ New Project")
-                        print(f"   Score: {score}")
-                        print(f"   Location: {city}, {country}")
-                        process_ranked_project(project_data, ranking, bid_limit, score_limit)
-                    else:
-                        print(f"⏭️ Skipped: Score {score} below threshold {score_limit}")
-                    
+                    # Queue the project for ranking; the queue survives crashes and restarts
+                    work_queue.enqueue(project_id, {
+                        'project': project,
+                        'project_data': project_data,
+                        'city': city,
+                        'country': country,
+                        'prescore': estimate,
+                        'knn': {key: knn[key] for key in ('score', 'confidence')} if knn else None
+                    }, priority=knn['score'] if knn and knn['score'] is not None else settings.score_limit)
                     seen_projects.add(project_id)
+                    rank_queued_projects(work_queue, ranker, settings, worker_id, should_stop, retry_policy, prescore,
+                                         knn_index)
                     continue
                 
                 # Remove the "Project already processed" message
                 continue
             
-            time.sleep(1)
+            print(f"\n📊 {filter_chain.cycle_report()}")
+            if prescore:
+                print(f"🧮 {prescore.cycle_report()}")
+            token_report = ranker.tokens.cycle_report()
+            if token_report:
+                print(f"💰 {token_report}")
+            parse_report = ranker.parse_stats.cycle_report()
+            if parse_report:
+                print(f"🧾 {parse_report}")
+            cascade_report = ranker.cascade.cycle_report() if ranker.cascade else None
+            if cascade_report:
+                print(f"🪜 {cascade_report}")
+            
+            rescore_if_changed()
+            
+            # Pick up queued projects whose retry delay has passed
+            rank_queued_projects(work_queue, ranker, settings, worker_id, should_stop, retry_policy, prescore,
+                                 knn_index)
+            
+            pause(poll_interval)
+        
+        if should_stop():
+            print("\n🛑 Stop requested, shutting down")
             
     except KeyboardInterrupt:
         print("\nTest interrupted by user")
@@ -1121,6 +1605,16 @@ def main():
         print(f"\nError: {str(e)}")
         import traceback
         print(traceback.format_exc())
+    finally:
+        work_queue.close()
+        ranking_versions.close()
+        if knn_index:
+            knn_index.save()
+        if shard:
+            shard.stop()
+
+def main():
+    run(prompt_settings())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -18,4 +18,77 @@ REPUTATIONS_ENDPOINT = '/users/0.1/reputations/'
 
 # URL Templates
 PROJECT_URL_TEMPLATE = 'https://www.freelancer.com/projects/{}'
-USER_URL_TEMPLATE = 'https://www.freelancer.com/u/{}' 
\ No newline at end of file
+USER_URL_TEMPLATE = 'https://www.freelancer.com/u/{}' 
+
+# Local pre-scorer (prescorer.py): skip the LLM for projects whose estimate is
+# more than PRESCORE_MARGIN points below the score limit
+PRESCORE_MARGIN = 30
+PRESCORE_AUDIT_RATE = 0.05  # Share of skipped projects ranked anyway to measure false rejects
+
+# kNN estimate from similar, already ranked projects (similarity_index.py, needs numpy)
+KNN_K = 10
+KNN_MARGIN = 25            # Skip when similar projects scored this far below the score limit...
+KNN_MIN_CONFIDENCE = 0.6   # ...and agree with at least this confidence
+
+# Reposted projects reuse the earlier ranking (near_duplicates.py); share of equal SimHash bits
+NEAR_DUPLICATE_SIMILARITY = 0.9
+
+# After an edit of vyftec-context.md or the prompt, projects ranked within this
+# many hours are re-scored in the background (ranking_cache.py)
+RESCORE_MAX_AGE_HOURS = 72
+
+# Project descriptions longer than this many tokens are condensed (start + end kept)
+# before they go into the ranking and bid prompts (token_budget.py)
+PROMPT_DESCRIPTION_TOKENS = 1500
+# Optional: USD per 1M tokens (prompt, completion) per model for the cost metrics
+# TOKEN_PRICES = {'gpt-3.5-turbo': (0.50, 1.50)}
+
+# Ranking responses are streamed; generation stops as soon as the score is more than
+# this many points below the score limit (ranking_stream.py, daemon --no-stream to disable)
+RANKING_STREAM_MARGIN = 20
+
+# Model cascade (model_cascade.py): a cheap first pass scores every project, projects
+# above the score limit or less than RANKING_CASCADE_BAND points below it are ranked
+# again by the final model (explanation and bid teaser). Off unless a final model is set,
+# e.g. RANKING_CASCADE_FINAL_MODEL = 'gpt-4o'.
+RANKING_CASCADE_FIRST_MODEL = 'gpt-4o-mini'
+RANKING_CASCADE_FINAL_MODEL = None
+RANKING_CASCADE_BAND = 15
+
+# Queue backlogs (batch_ranking.py): with at least RANKING_BATCH_MIN projects waiting, up to
+# RANKING_BATCH_SIZE of them are scored in one request with short summaries. Scores clearly
+# below the limit (more than RANKING_BATCH_BAND points, or the cascade band) are final, the
+# rest is ranked individually. 0 or daemon --no-batch disables batching.
+RANKING_BATCH_SIZE = 20
+RANKING_BATCH_MIN = 5
+RANKING_BATCH_BAND = 15
+RANKING_BATCH_MODEL = 'gpt-4o-mini'
+RANKING_BATCH_DESCRIPTION_TOKENS = 300
+
+# Concurrent rankings of the same project share one LLM call (single_flight.py). Other
+# worker processes wait on a lease file in cache/inflight; a lease older than this many
+# seconds is taken to be abandoned by a crashed worker.
+RANKING_LEASE_TTL = 300
+
+# Alternative OpenAI-compatible endpoint for the rankers, e.g. the local stub for load tests
+# (python openai_stub.py, then 'http://127.0.0.1:8099/v1'). None uses the OPENAI_BASE_URL
+# environment variable or the official API.
+OPENAI_BASE_URL = None
+
+# Saved jobs (job_store.py): one entry per project in this SQLite file, re-ranked projects
+# replace their job. With JOB_FILES the job is also written as jobs/job_<id>_<timestamp>.json
+# for the web frontends (older files of the same project are removed).
+JOB_STORE_PATH = 'jobs/jobs.sqlite3'
+JOB_FILES = True
+
+# Jobs API (python jobs_api.py): paginated, filterable job summaries with ETags
+JOBS_API_HOST = '127.0.0.1'
+JOBS_API_PORT = 5003
+
+# Saved jobs are announced to the jobs API as UDP datagrams on localhost, which pushes them to
+# the UI as Server-Sent Events (GET /api/events). None disables the events.
+JOB_EVENTS_PORT = 5004
+
+# Saved jobs are written by a background thread (job_writer.py); saving only blocks the ranking
+# loop when this many jobs are already waiting to be written
+JOB_WRITER_QUEUE = 1000
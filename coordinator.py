@@ -0,0 +1,260 @@
+"""
+Sharded multi-worker mode.
+
+Several workers can poll in parallel when each one owns a shard of the work:
+
+- ``hash``: every worker fetches the same project feed, but only processes the
+  project IDs that hash to it (rendezvous hashing over the live workers).
+- ``skills``: the skill/job query is split between the live workers, so each
+  worker asks the API for a different slice of the query space.
+
+Membership is tracked with heartbeat files in a shared directory. A worker whose
+heartbeat is older than ``worker_timeout`` is considered dead and its shard is
+picked up by the others on their next lookup. A shared claim store makes sure a
+project is only ranked once, even while shards move during a rebalance. The
+ranking/user caches are the existing file caches in ``cache/`` which are shared
+by all workers anyway.
+
+``run_coordinator()`` is the local coordinator: it starts N worker processes of
+``daemon.py``, restarts any that die and forwards stop signals to them.
+"""
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+def _stable_hash(*parts) -> int:
+    digest = hashlib.blake2b('|'.join(str(p) for p in parts).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+def _write_atomic(path: Path, data: str) -> None:
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class ShardCoordinator:
+    """Heartbeat based membership and shard assignment for one worker"""
+
+    def __init__(self, worker_id: str, shard_mode: str = 'hash', state_dir: str = 'cache/workers',
+                 heartbeat_interval: float = 5, worker_timeout: float = 20, membership_ttl: float = 1):
+        """
+        Args:
+            membership_ttl: Seconds the list of live workers is reused before the heartbeats are read again
+        """
+        if shard_mode not in ('hash', 'skills'):
+            raise ValueError(f"Unknown shard mode: {shard_mode}")
+        self.worker_id = str(worker_id)
+        self.shard_mode = shard_mode
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_timeout = worker_timeout
+        self.membership_ttl = membership_ttl
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_members = []
+        self._members_read_at = None
+
+    @property
+    def heartbeat_path(self) -> Path:
+        return self.state_dir / f"worker_{self.worker_id}.json"
+
+    def heartbeat(self) -> None:
+        _write_atomic(self.heartbeat_path, json.dumps({
+            'worker_id': self.worker_id,
+            'pid': os.getpid(),
+            'shard_mode': self.shard_mode,
+            'timestamp': time.time()
+        }))
+
+    def start(self) -> 'ShardCoordinator':
+        """Register this worker and keep its heartbeat fresh from a background thread"""
+        self.heartbeat()
+
+        def beat():
+            while not self._stop.wait(self.heartbeat_interval):
+                try:
+                    self.heartbeat()
+                except OSError as e:
+                    print(f"⚠️ Worker {self.worker_id}: heartbeat failed: {str(e)}")
+
+        self._thread = threading.Thread(target=beat, name=f"heartbeat-{self.worker_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Deregister so the remaining workers take over this shard right away"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        try:
+            self.heartbeat_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def live_workers(self) -> List[str]:
+        # owns_project() runs for every project of a cycle, read the heartbeats only once in a while
+        if self._members_read_at is not None and time.monotonic() - self._members_read_at < self.membership_ttl:
+            return self._last_members
+        self._members_read_at = time.monotonic()
+        now = time.time()
+        workers = []
+        for path in self.state_dir.glob('worker_*.json'):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - info.get('timestamp', 0) > self.worker_timeout:
+                continue
+            workers.append(str(info.get('worker_id')))
+        if self.worker_id not in workers:
+            # Our own heartbeat may be late or not written yet, we are alive by definition
+            workers.append(self.worker_id)
+        workers.sort()
+        if workers != self._last_members:
+            if self._last_members:
+                print(f"🔀 Worker {self.worker_id}: rebalancing, live workers {', '.join(workers)}")
+            self._last_members = workers
+        return workers
+
+    def owns_project(self, project_id) -> bool:
+        """Rendezvous hashing: the live worker with the highest hash for the project owns it"""
+        if self.shard_mode != 'hash':
+            return True
+        workers = self.live_workers()
+        owner = max(workers, key=lambda worker: _stable_hash(worker, project_id))
+        return owner == self.worker_id
+
+    def shard_items(self, items: list) -> list:
+        """This worker's slice of a query list (skills mode), round-robin over the live workers"""
+        if self.shard_mode != 'skills':
+            return list(items)
+        workers = self.live_workers()
+        index = workers.index(self.worker_id)
+        return [item for i, item in enumerate(items) if i % len(workers) == index]
+
+class SharedSeenStore:
+    """Cross-process dedup: the first worker to claim a project ID processes it"""
+
+    def __init__(self, claims_dir: str = 'cache/claims', ttl: float = 24 * 3600, purge_interval: float = 3600):
+        """
+        Args:
+            ttl: Seconds after which a claim expires and the project may be processed again
+            purge_interval: Seconds between two sweeps that delete expired claim files
+        """
+        self.claims_dir = Path(claims_dir)
+        self.claims_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._purged_at = None
+
+    def _path(self, project_id) -> Path:
+        return self.claims_dir / f"id_{project_id}.claim"
+
+    def purge_expired(self) -> int:
+        """Delete expired claim files, returns how many were deleted"""
+        cutoff = time.time() - self.ttl
+        purged = 0
+        with os.scandir(self.claims_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.name.endswith('.claim') and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        purged += 1
+                except FileNotFoundError:
+                    pass
+        return purged
+
+    def claim(self, project_id, worker_id: str) -> bool:
+        if self._purged_at is None or time.monotonic() - self._purged_at > self.purge_interval:
+            self._purged_at = time.monotonic()
+            self.purge_expired()
+        path = self._path(project_id)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                expired = time.time() - os.path.getmtime(path) > self.ttl
+            except FileNotFoundError:
+                expired = True
+            if not expired:
+                return False
+            # Stale claim, e.g. from a worker that crashed mid-ranking: take it over
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return self.claim(project_id, worker_id)
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(worker_id))
+        return True
+
+    def release(self, project_id) -> None:
+        """Give a project back, e.g. when its ranking failed and should be retried"""
+        try:
+            self._path(project_id).unlink()
+        except FileNotFoundError:
+            pass
+
+def from_settings(settings) -> Optional[ShardCoordinator]:
+    """Create and start the coordinator for a worker, or None when not running sharded"""
+    worker_id = getattr(settings, 'worker_id', None)
+    if not worker_id:
+        return None
+    return ShardCoordinator(worker_id, shard_mode=getattr(settings, 'shard_mode', 'hash')).start()
+
+def run_coordinator(workers: int, worker_args: List[str], restart_delay: float = 2) -> int:
+    """
+    Start ``workers`` daemon processes and keep them running until stopped.
+
+    Args:
+        workers: Number of worker processes
+        worker_args: Arguments passed on to every worker (without --worker-id)
+        restart_delay: Seconds to wait before restarting a worker that exited
+    """
+    stop_event = threading.Event()
+
+    def handle(signum, frame):
+        print(f"\n🛑 Coordinator received signal {signum}, stopping workers...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+
+    daemon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'daemon.py')
+
+    def spawn(worker_id):
+        cmd = [sys.executable, daemon_path, *worker_args, '--worker-id', worker_id]
+        print(f"🚀 Starting worker {worker_id}")
+        return subprocess.Popen(cmd)
+
+    processes = {f"w{i}": spawn(f"w{i}") for i in range(workers)}
+
+    while not stop_event.wait(1):
+        for worker_id, process in list(processes.items()):
+            exit_code = process.poll()
+            if exit_code is None:
+                continue
+            print(f"💥 Worker {worker_id} exited with code {exit_code}, restarting in {restart_delay:g}s")
+            if stop_event.wait(restart_delay):
+                break
+            processes[worker_id] = spawn(worker_id)
+
+    for process in processes.values():
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+    for worker_id, process in processes.items():
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ Worker {worker_id} did not stop in time, killing it")
+            process.kill()
+    return 0
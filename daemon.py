@@ -0,0 +1,189 @@
+"""
+Non-interactive entry point for running the bidder under a supervisor.
+
+Every option can be given as a command line flag or as an environment variable,
+flags win over the environment:
+
+    python daemon.py --bid-limit 30 --score-limit 60 --scan-scope past
+    BIDDER_PIPELINE=api BIDDER_REPORT=1 python daemon.py
+    python daemon.py --workers 4 --shard-mode hash
+
+SIGTERM and SIGINT request a clean stop: the current project is finished and
+the loop returns instead of being killed mid-write.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+
+TRUE_VALUES = ['1', 'true', 'yes', 'y', 'j', 'ja', 'on']
+
+def _env(name, default=None):
+    value = os.environ.get(name)
+    return default if value in (None, '') else value
+
+def _env_flag(name, default=False):
+    value = _env(name)
+    if value is None:
+        return default
+    return value.strip().lower() in TRUE_VALUES
+
+def build_parser() -> argparse.ArgumentParser:
+    # Env defaults stay strings, argparse converts them with ``type`` and reports bad values as usage errors
+    parser = argparse.ArgumentParser(description="Freelancer project bidder (headless mode)")
+    parser.add_argument('--pipeline', choices=['bidder', 'api'],
+                        default=_env('BIDDER_PIPELINE', 'bidder'),
+                        help="bidder = bidder.run(), api = freelancer_api.run() (env: BIDDER_PIPELINE)")
+    parser.add_argument('--bid-limit', type=int,
+                        default=_env('BIDDER_BID_LIMIT', '40'),
+                        help="Skip projects with this many bids or more (env: BIDDER_BID_LIMIT)")
+    parser.add_argument('--score-limit', type=int,
+                        default=_env('BIDDER_SCORE_LIMIT'),
+                        help="Minimum AI score for saving a job; defaults to 50 for the bidder "
+                             "pipeline and config.bidscoreLimit for the api pipeline (env: BIDDER_SCORE_LIMIT)")
+    parser.add_argument('--no-country-check', dest='country_check', action='store_false',
+                        default=_env_flag('BIDDER_COUNTRY_CHECK', True),
+                        help="Disable the country filter (env: BIDDER_COUNTRY_CHECK=0)")
+    parser.add_argument('--scan-scope', choices=['recent', 'past'],
+                        default=_env('BIDDER_SCAN_SCOPE', 'recent'),
+                        help="recent = last 24 hours only (env: BIDDER_SCAN_SCOPE)")
+    parser.add_argument('--clear-cache', action='store_true',
+                        default=_env_flag('BIDDER_CLEAR_CACHE'),
+                        help="Clear all cache files and jobs before starting (env: BIDDER_CLEAR_CACHE)")
+    parser.add_argument('--poll-interval', type=float,
+                        default=_env('BIDDER_POLL_INTERVAL'),
+                        help="Seconds to wait between polling cycles; defaults to 1 for the bidder "
+                             "pipeline and 20 for the api pipeline (env: BIDDER_POLL_INTERVAL)")
+    parser.add_argument('--report', action='store_true',
+                        default=_env_flag('BIDDER_REPORT'),
+                        help="Print the ranked projects summary on shutdown (env: BIDDER_REPORT)")
+    parser.add_argument('--workers', type=int,
+                        default=_env('BIDDER_WORKERS', '1'),
+                        help="Run as coordinator with this many sharded worker processes (env: BIDDER_WORKERS)")
+    parser.add_argument('--worker-id',
+                        default=_env('BIDDER_WORKER_ID'),
+                        help="Run as one sharded worker with this ID (set by the coordinator) (env: BIDDER_WORKER_ID)")
+    parser.add_argument('--shard-mode', choices=['hash', 'skills'],
+                        default=_env('BIDDER_SHARD_MODE', 'hash'),
+                        help="hash = split project IDs, skills = split the skill query (env: BIDDER_SHARD_MODE)")
+    parser.add_argument('--no-prescore', dest='prescore', action='store_false',
+                        default=_env_flag('BIDDER_PRESCORE', True),
+                        help="Send every filtered project to the LLM without the local pre-score (env: BIDDER_PRESCORE=0)")
+    parser.add_argument('--prescore-margin', type=float,
+                        default=_env('BIDDER_PRESCORE_MARGIN'),
+                        help="Skip projects whose local pre-score is this far below the score limit; "
+                             "defaults to config.PRESCORE_MARGIN or 30 (env: BIDDER_PRESCORE_MARGIN)")
+    parser.add_argument('--no-knn', dest='knn', action='store_false',
+                        default=_env_flag('BIDDER_KNN', True),
+                        help="Don't use the scores of similar past projects (needs numpy) (env: BIDDER_KNN=0)")
+    parser.add_argument('--no-near-duplicates', dest='near_duplicates', action='store_false',
+                        default=_env_flag('BIDDER_NEAR_DUPLICATES', True),
+                        help="Rank reposted projects again instead of reusing the earlier ranking "
+                             "(env: BIDDER_NEAR_DUPLICATES=0)")
+    parser.add_argument('--no-rescore', dest='rescore', action='store_false',
+                        default=_env_flag('BIDDER_RESCORE', True),
+                        help="Don't re-score recent projects after a prompt/context change (env: BIDDER_RESCORE=0)")
+    parser.add_argument('--no-stream', dest='stream', action='store_false',
+                        default=_env_flag('BIDDER_STREAM', True),
+                        help="Wait for complete ranking responses instead of streaming them and stopping "
+                             "after a clearly too low score (env: BIDDER_STREAM=0)")
+    parser.add_argument('--no-cascade', dest='cascade', action='store_false',
+                        default=_env_flag('BIDDER_CASCADE', True),
+                        help="Rank every project with a single model even if config.RANKING_CASCADE_FINAL_MODEL "
+                             "sets up a cheap first pass and a stronger model for finalists (env: BIDDER_CASCADE=0)")
+    parser.add_argument('--no-batch', dest='batch', action='store_false',
+                        default=_env_flag('BIDDER_BATCH', True),
+                        help="Rank a queue backlog one project at a time instead of batch-scoring it first "
+                             "(env: BIDDER_BATCH=0)")
+    return parser
+
+def _strip_option(argv, option, has_value=True):
+    """Remove an option (and its value, unless it is a plain flag) from an argument list"""
+    result = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg == option:
+            skip = has_value
+            continue
+        if arg.startswith(option + '='):
+            continue
+        result.append(arg)
+    return result
+
+def parse_settings(argv=None) -> argparse.Namespace:
+    settings = build_parser().parse_args(argv)
+
+    # Pipeline specific defaults for options that were not given explicitly
+    if settings.score_limit is None:
+        if settings.pipeline == 'api':
+            import config
+            settings.score_limit = config.bidscoreLimit
+        else:
+            settings.score_limit = 50
+    settings.score_limit = int(settings.score_limit)
+
+    if settings.poll_interval is None:
+        settings.poll_interval = 20 if settings.pipeline == 'api' else 1
+    settings.poll_interval = float(settings.poll_interval)
+
+    return settings
+
+def clear_cache(pipeline: str) -> None:
+    """Clear the pipeline's caches once, before the workers start"""
+    print("🧹 Lösche alle Cache-Dateien...")
+    if pipeline == 'api':
+        import freelancer_api
+        freelancer_api.FileCache(cache_dir='cache').clear()
+    else:
+        import bidder
+        bidder.FileCache(cache_dir='cache').clear()
+    print("✅ Cache wurde vollständig geleert.")
+
+def install_signal_handlers(stop_event: threading.Event) -> None:
+    """Turn SIGTERM/SIGINT into a stop request; a second signal exits immediately"""
+    def handle(signum, frame):
+        if stop_event.is_set():
+            print(f"\n⚠️ Received signal {signum} again, exiting immediately")
+            sys.exit(128 + signum)
+        print(f"\n🛑 Received signal {signum}, stopping after the current project...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, handle)
+
+def main(argv=None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    settings = parse_settings(argv)
+
+    if settings.workers > 1 and not settings.worker_id:
+        import coordinator
+        worker_args = _strip_option(_strip_option(argv, '--workers'), '--clear-cache', has_value=False)
+        # Don't let the workers inherit the coordinator role or the cache clearing through the
+        # environment: every (re)started worker would wipe the cache and the saved jobs again
+        os.environ.pop('BIDDER_WORKERS', None)
+        os.environ.pop('BIDDER_CLEAR_CACHE', None)
+        if settings.clear_cache:
+            clear_cache(settings.pipeline)
+        return coordinator.run_coordinator(settings.workers, worker_args)
+
+    stop_event = threading.Event()
+    install_signal_handlers(stop_event)
+
+    # The pipelines pull in requests/openai, so only import the one we run
+    if settings.pipeline == 'api':
+        import freelancer_api
+        freelancer_api.run(settings, stop_event)
+    else:
+        import bidder
+        bidder.run(settings, stop_event)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
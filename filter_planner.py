@@ -0,0 +1,126 @@
+"""
+Cost-based filter planner.
+
+Project filters are declared as rules and compiled into a predicate chain.
+Each rule reports its own rejection; the chain measures how long every rule
+takes (including the user/reputation requests it triggers) and how often it
+rejects, and keeps the rules ordered by expected cost per rejection. Cheap,
+selective local checks therefore run before anything that needs a request.
+
+Rules share a FilterContext which loads expensive data (user details,
+reputation) lazily and only once per project, so a project that is rejected by
+a local rule never triggers those requests at all.
+"""
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+class FilterContext:
+    """The project under test plus lazily loaded, memoized extra data"""
+
+    def __init__(self, project: Dict, loaders: Dict[str, Callable] = None):
+        self.project = project
+        self._loaders = loaders or {}
+        self._values = {}
+
+    def get(self, name: str):
+        if name not in self._values:
+            self._values[name] = self._loaders[name](self)
+        return self._values[name]
+
+    def loaded(self, name: str) -> bool:
+        return name in self._values
+
+class FilterRule:
+    def __init__(self, name: str, check: Callable[[FilterContext], Optional[str]],
+                 cost_hint: float = 0.00001):
+        """
+        Args:
+            name: Rule name used in reports
+            check: Returns None if the project passes, otherwise the skip message
+            cost_hint: Expected seconds per evaluation, used until real timings exist
+                (local checks ~10µs, anything doing a request ~0.5s)
+        """
+        self.name = name
+        self.check = check
+        self.cost_hint = cost_hint
+        self.evaluated = 0
+        self.rejected = 0
+        self.total_time = 0.0
+        self.cycle_evaluated = 0
+        self.cycle_rejected = 0
+
+    @property
+    def avg_cost(self) -> float:
+        # The hint counts as two prior observations so a single fast cached call
+        # doesn't immediately move a network rule to the front
+        return (self.total_time + 2 * self.cost_hint) / (self.evaluated + 2)
+
+    @property
+    def reject_rate(self) -> float:
+        # Laplace smoothing, unknown rules start at 50%
+        return (self.rejected + 1) / (self.evaluated + 2)
+
+    @property
+    def rank(self) -> float:
+        """Expected cost per rejection; lower runs earlier"""
+        return self.avg_cost / self.reject_rate
+
+class FilterChain:
+    def __init__(self, rules: List[FilterRule], reorder_every: int = 25):
+        """
+        Args:
+            rules: The filter rules, in any order
+            reorder_every: Re-plan the order after this many evaluated projects
+        """
+        self.rules = list(rules)
+        self.reorder_every = reorder_every
+        self._since_reorder = 0
+        self.replan()
+
+    def replan(self) -> None:
+        self.rules.sort(key=lambda rule: rule.rank)
+        self._since_reorder = 0
+
+    def evaluate(self, context: FilterContext) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        Run the rules in planned order until one rejects
+
+        Returns:
+            (passed, name of the rejecting rule, skip message)
+        """
+        result = (True, None, None)
+        for rule in self.rules:
+            start = time.perf_counter()
+            message = rule.check(context)
+            rule.total_time += time.perf_counter() - start
+            rule.evaluated += 1
+            rule.cycle_evaluated += 1
+            if message is not None:
+                rule.rejected += 1
+                rule.cycle_rejected += 1
+                result = (False, rule.name, message)
+                break
+
+        self._since_reorder += 1
+        if self._since_reorder >= self.reorder_every:
+            self.replan()
+        return result
+
+    def cycle_report(self, reset: bool = True) -> str:
+        """One line with the per-rule rejects of the current cycle, in planned order"""
+        parts = []
+        for rule in self.rules:
+            parts.append(f"{rule.name}={rule.cycle_rejected}/{rule.cycle_evaluated} ({rule.avg_cost * 1000:.1f}ms)")
+            if reset:
+                rule.cycle_evaluated = 0
+                rule.cycle_rejected = 0
+        return "Filter rejects: " + ", ".join(parts)
+
+    def stats(self) -> List[Dict]:
+        return [{
+            'name': rule.name,
+            'evaluated': rule.evaluated,
+            'rejected': rule.rejected,
+            'avg_cost_ms': rule.avg_cost * 1000,
+            'reject_rate': rule.reject_rate
+        } for rule in self.rules]
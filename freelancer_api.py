@@ -4,16 +4,30 @@ from typing import Dict, List, Optional
 from datetime import datetime
 from pprint import pprint
 import config
-import openai
 import time
 from concurrent.futures import ThreadPoolExecutor
-import tqdm
 import sys
 from io import StringIO
 import os
 import pickle
 import hashlib
 from pathlib import Path
+from argparse import Namespace
+import coordinator
+from work_queue import WorkQueue, RetryPolicy
+from skill_matcher import SkillMatcher
+import prescorer
+import similarity_index
+import near_duplicates
+import ranking_cache
+import prompt_context
+import token_budget
+import structured_output
+import ranking_stream
+import model_cascade
+import batch_ranking
+import single_flight
+import job_writer
 
 class FreelancerAPI:
     def __init__(self, api_key: str, cache_expiry: int = 3600):
@@ -202,7 +216,7 @@ class FreelancerAPI:
         return result
 
     def clear_cache(self) -> None:
-        """Clear all caches."""
+        """Clear all caches. Saved jobs (job files and job store) are kept, unlike in bidder.py."""
         self.cache.clear()
 
     def get_cache_stats(self) -> Dict:
@@ -254,11 +268,11 @@ class FreelancerAPI:
 
     def save_job_to_json(self, project_data: Dict, ranking_data: Dict) -> None:
         """
-        Save complete job data including project details and ranking to a JSON file
+        Save complete job data including project details and ranking; the job is queued
+        and stored in the background by job_writer.py
         """
         try:
             project_id = project_data.get('id', 'unknown')
-            print(f"\nDebug: Attempting to save job {project_id} to JSON...")
             
             # Generate project URL using the template from config
             project_url = config.PROJECT_URL_TEMPLATE.format(project_id)
@@ -285,36 +299,20 @@ class FreelancerAPI:
                 }
             }
 
-            # Create filename with timestamp and project ID
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"job_{project_id}_{timestamp}.json"
-            file_path = self.jobs_dir / filename
-
-            print(f"Debug: Saving to file: {file_path}")
-            
-            # Save to JSON file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(job_data, f, indent=4, ensure_ascii=False)
-            
-            print(f"✅ Saved job data for project {project_id} to {filename}")
+            # One entry per project, a re-ranked project replaces its earlier job
+            job_writer.shared(self.jobs_dir).submit(job_data)
             
         except Exception as e:
             print(f"❌ Error saving job data for project {project_id}: {str(e)}")
-            print(f"Debug: Full error traceback:")
-            import traceback
-            print(traceback.format_exc())
 
-    def process_ranked_project(self, project_data: Dict, ranking_data: Dict) -> None:
+    def process_ranked_project(self, project_data: Dict, ranking_data: Dict,
+                               bid_limit: int = 40, score_limit: int = None) -> None:
         """
         Process a ranked project and save it if it meets the criteria
         """
-        # Add debug logging
-        print(f"\nDebug: Processing ranked project...")
-        print(f"Debug: Project ID: {project_data.get('id', 'unknown')}")
-        print(f"Debug: Score: {ranking_data.get('score', 0)}")
-        print(f"Debug: Bid count: {project_data.get('bid_stats', {}).get('bid_count', 0)}")
-        print(f"Debug: Has bid text: {bool(ranking_data.get('explanation', '').strip())}")
-        
+        if score_limit is None:
+            score_limit = config.bidscoreLimit
+
         # Get the score from ranking data
         score = ranking_data.get('score', 0)
         
@@ -324,74 +322,19 @@ class FreelancerAPI:
         
         # Define your criteria here
         meets_criteria = (
-            score >= config.bidscoreLimit and  # Score is above threshold
-            bid_count < 40 and                 # Not too many bids
-            has_bid_text                       # Has generated bid text
+            score >= score_limit and   # Score is above threshold
+            bid_count < bid_limit and  # Not too many bids
+            has_bid_text               # Has generated bid text
         )
         
-        print(f"Debug: Meets criteria: {meets_criteria}")
-        
         if meets_criteria:
-            print(f"Debug: Saving job to JSON...")
             self.save_job_to_json(project_data, ranking_data)
-        else:
-            print(f"Debug: Project did not meet criteria:")
-            print(f"  - Score >= {config.bidscoreLimit}: {score >= config.bidscoreLimit}")
-            print(f"  - Bid count < 40: {bid_count < 40}")
-            print(f"  - Has bid text: {has_bid_text}")
 
-class ProjectRanker:
-    def __init__(self, api_key: str, cache_expiry: int = 3600, max_retries: int = 3, retry_delay: int = 5):
-        self.client = openai.OpenAI(api_key=api_key)
-        self.conversation_id = "chatcmpl-BDpJQA3iphEQ1bVrfRin9e55MjyV4"
-        # Initialize file-based cache for OpenAI queries
-        self.cache = FileCache(cache_dir='cache', expiry=cache_expiry)
-        # Retry settings
-        self.max_retries = max_retries
-        self.retry_delay = retry_delay
-        
-    def rank_project(self, project_data: Dict, progress_bar=None) -> Dict:
-        # Extract Projekt-ID
-        project_id = project_data.get('project_id', None)
-        if project_id is None:
-            project_id = project_data.get('id', 'unknown_id')
-        
-        # Create cache key
-        cache_key = f"project_id_{project_id}"
-        
-        # Check cache first
-        cached_ranking = self.cache.get('openai', cache_key)
-        if cached_ranking:
-            # Don't use cached failed rankings
-            if cached_ranking.get('score', 0) == 0 and "failed" in cached_ranking.get('explanation', '').lower():
-                if progress_bar:
-                    progress_bar.set_description_str(f"🔄 Retrying previously failed ranking for project ID {project_id}")
-            else:
-                if progress_bar:
-                    progress_bar.set_description_str(f"💾 CACHE: Loading AI ranking for project ID {project_id}")
-                return cached_ranking
-        
-        # Implement retry logic
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                if progress_bar:
-                    project_title = project_data.get('title', 'Untitled Project')
-                    if attempt > 1:
-                        progress_bar.set_description_str(f"🔄 Retry #{attempt} - Generating ranking for project ID {project_id}")
-                    else:
-                        progress_bar.set_description_str(f"🤖 AI: Generating ranking for project ID {project_id}")
-                
-                prompt = self._create_ranking_prompt(project_data)
-                
-                # Read the vyftec-context.md content
-                with open('vyftec-context.md', 'r') as file:
-                    vyftec_context = file.read()
-                
-                # Use the OpenAI API with a timeout
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": f"""
+RANKING_MODEL = "gpt-3.5-turbo"
+
+def ranking_system_prompt(context: str) -> str:
+    """System prompt for the ranking; its hash (rendered without context) is part of the ranking cache key"""
+    return f"""
 
 Your task is to return a score indicating how well a project fits Vyftec's expertise. We will provide project titles and descriptions. Your response should include:
 
@@ -405,15 +348,15 @@ Response Format (JSON)
 
 Return the response in JSON format:
 
-{
+{{
   "score": <int>,
   "explanation": "<string>",
-  "bid_teaser": {
+  "bid_teaser": {{
     "first_paragraph": "<string>",
     "second_paragraph": "<string>",
     "third_paragraph": "<string>"
-  }
-}
+  }}
+}}
 
 If the score is below {config.bidscoreLimit}, omit the bid_teaser field.
 
@@ -469,36 +412,246 @@ End the third paragraph with a contextual, humorous sign-off, and sign with "Dam
 
 Here is the context from vyftec-context.md:
 
-                        {vyftec_context}
-"""},
+                        {context}
+"""
 
+class ProjectRanker:
+    def __init__(self, api_key: str, cache_expiry: int = 3600, max_retries: int = 3, retry_delay: int = 5,
+                 duplicates=None, versions=None, score_limit: int = None, stream_margin: int = None,
+                 cascade: model_cascade.Cascade = None):
+        # Imported lazily so a supervised restart doesn't pay for the SDK import
+        # before the first project is even fetched
+        import openai
+        # config.OPENAI_BASE_URL (or the OPENAI_BASE_URL env var) points the client elsewhere, e.g. openai_stub.py
+        self.client = openai.OpenAI(api_key=api_key, base_url=getattr(config, 'OPENAI_BASE_URL', None))
+        self._retryable_errors = (openai.APITimeoutError, openai.RateLimitError)
+        self.conversation_id = "chatcmpl-BDpJQA3iphEQ1bVrfRin9e55MjyV4"
+        # Initialize file-based cache for OpenAI queries
+        self.cache = FileCache(cache_dir='cache', expiry=cache_expiry)
+        # Retry settings
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        # Optional near_duplicates.NearDuplicateIndex, reposts reuse earlier rankings
+        self.duplicates = duplicates
+        # Rankings are cached per project content, prompt and context version
+        self.versions = versions
+        # Company context is read once and reloaded when the file changes
+        self.prompt_context = prompt_context.shared('vyftec-context.md')
+        # Long descriptions are condensed to this many tokens, every call is metered
+        self.description_tokens = getattr(config, 'PROMPT_DESCRIPTION_TOKENS', 1500)
+        self.tokens = token_budget.from_config()
+        self.parse_stats = structured_output.ParseStats()
+        # With a margin the response is streamed and cut off once the score is that far below the limit
+        self.score_limit = score_limit if score_limit is not None else config.bidscoreLimit
+        self.stream_margin = stream_margin
+        # Optional model cascade: cheap first pass for every project, strong model for the finalists
+        self.cascade = cascade
+        # Rankings of the same project that run at the same time share one LLM call
+        self.single_flight = single_flight.shared()
+        # Backlogs are scored in batches with the first-pass model (needs structured outputs)
+        self.batch_model = cascade.first_model if cascade else getattr(config, 'RANKING_BATCH_MODEL', 'gpt-4o-mini')
+        models = (cascade.first_model, cascade.final_model, cascade.band) if cascade else RANKING_MODEL
+        self.prompt_version = ranking_cache.fingerprint(
+            models, ranking_system_prompt(''), self._create_ranking_prompt({}), self.description_tokens,
+            structured_output.SCORE_SCHEMA
+        )
+    
+    def context_fingerprint(self) -> str:
+        """Hash of vyftec-context.md (the ranking prompt includes it)"""
+        return self.prompt_context.fingerprint()
+    
+    def ranking_versions(self, project_data: Dict) -> tuple:
+        """(content, prompt, context) hashes a ranking of this project depends on"""
+        return (ranking_cache.content_fingerprint(project_data), self.prompt_version,
+                self.context_fingerprint())
+
+    @staticmethod
+    def _ranking_prefix(context: str) -> list:
+        """Static start of every ranking request (system prompt incl. context), the project follows as last message"""
+        return [{"role": "system", "content": ranking_system_prompt(context)}]
+
+    @staticmethod
+    def batch_prefix(context: str) -> list:
+        """Static start of a batch ranking request (batch_ranking.py)"""
+        return [
+            {"role": "system", "content": ranking_system_prompt(context)},
+            {"role": "user", "content": batch_ranking.BATCH_INSTRUCTIONS}
+        ]
+
+    def rank_batch(self, projects: List[Dict]) -> Dict:
+        """Score a backlog in one request and cache the clear misses, see batch_ranking.rank_batch()"""
+        band = self.cascade.band if self.cascade else getattr(config, 'RANKING_BATCH_BAND', 15)
+        return batch_ranking.rank_batch(self, projects, band=band,
+                                        description_tokens=getattr(config, 'RANKING_BATCH_DESCRIPTION_TOKENS', 300))
+        
+    def rank_project(self, project_data: Dict, progress_bar=None, max_attempts: int = None,
+                     allow_reuse: bool = True) -> Dict:
+        """
+        Score a project with the LLM.
+        
+        max_attempts overrides self.max_retries; the work queue passes 1 so a failure
+        returns immediately and is rescheduled instead of sleeping inline.
+        
+        allow_reuse=False skips the near-duplicate shortcut, so a re-score after a prompt or
+        context change always asks the LLM.
+        
+        Concurrent calls for the same project (other threads or worker processes) share a
+        single LLM call, see single_flight.py.
+        """
+        project_id = project_data.get('project_id', None) or project_data.get('id', 'unknown_id')
+        cache_key = ranking_cache.ranking_cache_key(project_id, self.ranking_versions(project_data))
+        # Cache hits don't need the single-flight lease
+        cached_ranking = self._cached_ranking(cache_key, project_id, progress_bar)
+        if cached_ranking:
+            return cached_ranking
+        return self.single_flight.do(
+            cache_key,
+            lambda: self._rank_project(project_data, progress_bar, max_attempts, allow_reuse),
+            lambda: self.cache.get('openai', cache_key)
+        )
 
+    def _cached_ranking(self, cache_key: str, project_id, progress_bar=None) -> Optional[Dict]:
+        """Cached ranking for the key, None if there is none or it is a failed one"""
+        cached_ranking = self.cache.get('openai', cache_key)
+        if cached_ranking:
+            # Don't use cached failed rankings
+            if cached_ranking.get('score', 0) == 0 and "failed" in cached_ranking.get('explanation', '').lower():
+                if progress_bar:
+                    progress_bar.set_description_str(f"🔄 Retrying previously failed ranking for project ID {project_id}")
+            else:
+                if progress_bar:
+                    progress_bar.set_description_str(f"💾 CACHE: Loading AI ranking for project ID {project_id}")
+                return cached_ranking
+        return None
 
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=500,
-                    timeout=60  # Set a timeout for the request
-                )
+    def _rank_project(self, project_data: Dict, progress_bar=None, max_attempts: int = None,
+                      allow_reuse: bool = True) -> Dict:
+        max_attempts = max_attempts or self.max_retries
+        
+        # Extract Projekt-ID
+        project_id = project_data.get('project_id', None)
+        if project_id is None:
+            project_id = project_data.get('id', 'unknown_id')
+        
+        # Create cache key
+        versions = self.ranking_versions(project_data)
+        cache_key = ranking_cache.ranking_cache_key(project_id, versions)
+        
+        # Check cache first
+        cached_ranking = self._cached_ranking(cache_key, project_id, progress_bar)
+        if cached_ranking:
+            return cached_ranking
+        
+        # Reposts of a project we already ranked with the current prompt and context reuse that ranking
+        if self.duplicates and allow_reuse:
+            reused = self.duplicates.reuse_ranking(project_id, project_data, versions[1:])
+            if reused:
+                if progress_bar:
+                    progress_bar.set_description_str(f"♻️ Reusing ranking of near-duplicate project {reused['duplicate_of']}")
+                self.cache.set('openai', cache_key, reused)
+                if self.versions:
+                    self.versions.record(project_id, cache_key, versions, reused.get('score'))
+                return reused
+        
+        # Implement retry logic
+        for attempt in range(1, max_attempts + 1):
+            try:
+                if progress_bar:
+                    project_title = project_data.get('title', 'Untitled Project')
+                    if attempt > 1:
+                        progress_bar.set_description_str(f"🔄 Retry #{attempt} - Generating ranking for project ID {project_id}")
+                    else:
+                        progress_bar.set_description_str(f"🤖 AI: Generating ranking for project ID {project_id}")
+                
+                description, condensed = self._condensed_description(project_data)
+                prompt = self._create_ranking_prompt(project_data, description)
+                messages = [
+                    *self.prompt_context.prefix('ranking', self._ranking_prefix),
+                    {"role": "user", "content": prompt}
+                ]
+                
+                stages = []
+                if self.cascade:
+                    # First pass only returns the score, finalists are escalated to the strong model
+                    reply = self._request_ranking(project_id, messages, condensed, self.cascade.first_model,
+                                                  first_pass=True)
+                    self.cascade.record('first_pass', reply['seconds'])
+                    stages.append({'stage': 'first_pass', 'model': reply['model'],
+                                   'seconds': round(reply['seconds'], 2), 'score': reply['score']})
+                    if self.cascade.escalate(reply['score'], self.score_limit):
+                        reply = self._request_ranking(project_id, messages, condensed, self.cascade.final_model)
+                        self.cascade.record('final', reply['seconds'])
+                        stages.append({'stage': 'final', 'model': reply['model'],
+                                       'seconds': round(reply['seconds'], 2), 'score': reply['score']})
+                else:
+                    reply = self._request_ranking(project_id, messages, condensed)
+                
+                if reply['cancelled']:
+                    # Clearly rejected, the rest of the response was never generated
+                    result = {
+                        'score': reply['score'],
+                        'explanation': (f"Score {reply['score']} is well below the score limit {self.score_limit}, "
+                                        f"the explanation was skipped."),
+                        'stopped_early': True,
+                        'model': reply['model'],
+                        'success': True
+                    }
+                    if stages:
+                        result['stages'] = stages
+                    self.cache.set('openai', cache_key, result)
+                    if self.versions:
+                        self.versions.record(project_id, cache_key, versions, result['score'])
+                    if self.duplicates:
+                        self.duplicates.add(project_id, project_data, result, versions[1:])
+                    return result
+                
+                # Parse the JSON response, near-valid JSON is repaired locally
+                response_text = reply['text']
+                try:
+                    parsed = structured_output.parse(response_text, structured_output.SCORE_SCHEMA,
+                                                     self.parse_stats, salvage={'bid_teaser': {}})
+                    if not 0 <= parsed['score'] <= 100:
+                        raise structured_output.StructuredOutputError(f"Invalid score: {parsed['score']}")
+                except structured_output.StructuredOutputError as e:
+                    print(f"\n❌ Could not parse ranking response for project {project_id}: {str(e)}")
+                    print(f"Raw response: {response_text}")
+                    raise
                 
                 result = {
-                    'score': self._extract_score(response.choices[0].message.content),
-                    'explanation': response.choices[0].message.content,
+                    'score': parsed['score'],
+                    'explanation': parsed['explanation'],
+                    'bid_teaser': parsed.get('bid_teaser') or {},
+                    'model': reply['model'],
                     'success': True  # Flag to indicate successful ranking
                 }
+                if stages:
+                    stages[-1]['score'] = parsed['score']
+                    result['stages'] = stages
                 
                 # Cache the successful result
                 self.cache.set('openai', cache_key, result)
+                if self.versions:
+                    self.versions.record(project_id, cache_key, versions, result['score'])
+                if self.duplicates:
+                    self.duplicates.add(project_id, project_data, result, versions[1:])
                 
                 return result
                 
-            except (openai.APITimeoutError, openai.RateLimitError) as e:
+            except structured_output.StructuredOutputError as e:
+                # Asking again right away rarely fixes the format, the work queue retries later
+                return {
+                    'score': 0,
+                    'explanation': f"Ranking failed: Invalid response format: {str(e)}",
+                    'success': False
+                }
+                
+            except self._retryable_errors as e:
                 # Handle specific OpenAI API errors
-                error_msg = f"OpenAI request failed (attempt {attempt}/{self.max_retries}): {str(e)}"
+                error_msg = f"OpenAI request failed (attempt {attempt}/{max_attempts}): {str(e)}"
                 if progress_bar:
                     progress_bar.set_description_str(f"⚠️ {error_msg}")
                 
-                if attempt < self.max_retries:
+                if attempt < max_attempts:
                     # Wait before retrying (increasing delay with each attempt)
                     time.sleep(self.retry_delay * attempt)
                 else:
@@ -513,11 +666,11 @@ Here is the context from vyftec-context.md:
                     
             except Exception as e:
                 # Handle other exceptions
-                error_msg = f"Unexpected error (attempt {attempt}/{self.max_retries}): {str(e)}"
+                error_msg = f"Unexpected error (attempt {attempt}/{max_attempts}): {str(e)}"
                 if progress_bar:
                     progress_bar.set_description_str(f"❌ {error_msg}")
                 
-                if attempt < self.max_retries:
+                if attempt < max_attempts:
                     # Wait before retrying
                     time.sleep(self.retry_delay * attempt)
                 else:
@@ -537,7 +690,64 @@ Here is the context from vyftec-context.md:
             text = text.replace(char, '_')
         return text.lower()
 
-    def _create_ranking_prompt(self, project_data: Dict) -> str:
+    def _request_ranking(self, project_id, messages: List[Dict], condensed: bool, model: str = RANKING_MODEL,
+                         first_pass: bool = False) -> Dict:
+        """
+        Send the ranking request to ``model``, streamed if a stream margin is set. A first pass
+        is always streamed and closed as soon as the score is known.
+
+        Returns:
+            Dict with the response 'text', 'cancelled', the early 'score' of a cancelled stream,
+            'model' and 'seconds'
+        """
+        kind = 'ranking_first_pass' if first_pass else 'ranking'
+        started = time.monotonic()
+        if self.stream_margin is None and not first_pass:
+            # Use the OpenAI API with a timeout
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format={'type': 'json_object'},  # JSON mode, the format is described in the prompt
+                temperature=0.7,
+                max_tokens=500,
+                timeout=60  # Set a timeout for the request
+            )
+            seconds = time.monotonic() - started
+            self.tokens.record(project_id, model, messages, response, kind=kind, condensed=condensed,
+                               seconds=seconds)
+            return {'text': response.choices[0].message.content or '', 'cancelled': False, 'score': None,
+                    'model': model, 'seconds': seconds}
+        
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={'type': 'json_object'},
+            temperature=0.7,
+            max_tokens=20 if first_pass else 500,
+            timeout=60,
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+        if first_pass:
+            reply = ranking_stream.read(stream, stop_after_score=True)
+        else:
+            reply = ranking_stream.read(stream, cancel_below=self.score_limit - self.stream_margin)
+        reply['model'] = model
+        reply['seconds'] = time.monotonic() - started
+        self.tokens.record(project_id, model, messages, kind=kind, condensed=condensed, usage=reply['usage'],
+                           completion=reply['text'], stopped_early=reply['cancelled'] and not first_pass,
+                           seconds=reply['seconds'])
+        return reply
+
+    def _condensed_description(self, project_data: Dict) -> tuple:
+        """(description within the token budget, whether it had to be shortened)"""
+        description = project_data.get('description') or 'No description available'
+        condensed = token_budget.condense(description, self.description_tokens, RANKING_MODEL)
+        return condensed, condensed is not description
+
+    def _create_ranking_prompt(self, project_data: Dict, description: str = None) -> str:
+        if description is None:
+            description = self._condensed_description(project_data)[0]
         prompt = f"""Please evaluate this Freelancer.com project for Vyftec:
 
 Project Details:
@@ -558,43 +768,12 @@ Bid Count: {project_data.get('bid_stats', {}).get('bid_count', 0)}
 
 Project Description:
 ------------------
-{project_data.get('description', 'No description available')}
+{description}
 
 Evaluate this project for Vyftec with a score from 0-100 and detailed explanation in between 200 to 600 signs. If the score is higher than {config.bidscoreLimit}, the explanation should be longer than 400 signs."""
 
         return prompt
 
-    def _extract_score(self, response_text: str) -> int:
-        try:
-            import re
-            # Look for score patterns like "Score: 85" or "85/100" or "Rating: 85"
-            score_patterns = [
-                r'Score:\s*(\d{1,3})',
-                r'(\d{1,3})/100',
-                r'Rating:\s*(\d{1,3})',
-                r'Bewertung:\s*(\d{1,3})'
-            ]
-            
-            for pattern in score_patterns:
-                matches = re.search(pattern, response_text)
-                if matches:
-                    score = int(matches.group(1))
-                    if 0 <= score <= 100:
-                        return score
-            
-            # Fallback to find any numbers
-            scores = re.findall(r'\b([0-9]{1,3})\b', response_text)
-            
-            for score in scores:
-                score = int(score)
-                if 0 <= score <= 100:
-                    return score
-                    
-            return 0
-            
-        except Exception as e:
-            return 0
-
 def format_time_since(timestamp):
     if not timestamp:
         return "Unknown"
@@ -900,14 +1079,24 @@ class FileCache:
             data: Data to cache
         """
         cache_path = self._get_cache_path(cache_type, key)
+        # Write to a temp file and rename so other workers never read a partial pickle
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
         
         try:
-            with open(cache_path, 'wb') as f:
+            with open(tmp_path, 'wb') as f:
                 pickle.dump(data, f)
+            os.replace(tmp_path, cache_path)
         except (pickle.PickleError, IOError) as e:
             # Log error but continue execution
             print(f"Cache write error: {str(e)}")
     
+    def delete(self, cache_type, key):
+        """Remove a single cache item (no error if it doesn't exist)"""
+        try:
+            os.remove(self._get_cache_path(cache_type, key))
+        except FileNotFoundError:
+            pass
+    
     def clear(self, cache_type=None):
         """
         Clear cache files
@@ -988,15 +1177,280 @@ class FileCache:
         
         return issues_found
 
-def main():
-    # Clear cache option at startup
-    clear_cache_response = input("Cache löschen vor Start? (j/n): ").strip().lower()
+def rank_queued_projects(api: FreelancerAPI, ranker: 'ProjectRanker', work_queue: WorkQueue,
+                         settings: Namespace, progress, ranked_projects: List[Dict],
+                         worker_id: str = None, should_stop=None,
+                         retry_policy: RetryPolicy = None, prescore=None, knn_index=None) -> int:
+    """
+    Rank every queued project that is available right now, save it if it qualifies
+    and display it. Each project gets a single LLM attempt; failures are put back
+    into the queue with a backoff delay and the loop moves on.
+    
+    Returns:
+        Number of projects ranked successfully
+    """
+    ranked = 0
+    batching = batch_ranking.settings_from_config(settings)
+    batched = set()
+    while not (should_stop and should_stop()):
+        item = work_queue.claim(worker_id)
+        if item is None:
+            break
+        
+        payload = item['payload']
+        project = payload['project']
+        project_data = payload['project_data']
+        project_id = project.get('id')
+        owner_id = project.get('owner_id')
+        title = project_data['title']
+        project_skill_names = [skill.get('name', 'Unknown') for skill in project_data.get('jobs', [])]
+        bid_count = project_data.get('bid_stats', {}).get('bid_count', 0)
+        user_rep = payload.get('user_rep', {})
+        entire_history = user_rep.get('entire_history', {})
+        earnings_score = project_data.get('employer_earnings_score', 0)
+        country = payload.get('country', 'Unknown')
+        city = payload.get('city', 'Unknown')
+        submitdate = payload.get('submitdate')
+        budget_range = payload.get('budget_range', 'Unknown')
+        is_new_project = payload.get('is_new_project', False)
+        
+        # Backlog: score the next projects in one request, clear misses are cached for rank_project()
+        if batching:
+            batch = batch_ranking.rank_backlog(ranker, work_queue, item, batched, *batching)
+            if batch and batch['sent']:
+                progress.set_description_str(f"📦 Batch-scored {batch['sent']} projects, {batch['cached']} clearly "
+                                             f"below the limit")
+
+        # Get project ranking - update progress; a re-score always asks the LLM with the new prompt and context
+        progress.set_description_str(f"🧠 Ranking project '{title[:30]}...'")
+        ranking = ranker.rank_project(project_data, progress_bar=progress, max_attempts=1,
+                                      allow_reuse=not payload.get('rescore'))
+
+        # Check if ranking was successful; the queue offers the project again later
+        if not ranking.get('success', True):
+            delay = retry_policy.next_delay(item['attempts']) if retry_policy else 60
+            state = work_queue.fail(item['project_id'], ranking.get('explanation', ''), delay=delay)
+            if state == 'failed':
+                progress.set_description_str(f"⏭️ Giving up on {project_id} after {item['attempts']} failed rankings")
+            else:
+                progress.set_description_str(f"⏭️ Ranking failed for {project_id}, retrying in {delay:.0f}s")
+            continue
+
+        # If we got here, ranking was successful
+        score = ranking['score']
+        
+        # Background re-score after a prompt/context change: only save projects that newly qualify
+        if payload.get('rescore'):
+            previous_score = payload.get('previous_score')
+            progress.set_description_str(f"🔁 Re-scored project {project_id}: {previous_score} → {score}")
+            if knn_index:
+                knn_index.add(item['project_id'], project_data, score)
+            if score >= settings.score_limit and (previous_score is None or previous_score < settings.score_limit):
+                api.process_ranked_project(project_data, ranking, settings.bid_limit, settings.score_limit)
+            work_queue.complete(item['project_id'], ranking)
+            ranked += 1
+            continue
+        
+        # Compare the local estimates with the LLM score
+        if prescore and payload.get('prescore'):
+            prescore.record_llm_score(item['project_id'], payload['prescore'], score, settings.score_limit)
+        if knn_index:
+            knn_index.add(item['project_id'], project_data, score)
+
+        # Add this block here to process and save ranked projects
+        if score >= settings.score_limit:
+            progress.set_description_str(f"💾 Saving project with score {score} to jobs folder...")
+            api.process_ranked_project(project_data, ranking, settings.bid_limit, settings.score_limit)
+
+        # Generate colored ASCII art score
+        score_ascii_art = format_score_with_ascii_art(score)
+
+        # Store project with all its data (only kept for the optional end-of-run report)
+        if settings.report:
+            ranked_projects.append({
+                'project': project,
+                'ranking': ranking,
+                'user_rep': user_rep,
+                'country': country,
+                'city': city,
+                'matching_skills': project_skill_names,
+                'score': score,
+                'score_ascii_art': score_ascii_art,
+                'title': title,
+                'submitdate': submitdate,
+                'budget_range': budget_range,
+                'bid_count': bid_count,
+                'project_id': project_id,
+                'employer_url': config.USER_URL_TEMPLATE.format(project.get('owner_username', owner_id)),
+                'project_url': config.PROJECT_URL_TEMPLATE.format(project_id),
+                'entire_history': entire_history,
+                'earnings_score': earnings_score,
+                'description': project.get('description', 'Keine Beschreibung verfügbar'),
+                'is_new_project': is_new_project,
+                'is_new_ranking': ranking and isinstance(ranking, dict) and not ranking.get('_from_cache'),
+                'conversation_id': ranker.conversation_id
+            })
+    
+        # Display project box for new projects
+        if is_new_project:
+            progress.set_description_str(f"✨ New project with AI ranking! Score: {score}")
+        
+            # Create project details for display
+            project_details = f"""
+📌 {title}
+
+┌────────────────────────────────┬────────────────────────────────┬────────────────────────────────┬────────────────────────────────┐
+│ 🤖 SCORE:                       │ 🔧 PROJEKT-FÄHIGKEITEN:         │ 💼 ARBEITGEBER:                 │ 🤖 KI-KONTEXT:                 │
+│ {score_ascii_art}               │                                │                                │   • Konversation: {ranker.conversation_id} │
+│ 💰 BUDGET: {budget_range.ljust(20)} │                                │                                │ 🔗 LINKS:                      │
+│                                │                                │                                │   • Projekt: {config.PROJECT_URL_TEMPLATE.format(project_id)} │
+│                                │                                │                                │   • Arbeitgeber: {config.USER_URL_TEMPLATE.format(project.get('owner_username', owner_id))} │
+├────────────────────────────────┼────────────────────────────────┼────────────────────────────────┼────────────────────────────────┤
+│ 🔢 GEBOTE: {str(bid_count).ljust(20)} │                                │ 🌍 STANDORT: {f"{city}, {country}"[:20].ljust(20)} │                                │
+"""
+
+            # Add skills and employer info to the second and third columns
+            skills_text = ""
+            for skill in project_skill_names:
+                skills_text += f"│                                │   • {skill[:24].ljust(24)}  │                                │                                │\n"
+                break  # Show only the first skill with rating in the same line
+
+            # Add remaining skills
+            for skill in project_skill_names[1:]:
+                skills_text += f"│                                │   • {skill[:24].ljust(24)}  │                                │                                │\n"
+
+            # Add skills to the main text
+            project_details += skills_text
+
+            # After adding links and before description, add the conversation ID
+            project_details += f"""└────────────────────────────────┴────────────────────────────────┴────────────────────────────────┴────────────────────────────────┘
+
+📋 BESCHREIBUNG:
+{project.get('description', 'Keine Beschreibung verfügbar')}
+
+🤖 KI-BEWERTUNG:
+{ranking['explanation']}
+"""
+            # Display the box
+            progress.clear()
+            box = draw_box(project_details)
+            print(box)
+            progress.refresh()
+        
+        work_queue.complete(item['project_id'], ranking)
+        ranked += 1
+    return ranked
+
+def print_ranked_projects_report(ranked_projects: List[Dict]) -> None:
+    """
+    Print the summary of all new projects found in this session, sorted by AI ranking
+    """
+    print("\nAll New Projects Found (Sorted by AI Ranking):")
+    
+    # Filter for only new projects found in this session
+    new_projects = [p for p in ranked_projects if p.get('is_new_project', False)]
+    new_projects.sort(key=lambda x: x['score'], reverse=True)
+    
+    if not new_projects:
+        print("No new projects found in this session.")
+        return
+    
+    for i, project_data in enumerate(new_projects, 1):
+        # Create project details for display
+        project_details = f"""
+📌 {project_data['title']} - SCORE: {project_data['score']}
+
+{project_data['score_ascii_art']}
+
+┌───────────────────────────────────┬───────────────────────────────────┐
+│ ⏱ ALTER: {format_time_since(project_data['submitdate'])} │ 🔢 GEBOTE: {project_data['bid_count']} │
+├───────────────────────────────────┼───────────────────────────────────┤
+│ 💰 BUDGET: {project_data['budget_range']} │ 🌍 STANDORT: {project_data['city']}, {project_data['country']} │
+├───────────────────────────────────┴───────────────────────────────────┤
+│ 💼 ARBEITGEBER:                                                       │ 
+│   Bewertung: {get_star_rating(project_data['entire_history'].get('overall', 0))}                                         │
+│   Abgeschlossene Projekte: {project_data['entire_history'].get('complete', 0)}                                    │
+│   Earnings Score: {project_data['earnings_score']:.1f}                                                │
+├─────────────────────────────────────────────────────────────────────┤
+│ 🔧 PROJEKT-FÄHIGKEITEN:                                               │
+│   {', '.join(project_data['matching_skills'])}                                 │
+├─────────────────────────────────────────────────────────────────────┤
+│ 🔗 LINKS:                                                             │
+│   Projekt: {project_data['project_url']}                                        │
+│   Arbeitgeber: {project_data['employer_url']}                                    │
+├─────────────────────────────────────────────────────────────────────┤
+│ 🤖 KI-KONTEXT:                                                         │
+│   Konversation: {project_data['conversation_id']}                                      │
+└─────────────────────────────────────────────────────────────────────┘
+
+📋 BESCHREIBUNG:
+{project_data['description']}
+
+🤖 KI-BEWERTUNG:
+{project_data['ranking']['explanation']}
+"""
+        # Display the box
+        print(draw_box(project_details))
+        print()
+
+def print_cache_stats(api: FreelancerAPI) -> None:
+    """Print the cache statistics shown at the end of a run"""
+    cache_stats = api.get_cache_stats()
+    print("\nCache-Status nach Abschluss:")
+    print(f"- Projekte im Cache: {cache_stats['projects']['valid']}")
+    print(f"- Benutzer im Cache: {cache_stats['users']['valid']}")
+    print(f"- Reputationsdaten im Cache: {cache_stats['reputations']['valid']}")
+    print(f"- OpenAI Bewertungen im Cache: {cache_stats['openai']['valid']}")
+    print(f"- Cache-Verzeichnis: {os.path.abspath(api.cache.cache_dir)}")
+
+def run(settings: Namespace, stop_event=None) -> None:
+    """
+    Run the search loop with the given settings.
+    
+    Args:
+        settings: Run configuration (bid_limit, score_limit, clear_cache, poll_interval, report)
+        stop_event: Optional threading.Event; when set the loop finishes the current
+            project and returns. Without it, Ctrl-C ends the loop as before.
+    """
+    # Imported lazily, the progress bar is only needed once the loop starts
+    import tqdm
+    
+    def should_stop():
+        return stop_event is not None and stop_event.is_set()
+    
+    def pause(seconds):
+        if stop_event is not None:
+            stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
     
     api = FreelancerAPI(config.FREELANCER_API_KEY, cache_expiry=3600)
-    ranker = ProjectRanker(config.OPENAI_API_KEY)
+    # Each pipeline has its own prompt: the other pipeline's rankings must not look outdated to it
+    ranking_versions = ranking_cache.RankingVersions('cache/ranking_versions_api.sqlite3')
+    ranker = ProjectRanker(config.OPENAI_API_KEY, duplicates=near_duplicates.from_settings(settings),
+                           versions=ranking_versions, score_limit=settings.score_limit,
+                           stream_margin=getattr(config, 'RANKING_STREAM_MARGIN', 20)
+                           if getattr(settings, 'stream', True) else None,
+                           cascade=model_cascade.from_settings(settings))
+    
+    # Sharded worker mode: only process our part of the work, dedup across workers
+    shard = coordinator.from_settings(settings)
+    claims = coordinator.SharedSeenStore() if shard else None
+    if shard:
+        print(f"🧩 Worker {shard.worker_id} running in '{shard.shard_mode}' shard mode")
+    worker_id = shard.worker_id if shard else None
+    
+    # Durable queue between filtering and ranking, failed rankings are retried with backoff
+    # One queue per pipeline, their payloads differ
+    work_queue = WorkQueue('cache/work_queue_api.sqlite3')
+    retry_policy = RetryPolicy(work_queue=work_queue)
+    rescore_monitor = None
+    if getattr(settings, 'rescore', True):
+        rescore_monitor = ranking_cache.RescoreMonitor(ranking_versions, ranker, work_queue,
+                                                       getattr(config, 'RESCORE_MAX_AGE_HOURS', 72) * 3600)
     
     # Process the user's choice to clear cache
-    if clear_cache_response in ['j', 'ja', 'y', 'yes']:
+    if settings.clear_cache:
         print("🧹 Lösche alle Cache-Dateien...")
         api.clear_cache()
         print("✅ Cache wurde vollständig geleert.")
@@ -1058,6 +1512,11 @@ def main():
     skill_names = [skill['name'] for skill in our_skills]
     skill_names_lower = [name.lower() for name in skill_names]
     
+    # Local relevance estimate, projects far below the score limit never reach the LLM
+    prescore = prescorer.from_settings(settings, SkillMatcher(our_skills))
+    # Scores of similar, already ranked projects: skip confident misses, rank likely hits first
+    knn_index = similarity_index.from_settings(settings)
+    
     # Define the right countries (high-value markets)
     target_countries = [
         'Switzerland', 'United States', 'Germany', 
@@ -1114,8 +1573,31 @@ def main():
         # Create the progress bar
         progress = tqdm.tqdm(total=total_to_process, desc="Searching projects", position=0, leave=True)
         
-        # Run indefinitely until manually interrupted
-        while True:
+        # Rankings made with an older prompt or context are redone in the background
+        if rescore_monitor:
+            rescore = rescore_monitor.check()
+            if rescore['invalidated']:
+                print(f"🔁 Prompt/context changed: {rescore['invalidated']} cached ranking(s) invalidated, "
+                      f"{rescore['queued']} queued for re-scoring")
+        
+        # Resume rankings that were queued before a crash or restart; items the crashed run had
+        # in progress are claimable right away instead of after the visibility timeout
+        work_queue.recover(worker_id)
+        work_queue.purge_done()
+        purged_at = time.time()
+        queued = work_queue.stats()
+        if queued['pending'] or queued['in_progress']:
+            progress.set_description_str(f"📥 Resuming {queued['pending'] + queued['in_progress']} queued project(s)")
+            rank_queued_projects(api, ranker, work_queue, settings, progress, ranked_projects,
+                                 worker_id, should_stop, retry_policy, prescore, knn_index)
+        
+        # Run until manually interrupted or a stop is requested
+        while not should_stop():
+            # Finished items are only kept for a week, see WorkQueue.purge_done()
+            if time.time() - purged_at > 3600:
+                work_queue.purge_done()
+                purged_at = time.time()
+            
             search_cycles += 1
             projects_in_this_cycle = 0
             new_projects_in_this_cycle = 0
@@ -1123,9 +1605,10 @@ def main():
             progress.set_description_str(f"📥 Cycle {search_cycles}: Fetching newest 20 projects")
             
             # Request projects - now limited to 20
+            # (in skills shard mode every worker searches for its own slice of our skills)
             result = api.get_active_projects(
                 limit=batch_limit,
-                skills=skill_names,
+                skills=shard.shard_items(skill_names) if shard else skill_names,
                 country_codes=country_codes,
                 progress_bar=progress
             )
@@ -1147,6 +1630,8 @@ def main():
             
             # Process projects in this batch
             for project in projects:
+                if should_stop():
+                    break
                 progress.update(1)
                 
                 project_id = project.get('id')
@@ -1156,6 +1641,17 @@ def main():
                     progress.set_description_str(f"⏩ Skipping seen project {project_id}")
                     continue
                 
+                # Leave projects owned by another worker alone (ownership moves on rebalance)
+                if shard and not shard.owns_project(project_id):
+                    progress.set_description_str(f"⏩ Project {project_id} belongs to another worker")
+                    continue
+                
+                # Another worker already took this project
+                if claims and not claims.claim(project_id, shard.worker_id):
+                    progress.set_description_str(f"⏩ Project {project_id} claimed by another worker")
+                    seen_project_ids.add(project_id)
+                    continue
+                
                 seen_project_ids.add(project_id)
                 projects_in_this_cycle += 1
                 
@@ -1181,7 +1677,7 @@ def main():
                 # Check bid count
                 bid_stats = project.get('bid_stats', {})
                 bid_count = bid_stats.get('bid_count', 0)
-                if bid_count >= 40:
+                if bid_count >= settings.bid_limit:
                     progress.set_description_str(f"⏩ Skipping: Too many bids ({bid_count})")
                     continue
                 
@@ -1200,6 +1696,20 @@ def main():
                 # Extracting skills
                 project_skill_names = [skill.get('name', 'Unknown') for skill in skills]
                 
+                # Estimate relevance locally before fetching the employer and spending an LLM call
+                estimate = None
+                if prescore:
+                    estimate = prescore.check(project, settings.score_limit)
+                    if not estimate['rank']:
+                        progress.set_description_str(f"⏩ Skipping: Pre-score {estimate['score']} below {estimate['threshold']:g}")
+                        continue
+                knn = None
+                if knn_index:
+                    knn = knn_index.check(project, settings.score_limit)
+                    if not knn['rank']:
+                        progress.set_description_str(f"⏩ Skipping: Similar projects scored ~{knn['score']}")
+                        continue
+                
                 # Get user details - update progress bar
                 progress.set_description_str(f"👤 Fetching user details for '{title[:30]}...'")
                 user_details = api.get_user_details(owner_id, progress_bar=progress)
@@ -1257,111 +1767,60 @@ def main():
                     'id': project_id
                 }
                 
-                # Get project ranking - update progress
-                progress.set_description_str(f"🧠 Ranking project '{title[:30]}...'")
-                ranking = ranker.rank_project(project_data, progress_bar=progress)
-                
-                # Check if ranking was successful
-                if not ranking.get('success', True):
-                    progress.set_description_str(f"⏭️ Skipping project due to failed ranking, will retry later: {project_id}")
-                    if project_id in seen_project_ids:
-                        seen_project_ids.remove(project_id)
-                    continue
-
-                # If we got here, ranking was successful
-                score = ranking['score']
-
-                # Add this block here to process and save ranked projects
-                if score >= config.bidscoreLimit:
-                    progress.set_description_str(f"💾 Saving project with score {score} to jobs folder...")
-                    api.process_ranked_project(project_data, ranking)
-
-                # Generate colored ASCII art score
-                score_ascii_art = format_score_with_ascii_art(score)
-
-                # Store project with all its data
-                ranked_projects.append({
+                # Queue the project for ranking; the queue survives crashes and restarts
+                work_queue.enqueue(project_id, {
                     'project': project,
-                    'ranking': ranking,
+                    'project_data': project_data,
                     'user_rep': user_rep,
                     'country': country,
                     'city': city,
-                    'matching_skills': project_skill_names,
-                    'score': score,
-                    'score_ascii_art': score_ascii_art,
-                    'title': title,
                     'submitdate': submitdate,
                     'budget_range': budget_range,
-                    'bid_count': bid_count,
-                    'project_id': project_id,
-                    'employer_url': config.USER_URL_TEMPLATE.format(project.get('owner_username', owner_id)),
-                    'project_url': config.PROJECT_URL_TEMPLATE.format(project_id),
-                    'entire_history': entire_history,
-                    'earnings_score': earnings_score,
-                    'description': project.get('description', 'Keine Beschreibung verfügbar'),
                     'is_new_project': is_new_project,
-                    'is_new_ranking': ranking and isinstance(ranking, dict) and not ranking.get('_from_cache'),
-                    'conversation_id': ranker.conversation_id
-                })
-                
-                # Display project box for new projects
-                if is_new_project:
-                    progress.set_description_str(f"✨ New project with AI ranking! Score: {score}")
-                    
-                    # Create project details for display
-                    project_details = f"""
-📌 {title}
-
-┌────────────────────────────────┬────────────────────────────────┬────────────────────────────────┬────────────────────────────────┐
-│ 🤖 SCORE:                       │ 🔧 PROJEKT-FÄHIGKEITEN:         │ 💼 ARBEITGEBER:                 │ 🤖 KI-KONTEXT:                 │
-│ {score_ascii_art}               │                                │                                │   • Konversation: {ranker.conversation_id} │
-│ 💰 BUDGET: {budget_range.ljust(20)} │                                │                                │ 🔗 LINKS:                      │
-│                                │                                │                                │   • Projekt: {config.PROJECT_URL_TEMPLATE.format(project_id)} │
-│                                │                                │                                │   • Arbeitgeber: {config.USER_URL_TEMPLATE.format(project.get('owner_username', owner_id))} │
-├────────────────────────────────┼────────────────────────────────┼────────────────────────────────┼────────────────────────────────┤
-│ 🔢 GEBOTE: {str(bid_count).ljust(20)} │                                │ 🌍 STANDORT: {f"{city}, {country}"[:20].ljust(20)} │                                │
-"""
-
-                    # Add skills and employer info to the second and third columns
-                    skills_text = ""
-                    for skill in project_skill_names:
-                        skills_text += f"│                                │   • {skill[:24].ljust(24)}  │                                │                                │\n"
-                        break  # Show only the first skill with rating in the same line
-
-                    # Add remaining skills
-                    for skill in project_skill_names[1:]:
-                        skills_text += f"│                                │   • {skill[:24].ljust(24)}  │                                │                                │\n"
-
-                    # Add skills to the main text
-                    project_details += skills_text
-
-                    # After adding links and before description, add the conversation ID
-                    project_details += f"""└────────────────────────────────┴────────────────────────────────┴────────────────────────────────┴────────────────────────────────┘
-
-📋 BESCHREIBUNG:
-{project.get('description', 'Keine Beschreibung verfügbar')}
-
-🤖 KI-BEWERTUNG:
-{ranking['explanation']}
-"""
-                    # Display the box
-                    progress.clear()
-                    box = draw_box(project_details)
-                    print(box)
-                    progress.refresh()
+                    'prescore': estimate,
+                    'knn': {key: knn[key] for key in ('score', 'confidence')} if knn else None
+                }, priority=knn['score'] if knn and knn['score'] is not None else settings.score_limit)
+                rank_queued_projects(api, ranker, work_queue, settings, progress, ranked_projects,
+                                     worker_id, should_stop, retry_policy, prescore, knn_index)
                 
                 # Don't display other projects yet, just update progress
                 if found_projects >= config.PROJECTS_TO_FIND:
                     progress.set_description_str(f"✅ Found {found_projects} matching projects")
                     break
             
+            # Pick up queued projects whose retry delay has passed
+            rank_queued_projects(api, ranker, work_queue, settings, progress, ranked_projects,
+                                 worker_id, should_stop, retry_policy, prescore, knn_index)
+            
             # Update cache stats
             cache_stats = api.get_cache_stats()
             progress.set_description_str(f"💾 Cycle {search_cycles}: {len(seen_project_ids)} projects seen, {found_projects} matches")
+            if prescore:
+                print(f"\n🧮 {prescore.cycle_report()}")
+            token_report = ranker.tokens.cycle_report()
+            if token_report:
+                print(f"\n💰 {token_report}")
+            parse_report = ranker.parse_stats.cycle_report()
+            if parse_report:
+                print(f"\n🧾 {parse_report}")
+            cascade_report = ranker.cascade.cycle_report() if ranker.cascade else None
+            if cascade_report:
+                print(f"\n🪜 {cascade_report}")
+            if rescore_monitor:
+                rescore = rescore_monitor.check()
+                if rescore['invalidated']:
+                    print(f"\n🔁 Prompt/context changed: {rescore['invalidated']} cached ranking(s) invalidated, "
+                          f"{rescore['queued']} queued for re-scoring")
             
             # Optional: Add longer delay between complete cycles to respect rate limits
             if len(projects) < batch_limit:
-                time.sleep(20)  # 20-second delay between full cycles
+                pause(settings.poll_interval)  # delay between full cycles
+        
+        progress.close()
+        print("\n\n🛑 Stop requested, shutting down")
+        if settings.report:
+            print_ranked_projects_report(ranked_projects)
+        print_cache_stats(api)
     
     except KeyboardInterrupt:
         # Handle manual interruption gracefully
@@ -1369,61 +1828,11 @@ def main():
         print("\n\n🛑 Search interrupted by user")
         
         # Still display summary of all found projects
-        print("\nAll New Projects Found (Sorted by AI Ranking):")
-        
-        # Filter for only new projects found in this session
-        new_projects = [p for p in ranked_projects if p.get('is_new_project', False)]
-        new_projects.sort(key=lambda x: x['score'], reverse=True)
-        
-        if not new_projects:
-            print("No new projects found in this session.")
-        else:
-            for i, project_data in enumerate(new_projects, 1):
-                # Create project details for display
-                project_details = f"""
-📌 {project_data['title']} - SCORE: {project_data['score']}
-
-{project_data['score_ascii_art']}
-
-┌───────────────────────────────────┬───────────────────────────────────┐
-│ ⏱ ALTER: {format_time_since(project_data['submitdate'])} │ 🔢 GEBOTE: {project_data['bid_count']} │
-├───────────────────────────────────┼───────────────────────────────────┤
-│ 💰 BUDGET: {project_data['budget_range']} │ 🌍 STANDORT: {project_data['city']}, {project_data['country']} │
-├───────────────────────────────────┴───────────────────────────────────┤
-│ 💼 ARBEITGEBER:                                                       │ 
-│   Bewertung: {get_star_rating(project_data['entire_history'].get('overall', 0))}                                         │
-│   Abgeschlossene Projekte: {project_data['entire_history'].get('complete', 0)}                                    │
-│   Earnings Score: {project_data['earnings_score']:.1f}                                                │
-├─────────────────────────────────────────────────────────────────────┤
-│ 🔧 PROJEKT-FÄHIGKEITEN:                                               │
-│   {', '.join(project_data['matching_skills'])}                                 │
-├─────────────────────────────────────────────────────────────────────┤
-│ 🔗 LINKS:                                                             │
-│   Projekt: {project_data['project_url']}                                        │
-│   Arbeitgeber: {project_data['employer_url']}                                    │
-├─────────────────────────────────────────────────────────────────────┤
-│ 🤖 KI-KONTEXT:                                                         │
-│   Konversation: {project_data['conversation_id']}                                      │
-└─────────────────────────────────────────────────────────────────────┘
-
-📋 BESCHREIBUNG:
-{project_data['description']}
-
-🤖 KI-BEWERTUNG:
-{project_data['ranking']['explanation']}
-"""
-                # Display the box
-                print(draw_box(project_details))
-                print()
+        if settings.report:
+            print_ranked_projects_report(ranked_projects)
         
         # Bei erfolgreicher Ausführung Cache-Statistiken anzeigen
-        cache_stats = api.get_cache_stats()
-        print("\nCache-Status nach Abschluss:")
-        print(f"- Projekte im Cache: {cache_stats['projects']['valid']}")
-        print(f"- Benutzer im Cache: {cache_stats['users']['valid']}")
-        print(f"- Reputationsdaten im Cache: {cache_stats['reputations']['valid']}")
-        print(f"- OpenAI Bewertungen im Cache: {cache_stats['openai']['valid']}")
-        print(f"- Cache-Verzeichnis: {os.path.abspath(api.cache.cache_dir)}")
+        print_cache_stats(api)
         
     except Exception as e:
         # Close progress bar on error
@@ -1435,6 +1844,25 @@ def main():
         print(f"\nError: {str(e)}")
         import traceback
         print(traceback.format_exc())
+    finally:
+        work_queue.close()
+        ranking_versions.close()
+        if knn_index:
+            knn_index.save()
+        if shard:
+            shard.stop()
+
+def main():
+    # Clear cache option at startup
+    clear_cache_response = input("Cache löschen vor Start? (j/n): ").strip().lower()
+    
+    run(Namespace(
+        bid_limit=40,
+        score_limit=config.bidscoreLimit,
+        clear_cache=clear_cache_response in ['j', 'ja', 'y', 'yes'],
+        poll_interval=20,
+        report=True
+    ))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,37 +1,123 @@
+"""
+Build jobs/list.json (all saved jobs, newest first) from the job_*.json files.
+
+The build is incremental: jobs/.list_manifest.json remembers mtime and size of
+every job file that went into list.json, plus the project ID and timestamp of
+its entry. A refresh only parses new or changed files, drops the entries of
+changed or deleted ones and merges the rest into the already sorted list, so
+the work per refresh scales with the changes instead of the whole history.
+list.json is written compactly to a temp file and renamed into place, readers
+never see a half-written list.
+
+jobs/list_summary.json has the same jobs in the same order, but only the
+compact summary of each (job_store.summarize()): id, title, score, budget,
+bid count, country, timestamp, URLs and the job file name. It is meant for
+list views that fetch the full job file of a project only when it is opened.
+The Vue project list doesn't use it yet: its cards show the description,
+skills, employer metrics and explanation of every job, so it still loads the
+full jobs from the Express /api/jobs endpoint.
+
+    python generate_list.py          # Incremental refresh
+    python generate_list.py --full   # Rebuild from all job files
+"""
 import os
+import sys
 import json
-import glob
-
-def generate_list():
-    jobs_dir = 'jobs'
-    projects = []
-    
-    # Read all JSON files in the jobs directory that match the pattern job_*.json
-    job_files = glob.glob(os.path.join(jobs_dir, 'job_*.json'))
-    
-    for file_path in job_files:
+import heapq
+
+import job_store
+
+MANIFEST_VERSION = 1
+REQUIRED_KEYS = ['project_details', 'project_url', 'timestamp']
+
+def _entry_id(project_data):
+    return [str(project_data['project_details'].get('id')), project_data['timestamp']]
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def _load_previous(output_path, manifest_path):
+    """(files from the manifest, entries of the current list.json), empty if either is missing or outdated"""
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}, []
+        with open(output_path, 'r') as f:
+            projects = json.load(f)
+        return manifest['files'], projects
+    except (OSError, ValueError, KeyError):
+        return {}, []
+
+def generate_list(jobs_dir='jobs', full=False):
+    output_path = os.path.join(jobs_dir, 'list.json')
+    manifest_path = os.path.join(jobs_dir, '.list_manifest.json')
+    summary_path = os.path.join(jobs_dir, 'list_summary.json')
+
+    if not os.path.isdir(jobs_dir):
+        print(f"Error: {jobs_dir} not found")
+        return
+
+    # Stat all job files (no parsing); scandir gets the stat data with the listing
+    current = {}
+    with os.scandir(jobs_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('job_') and entry.name.endswith('.json') and entry.is_file():
+                stat = entry.stat()
+                current[entry.name] = [stat.st_mtime_ns, stat.st_size]
+
+    previous, projects = ({}, []) if full else _load_previous(output_path, manifest_path)
+    if not projects:
+        previous = {}
+    unchanged = {name: info for name, info in previous.items() if current.get(name) == info[:2]}
+    changed = [name for name in current if name not in unchanged]
+    removed = len([name for name in previous if name not in current])
+
+    if previous and not changed and not removed and os.path.exists(summary_path):
+        print(f"{output_path} is up to date ({len(projects)} projects)")
+        return
+
+    # Drop the entries of changed and deleted files, the rest stays in order
+    keep = {tuple(info[2]) for info in unchanged.values() if info[2] is not None}
+    projects = [project for project in projects if tuple(_entry_id(project)) in keep]
+
+    # Parse only new or changed files
+    files = dict(unchanged)
+    new_projects = []
+    for name in changed:
+        file_path = os.path.join(jobs_dir, name)
         try:
             with open(file_path, 'r') as f:
                 project_data = json.load(f)
-                # Ensure the project data has all required fields
-                if all(key in project_data for key in ['project_details', 'project_url', 'timestamp']):
-                    projects.append(project_data)
-                else:
-                    print(f"Warning: Skipping {file_path} - missing required fields")
+            # Ensure the project data has all required fields
+            if all(key in project_data for key in REQUIRED_KEYS):
+                new_projects.append(project_data)
+                files[name] = current[name] + [_entry_id(project_data)]
+            else:
+                print(f"Warning: Skipping {file_path} - missing required fields")
+                files[name] = current[name] + [None]
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
-    
-    # Sort projects by timestamp in descending order (newest first)
-    projects.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    # Write the list.json file
-    output_path = os.path.join(jobs_dir, 'list.json')
+
+    # Newest first: sort the new entries and merge them into the already sorted list
+    new_projects.sort(key=lambda x: x['timestamp'], reverse=True)
+    projects = list(heapq.merge(projects, new_projects, key=lambda x: x['timestamp'], reverse=True))
+
     try:
-        with open(output_path, 'w') as f:
-            json.dump(projects, f, indent=2)
-        print(f"Successfully created {output_path} with {len(projects)} projects")
+        _write_atomic(output_path, projects)
+        # The actual file names, older files may be named a second off their timestamp
+        filenames = {tuple(info[2]): name for name, info in files.items() if info[2] is not None}
+        _write_atomic(summary_path, [dict(job_store.summarize(project),
+                                          filename=filenames.get(tuple(_entry_id(project))))
+                                     for project in projects])
+        _write_atomic(manifest_path, {'version': MANIFEST_VERSION, 'files': files})
+        print(f"Successfully updated {output_path} with {len(projects)} projects "
+              f"({len(new_projects)} parsed, {removed} removed)")
     except Exception as e:
         print(f"Error writing list.json: {e}")
 
 if __name__ == '__main__':
-    generate_list() 
\ No newline at end of file
+    generate_list(full='--full' in sys.argv[1:])
@@ -0,0 +1,132 @@
+"""
+Job-saved events from the pipeline to the jobs API.
+
+The job writer (job_writer.py) calls publish() after a job is stored. publish()
+sends the job summary as a single UDP datagram to localhost
+(config.JOB_EVENTS_PORT). That costs a few microseconds, never blocks and
+doesn't fail when nobody listens.
+
+jobs_api.py listens on that port (listen()) and hands every event to an
+EventBus, which fans it out to the connected Server-Sent Events clients
+(GET /api/events). New jobs reach the UI within milliseconds of being saved
+instead of with the next poll. The bus keeps the last events, so a client that
+reconnects with Last-Event-ID gets what it missed.
+"""
+import collections
+import json
+import queue
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+_socket = None
+_socket_lock = threading.Lock()
+
+def _port() -> Optional[int]:
+    import config
+    return getattr(config, 'JOB_EVENTS_PORT', 5004)
+
+def publish(summary: Dict, is_new: bool = True, port: int = None) -> None:
+    """Send a job-saved event (fire and forget)"""
+    global _socket
+    port = port or _port()
+    if not port:
+        return
+    event = {'type': 'job_saved', 'is_new': is_new, 'job': summary, 'timestamp': time.time()}
+    try:
+        with _socket_lock:
+            if _socket is None:
+                _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                _socket.setblocking(False)
+            _socket.sendto(json.dumps(event, ensure_ascii=False, default=str).encode('utf-8'), ('127.0.0.1', port))
+    except OSError:
+        # Nobody listening or the buffer is full, the UI still gets the job with the next poll
+        pass
+
+class EventBus:
+    def __init__(self, history: int = 100, max_pending: int = 1000):
+        """
+        Args:
+            history: Number of recent events kept for reconnecting clients
+            max_pending: Events buffered per client; a client that falls further behind is dropped
+        """
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self._history = collections.deque(maxlen=history)
+        self._next_id = 1
+        self.max_pending = max_pending
+
+    def publish(self, event: Dict) -> Dict:
+        with self._lock:
+            event = dict(event, id=self._next_id)
+            self._next_id += 1
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Make room for the end marker, the client reconnects with Last-Event-ID
+                self.unsubscribe(subscriber)
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+        return event
+
+    def subscribe(self, last_event_id: int = None) -> queue.Queue:
+        """Queue of new events for one client, prefilled with the events after ``last_event_id``"""
+        subscriber = queue.Queue(maxsize=self.max_pending + len(self._history))
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event['id'] > last_event_id:
+                        subscriber.put_nowait(event)
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+def listen(bus: EventBus, port: int = None, on_event=None) -> Optional[threading.Thread]:
+    """
+    Receive the pipeline's events on localhost and publish them on ``bus``
+
+    Args:
+        on_event: Called with every event before it is published (e.g. to sync the job index)
+
+    Returns:
+        The receiver thread, None if events are disabled (JOB_EVENTS_PORT = None)
+    """
+    port = port or _port()
+    if not port:
+        return None
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', port))
+
+    def receive():
+        while True:
+            try:
+                data = receiver.recv(65536)
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                if on_event:
+                    on_event(event)
+                bus.publish(event)
+            except Exception as e:
+                # One bad event (or a failed index sync) must not end live updates for good
+                print(f"⚠️ Error handling job event: {str(e)}")
+
+    thread = threading.Thread(target=receive, name='job-events', daemon=True)
+    thread.start()
+    return thread
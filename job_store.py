@@ -0,0 +1,396 @@
+"""
+Indexed store for saved jobs (projects that qualified for a bid).
+
+save_job_to_json() used to write a new ``jobs/job_<id>_<timestamp>.json`` every
+time a project was saved, so re-ranked projects piled up duplicate files and
+every consumer had to scan the directory and pick files apart by name.
+
+JobStore keeps one row per project ID in a SQLite file (upsert: saving a
+project again replaces its job) with indexes on score and timestamp, and a
+small query API on top. The job dict itself is unchanged, the JSON export
+writes exactly the files consumers know:
+
+    jobs/job_<id>_<YYYYmmdd_HHMMSS>.json
+
+write_job_file() keeps exactly one file per project by removing the older
+files of the same project, so the Express servers and generate_list.py keep
+working unchanged while the directory stops growing with every re-rank.
+
+The Vue server stores the UI state of a job (``buttonStates``) only in its job
+file. A re-saved job takes that state over from the current file (and the
+store from its previous row), so a re-rank or an export doesn't reset it.
+
+List views only need a few fields per job, but a job carries the complete raw
+project, the description and the full explanation. Every row therefore also
+keeps a compact summary (summarize()): summaries() serves lists, get() loads
+the full job of a single project on demand. jobs_api.py serves both; the Vue
+project list still renders full jobs and doesn't use the summaries yet.
+
+    python job_store.py import    # Load existing job files (newest per project wins)
+    python job_store.py export    # Write one job file per project from the store
+    python job_store.py top 20    # Best scored jobs
+    python job_store.py summaries # Summaries of all jobs as JSON, newest first
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JOB_FILE_PATTERN = re.compile(r'^job_(\d+)_(\d{8}_\d{6})\.json$')
+
+# Keys the web frontends write into a job file, the pipeline never sets them
+UI_STATE_KEYS = ('buttonStates',)
+
+def dumps(data) -> bytes:
+    """Compact UTF-8 JSON, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+def job_filename(job: Dict) -> str:
+    """job_<id>_<timestamp>.json for a job dict, as save_job_to_json() always named it"""
+    project_id = job['project_details'].get('id', 'unknown')
+    try:
+        timestamp = datetime.fromisoformat(job['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        timestamp = datetime.now()
+    return f"job_{project_id}_{timestamp.strftime('%Y%m%d_%H%M%S')}.json"
+
+def summarize(job: Dict) -> Dict:
+    """Compact projection of a job for list views, 'filename' points to the full job file"""
+    details = job.get('project_details') or {}
+    budget = details.get('budget') or {}
+    return {
+        'id': details.get('id'),
+        'title': details.get('title', ''),
+        'score': job.get('bid_score', 0),
+        'budget': {
+            'minimum': budget.get('minimum'),
+            'maximum': budget.get('maximum'),
+            'currency': (details.get('currency') or {}).get('code')
+        } if budget else None,
+        'bid_count': (details.get('bid_stats') or {}).get('bid_count', 0),
+        'country': details.get('country'),
+        'timestamp': job.get('timestamp'),
+        'project_url': job.get('project_url'),
+        'employer_url': (job.get('links') or {}).get('employer'),
+        'filename': job_filename(job) if 'project_details' in job else None
+    }
+
+def carry_over_ui_state(job: Dict, jobs_dir: str = 'jobs') -> Dict:
+    """
+    Copy the UI state from the newest job file of the project into ``job``
+
+    The file wins over the job: the frontends only ever update the file.
+
+    Returns:
+        The same job dict
+    """
+    project_id = str(job['project_details'].get('id', 'unknown'))
+    files = []
+    for path in Path(jobs_dir).glob(f"job_{project_id}_*.json"):
+        match = JOB_FILE_PATTERN.match(path.name)
+        if match and match.group(1) == project_id:
+            files.append((match.group(2), path))
+    for _, path in sorted(files, reverse=True):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for key in UI_STATE_KEYS:
+            if key in existing:
+                job[key] = existing[key]
+        break
+    return job
+
+def write_job_file(job: Dict, jobs_dir: str = 'jobs', keep_ui_state: bool = True) -> Path:
+    """
+    Write the JSON file of a job and remove older files of the same project
+
+    Args:
+        keep_ui_state: Take the UI state over from the current file first (see carry_over_ui_state()),
+            False if the caller already did
+
+    Returns:
+        Path of the written file
+    """
+    jobs_path = Path(jobs_dir)
+    jobs_path.mkdir(parents=True, exist_ok=True)
+    if keep_ui_state:
+        carry_over_ui_state(job, jobs_dir)
+    file_path = jobs_path / job_filename(job)
+    tmp_path = jobs_path / f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps(job))
+    os.replace(tmp_path, file_path)
+
+    project_id = str(job['project_details'].get('id', 'unknown'))
+    for old_path in jobs_path.glob(f"job_{project_id}_*.json"):
+        match = JOB_FILE_PATTERN.match(old_path.name)
+        if old_path != file_path and match and match.group(1) == project_id:
+            try:
+                old_path.unlink()
+            except FileNotFoundError:
+                pass
+    return file_path
+
+def iter_job_files(jobs_dir: str = 'jobs') -> Iterator[Path]:
+    """job_<id>_<timestamp>.json files in a directory, oldest first"""
+    paths = [path for path in Path(jobs_dir).glob('job_*.json') if JOB_FILE_PATTERN.match(path.name)]
+    return iter(sorted(paths, key=lambda path: JOB_FILE_PATTERN.match(path.name).group(2)))
+
+class JobStore:
+    def __init__(self, db_path: str = 'jobs/jobs.sqlite3'):
+        """
+        Open (and create if needed) the job table
+
+        Args:
+            db_path: SQLite file with one row per saved project
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                project_id TEXT PRIMARY KEY,
+                score INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                first_saved_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL,
+                summary TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_score ON jobs (score);
+            CREATE INDEX IF NOT EXISTS idx_jobs_timestamp ON jobs (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at);
+        """)
+        self._add_summaries()
+
+    def _add_summaries(self) -> None:
+        """Add the summary column to stores created before it existed and fill it"""
+        columns = [row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if 'summary' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN summary TEXT")
+        rows = self._conn.execute("SELECT project_id, data FROM jobs WHERE summary IS NULL").fetchall()
+        for row in rows:
+            self._conn.execute("UPDATE jobs SET summary = ? WHERE project_id = ?",
+                               (json.dumps(summarize(json.loads(row['data'])), ensure_ascii=False, default=str),
+                                row['project_id']))
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def upsert(self, job: Dict) -> bool:
+        """
+        Insert a job or replace the job of the same project
+
+        Returns:
+            True if the project was not in the store yet
+        """
+        return self.upsert_many([job])[0]
+
+    def upsert_many(self, jobs: List[Dict]) -> List[bool]:
+        """
+        upsert() for several jobs in one transaction
+
+        Returns:
+            For every job, whether its project was not in the store yet
+        """
+        created = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Taken with the write lock held: writers commit one at a time, so updated_at
+                # follows the commit order and JobIndex.sync() can't miss a slow writer's rows
+                now = time.time()
+                for job in jobs:
+                    created.append(self._upsert(job, now))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return created
+
+    def _upsert(self, job: Dict, now: float) -> bool:
+        project_id = str(job['project_details'].get('id', 'unknown'))
+        row = self._conn.execute("SELECT data FROM jobs WHERE project_id = ?", (project_id,)).fetchone()
+        existed = row is not None
+        if existed and any(key not in job for key in UI_STATE_KEYS):
+            # Keep the UI state of the previous job
+            previous = json.loads(row['data'])
+            for key in UI_STATE_KEYS:
+                if key in previous and key not in job:
+                    job[key] = previous[key]
+        self._conn.execute(
+            """INSERT INTO jobs (project_id, score, timestamp, first_saved_at, updated_at, data, summary)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(project_id) DO UPDATE SET
+                   score = excluded.score,
+                   timestamp = excluded.timestamp,
+                   updated_at = excluded.updated_at,
+                   data = excluded.data,
+                   summary = excluded.summary""",
+            (project_id, int(job.get('bid_score') or 0), job.get('timestamp') or datetime.now().isoformat(),
+             now, now, dumps(job).decode('utf-8'), dumps(summarize(job)).decode('utf-8'))
+        )
+        return not existed
+
+    def get(self, project_id) -> Optional[Dict]:
+        """Full job of a project (the detail view of a summary)"""
+        row = self._conn.execute("SELECT data FROM jobs WHERE project_id = ?", (str(project_id),)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def delete(self, project_id) -> None:
+        self._conn.execute("DELETE FROM jobs WHERE project_id = ?", (str(project_id),))
+
+    def clear(self) -> None:
+        """Delete all jobs"""
+        self._conn.execute("DELETE FROM jobs")
+
+    @staticmethod
+    def _where(min_score: int = None, since: str = None, until: str = None) -> tuple:
+        clauses, params = [], []
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since.isoformat() if isinstance(since, datetime) else since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until.isoformat() if isinstance(until, datetime) else until)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ''), params
+
+    def query(self, min_score: int = None, since=None, until=None, order_by: str = 'timestamp',
+              descending: bool = True, limit: int = None, offset: int = 0) -> List[Dict]:
+        """
+        Jobs matching the filters
+
+        Args:
+            min_score: Only jobs with at least this score
+            since, until: ISO timestamps or datetimes, ``since`` inclusive, ``until`` exclusive
+            order_by: 'timestamp' or 'score' (ties are ordered by timestamp)
+            limit, offset: Paging
+
+        Returns:
+            List of job dicts in the format of the job files
+        """
+        return self._select('data', min_score, since, until, order_by, descending, limit, offset)
+
+    def summaries(self, min_score: int = None, since=None, until=None, order_by: str = 'timestamp',
+                  descending: bool = True, limit: int = None, offset: int = 0) -> List[Dict]:
+        """Like query(), but only the summary of every job (see summarize())"""
+        return self._select('summary', min_score, since, until, order_by, descending, limit, offset)
+
+    def _select(self, column: str, min_score, since, until, order_by: str, descending: bool, limit: int,
+                offset: int) -> List[Dict]:
+        if order_by not in ('timestamp', 'score'):
+            raise ValueError(f"Cannot order jobs by {order_by}")
+        where, params = self._where(min_score, since, until)
+        direction = 'DESC' if descending else 'ASC'
+        order = f"{order_by} {direction}" + (f", timestamp {direction}" if order_by == 'score' else '')
+        sql = f"SELECT {column} FROM jobs {where} ORDER BY {order}"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit if limit is not None else -1, offset]
+        return [json.loads(row[column]) for row in self._conn.execute(sql, params)]
+
+    def count(self, min_score: int = None, since=None, until=None) -> int:
+        where, params = self._where(min_score, since, until)
+        return self._conn.execute(f"SELECT COUNT(*) FROM jobs {where}", params).fetchone()[0]
+
+    def version(self) -> tuple:
+        """(number of jobs, last update time), changes whenever a job is saved or deleted"""
+        row = self._conn.execute("SELECT COUNT(*), MAX(updated_at) FROM jobs").fetchone()
+        return row[0], row[1] or 0.0
+
+    def changed_summaries(self, since: float) -> List[tuple]:
+        """(project_id, updated_at, summary) of every job saved after ``since`` (epoch seconds)"""
+        rows = self._conn.execute(
+            "SELECT project_id, updated_at, summary FROM jobs WHERE updated_at > ? ORDER BY updated_at", (since,)
+        ).fetchall()
+        return [(row['project_id'], row['updated_at'], json.loads(row['summary'])) for row in rows]
+
+    def import_files(self, jobs_dir: str = 'jobs') -> int:
+        """
+        Load existing job files into the store, the newest file per project wins
+
+        Returns:
+            Number of files read
+        """
+        imported = 0
+        for path in iter_job_files(jobs_dir):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {path.name}: {str(e)}")
+                continue
+            if 'project_details' not in job:
+                print(f"⚠️ Skipping {path.name}: no project_details")
+                continue
+            self.upsert(job)
+            imported += 1
+        return imported
+
+    def export(self, jobs_dir: str = 'jobs', **filters) -> int:
+        """
+        Write one job_<id>_<timestamp>.json per stored job (filters as for query())
+
+        Returns:
+            Number of files written
+        """
+        jobs = self.query(**filters)
+        for job in jobs:
+            write_job_file(job, jobs_dir)
+        return len(jobs)
+
+_shared: Dict[str, JobStore] = {}
+_shared_lock = threading.Lock()
+
+def shared(db_path: str = None) -> JobStore:
+    """One JobStore per file and process (config.JOB_STORE_PATH by default)"""
+    if db_path is None:
+        import config
+        db_path = getattr(config, 'JOB_STORE_PATH', 'jobs/jobs.sqlite3')
+    with _shared_lock:
+        store = _shared.get(db_path)
+        if store is None:
+            store = JobStore(db_path)
+            _shared[db_path] = store
+        return store
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Saved jobs store")
+    parser.add_argument('command', choices=['import', 'export', 'top', 'summaries'])
+    parser.add_argument('limit', nargs='?', type=int, default=20, help="Number of jobs for 'top'")
+    parser.add_argument('--jobs-dir', default='jobs')
+    parser.add_argument('--db', default=None, help="SQLite file (default: config.JOB_STORE_PATH)")
+    args = parser.parse_args()
+
+    store = shared(args.db)
+    if args.command == 'import':
+        print(f"✅ Imported {store.import_files(args.jobs_dir)} job file(s), {store.count()} project(s) in the store")
+    elif args.command == 'export':
+        print(f"✅ Exported {store.export(args.jobs_dir)} job file(s) to {args.jobs_dir}")
+    elif args.command == 'summaries':
+        print(json.dumps(store.summaries(), ensure_ascii=False, indent=2))
+    else:
+        for job in store.query(order_by='score', limit=args.limit):
+            details = job['project_details']
+            print(f"{job['bid_score']:>3}  {job['timestamp'][:16]}  {details.get('id')}  {details.get('title', '')[:60]}")
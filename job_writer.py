@@ -0,0 +1,173 @@
+"""
+Background writer for saved jobs.
+
+Saving a job means a SQLite upsert, a JSON file for the web frontends and a
+job-saved event. Done inline, that added disk latency to every qualifying
+project in the ranking loop. JobWriter takes jobs from a bounded queue on a
+background thread instead:
+
+- jobs that arrive close together are grouped, one store transaction per batch
+- files are serialized compactly (orjson when installed, see job_store.dumps())
+  and renamed into place, readers never see a partial file
+- the job-saved event is published once the job is stored
+- when the store write fails the files are written anyway and the jobs are
+  stored again after ``retry_interval``, with the next batch or on close()
+
+submit() only blocks when ``max_pending`` jobs are already waiting, which
+means the disk can't keep up at all; a lost job would be worse than the wait.
+Pending jobs are flushed on close(), which shared() registers with atexit.
+"""
+import atexit
+import queue
+import threading
+import time
+from typing import Dict, List
+
+import job_events
+import job_store
+
+class JobWriter:
+    def __init__(self, store: job_store.JobStore, jobs_dir: str = 'jobs', write_files: bool = True,
+                 max_pending: int = 1000, batch_size: int = 50, linger: float = 0.1, retry_interval: float = 5.0):
+        """
+        Args:
+            store: Job store the jobs are upserted into
+            jobs_dir: Directory for the job_<id>_<timestamp>.json files
+            write_files: Whether to write the job files at all (config.JOB_FILES)
+            max_pending: Capacity of the queue
+            batch_size: Maximum number of jobs written in one batch
+            linger: Seconds to wait for more jobs after the first one of a batch
+            retry_interval: Seconds before jobs the store rejected are stored again
+        """
+        self.store = store
+        self.jobs_dir = jobs_dir
+        self.write_files = write_files
+        self.batch_size = batch_size
+        self.linger = linger
+        self.retry_interval = retry_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        # Jobs (by project ID) whose files are written but that aren't in the store yet
+        self._unstored: Dict[str, Dict] = {}
+        self._retry_at = 0.0
+        self.stats = {'submitted': 0, 'written': 0, 'batches': 0, 'failed': 0, 'store_retries': 0}
+        self._thread = threading.Thread(target=self._run, name='job-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Dict) -> None:
+        """Queue a job for saving"""
+        if self._closed:
+            raise RuntimeError("JobWriter is closed")
+        self.stats['submitted'] += 1
+        self._queue.put(job)
+
+    def _next_batch(self) -> List:
+        if self._unstored:
+            # Wake up for the store retry even when no new jobs arrive
+            try:
+                batch = [self._queue.get(timeout=max(0, self._retry_at - time.monotonic()))]
+            except queue.Empty:
+                return []
+        else:
+            batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(0, remaining)) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            jobs = [job for job in batch if job is not None]
+            stopping = len(jobs) < len(batch)
+            try:
+                if jobs:
+                    self._write(jobs)
+                # A failing store gets one attempt per retry interval, and a last one before stopping
+                if self._unstored and (stopping or time.monotonic() >= self._retry_at):
+                    self._store()
+            except Exception as e:
+                # The thread must survive, or submit() blocks and close() waits for good
+                print(f"❌ Error in the job writer: {str(e)}")
+            for _ in batch:
+                self._queue.task_done()
+            if stopping:
+                if self._unstored:
+                    self.stats['failed'] += len(self._unstored)
+                    hint = ", python job_store.py import adds them from the job files" if self.write_files else ""
+                    print(f"❌ {len(self._unstored)} job(s) not saved to the job store{hint}")
+                return
+
+    def _write(self, jobs: List[Dict]) -> None:
+        # The same project twice in one batch: only its latest job counts
+        latest = {}
+        for job in jobs:
+            latest[str(job['project_details'].get('id', 'unknown'))] = job
+        if self.write_files:
+            for project_id, job in latest.items():
+                try:
+                    # The frontends keep the UI state in the job file, the store gets it too
+                    job_store.carry_over_ui_state(job, self.jobs_dir)
+                    # job_<id>_<timestamp>.json for the web frontends, older files of the project are removed
+                    job_store.write_job_file(job, self.jobs_dir, keep_ui_state=False)
+                except Exception as e:
+                    print(f"❌ Error writing job file for project {project_id}: {str(e)}")
+        # A newer job replaces the one of the same project still waiting for the store
+        self._unstored.update(latest)
+
+    def _store(self) -> None:
+        """Upsert the jobs that aren't in the store yet, keep them for a retry if that fails"""
+        jobs = list(self._unstored.values())
+        try:
+            created = self.store.upsert_many(jobs)
+        except Exception as e:
+            self.stats['store_retries'] += 1
+            self._retry_at = time.monotonic() + self.retry_interval
+            print(f"❌ Error saving {len(jobs)} job(s) to the job store, retrying in {self.retry_interval:g}s: {str(e)}")
+            return
+        self._unstored = {}
+        for job, is_new in zip(jobs, created):
+            # Push the job to the UI (jobs_api.py /api/events)
+            job_events.publish(job_store.summarize(job), is_new)
+        self.stats['written'] += len(jobs)
+        self.stats['batches'] += 1
+
+    def flush(self) -> None:
+        """Wait until every submitted job is written (jobs the store rejected are still retried)"""
+        self._queue.join()
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Write the pending jobs and stop the thread, waiting at most ``timeout`` seconds"""
+        if self._closed:
+            return
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(max(0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            print(f"⚠️ Job writer didn't finish within {timeout:g}s, "
+                  f"{self._queue.qsize() + len(self._unstored)} job(s) may not be saved")
+
+_shared: Dict[str, JobWriter] = {}
+_shared_lock = threading.Lock()
+
+def shared(jobs_dir: str = 'jobs') -> JobWriter:
+    """One JobWriter per jobs directory and process, flushed at exit"""
+    jobs_dir = str(jobs_dir)
+    with _shared_lock:
+        writer = _shared.get(jobs_dir)
+        if writer is None:
+            import config
+            writer = JobWriter(job_store.shared(), jobs_dir, write_files=getattr(config, 'JOB_FILES', True),
+                               max_pending=getattr(config, 'JOB_WRITER_QUEUE', 1000))
+            atexit.register(writer.close)
+            _shared[jobs_dir] = writer
+        return writer
@@ -0,0 +1,269 @@
+"""
+HTTP API for saved jobs, served from an in-memory index.
+
+The Express endpoint the UI polls reads the jobs directory and parses every
+job file on every request, so each poll costs more the longer the history
+gets. This service keeps the job summaries (job_store.summarize()) in memory,
+presorted by timestamp and by score, and syncs the index with the job store
+by asking it for the rows saved since the last sync.
+
+    GET /api/jobs?page=1&per_page=50&min_score=60&max_age_hours=48&sort=score&order=desc
+        {"jobs": [<summary>, ...], "total": 123, "page": 1, "per_page": 50}
+    GET /api/jobs/<project_id>
+        The full job (same format as the job files)
+    GET /api/events?min_score=60
+        Server-Sent Events stream, one "job_saved" event per saved job (job_events.py)
+
+Every response carries an ETag. It is derived from the store version and the
+query, so a poll with an unchanged If-None-Match gets a 304 without the list
+being filtered or serialized. ``max_age_hours`` is applied with a cutoff that
+moves in whole minutes, so the ETag of such a query changes at most once per
+minute.
+
+    python jobs_api.py --port 5003
+"""
+import argparse
+import hashlib
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import job_events
+import job_store
+
+# updated_at follows the commit order (JobStore.upsert_many()), the overlap covers clock adjustments
+_SYNC_OVERLAP = 5.0
+
+class JobIndex:
+    def __init__(self, store: job_store.JobStore, sync_interval: float = 1.0):
+        """
+        Args:
+            store: Job store to mirror
+            sync_interval: Minimum seconds between two checks of the store version
+        """
+        self.store = store
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._summaries: Dict[str, Dict] = {}
+        self._by_timestamp: List[Dict] = []
+        self._by_score: List[Dict] = []
+        self._updated_at = 0.0
+        self._version = None
+        self._checked_at = 0.0
+        self.sync(force=True)
+
+    @property
+    def version(self) -> tuple:
+        return self._version
+
+    def sync(self, force: bool = False) -> bool:
+        """
+        Pick up jobs saved since the last sync
+
+        Returns:
+            True if the index changed
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._checked_at < self.sync_interval:
+                return False
+            self._checked_at = now
+            version = self.store.version()
+            if version == self._version:
+                return False
+            changes = self.store.changed_summaries(self._updated_at - _SYNC_OVERLAP if self._summaries else 0)
+            for project_id, updated_at, summary in changes:
+                self._summaries[project_id] = summary
+                self._updated_at = max(self._updated_at, updated_at)
+            if len(self._summaries) != version[0]:
+                # Jobs were deleted, reload everything
+                self._summaries = {project_id: summary
+                                   for project_id, _, summary in self.store.changed_summaries(0)}
+            summaries = list(self._summaries.values())
+            self._by_timestamp = sorted(summaries, key=lambda summary: summary['timestamp'] or '', reverse=True)
+            self._by_score = sorted(self._by_timestamp, key=lambda summary: summary['score'] or 0, reverse=True)
+            self._version = version
+            return True
+
+    def page(self, min_score: int = None, since: str = None, sort: str = 'timestamp', descending: bool = True,
+             page: int = 1, per_page: int = 50) -> Dict:
+        """One page of summaries matching the filters"""
+        with self._lock:
+            ordered = self._by_score if sort == 'score' else self._by_timestamp
+        if not descending:
+            ordered = ordered[::-1]
+        if min_score is not None or since is not None:
+            ordered = [summary for summary in ordered
+                       if (min_score is None or (summary['score'] or 0) >= min_score)
+                       and (since is None or (summary['timestamp'] or '') >= since)]
+        start = (page - 1) * per_page
+        return {'jobs': ordered[start:start + per_page], 'total': len(ordered), 'page': page, 'per_page': per_page}
+
+class JobsHandler(BaseHTTPRequestHandler):
+    server_version = 'jobs-api/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b'', etag: str = None, content_type: str = 'application/json') -> None:
+        self.send_response(status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Headers', 'Origin, X-Requested-With, Content-Type, Accept, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
+        self.send_header('Cache-Control', 'no-cache')
+        if etag:
+            self.send_header('ETag', etag)
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, data, etag: str = None) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), etag)
+
+    def _not_modified(self, etag: str) -> bool:
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self._send(304, etag=etag)
+            return True
+        return False
+
+    def do_OPTIONS(self):
+        self._send(204)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        index: JobIndex = self.server.index
+        index.sync()
+        if path == '/api/jobs':
+            self._list(index, parse_qs(url.query))
+        elif path == '/api/events':
+            self._events(parse_qs(url.query))
+        elif path.startswith('/api/jobs/'):
+            self._detail(index, path[len('/api/jobs/'):])
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def _list(self, index: JobIndex, params: Dict) -> None:
+        def param(name: str, cast=str, default=None):
+            values = params.get(name)
+            return cast(values[0]) if values and values[0] != '' else default
+        try:
+            page = max(1, param('page', int, 1))
+            per_page = min(500, max(1, param('per_page', int, 50)))
+            min_score = param('min_score', int)
+            max_age_hours = param('max_age_hours', float)
+            sort = param('sort', str, 'timestamp')
+            order = param('order', str, 'desc')
+        except ValueError as e:
+            self._send_json(400, {'error': f"Invalid parameter: {str(e)}"})
+            return
+        if sort not in ('timestamp', 'score') or order not in ('asc', 'desc'):
+            self._send_json(400, {'error': "sort must be timestamp or score, order asc or desc"})
+            return
+
+        since = None
+        if max_age_hours is not None:
+            cutoff = datetime.now().replace(second=0, microsecond=0) - timedelta(hours=max_age_hours)
+            since = cutoff.isoformat()
+        etag = '"' + hashlib.sha1(
+            json.dumps([index.version, page, per_page, min_score, since, sort, order]).encode('utf-8')
+        ).hexdigest()[:20] + '"'
+        if self._not_modified(etag):
+            return
+        self._send_json(200, index.page(min_score, since, sort, order == 'desc', page, per_page), etag)
+
+    def _events(self, params: Dict) -> None:
+        """Stream job-saved events until the client disconnects"""
+        try:
+            min_score = int(params['min_score'][0]) if params.get('min_score') else None
+            last_event_id = self.headers.get('Last-Event-ID')
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            self._send_json(400, {'error': 'Invalid min_score or Last-Event-ID'})
+            return
+        bus: job_events.EventBus = self.server.events
+        subscriber = bus.subscribe(last_event_id)
+        try:
+            self.send_response(200)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(b"retry: 2000\n\n")
+            self.wfile.flush()
+            while True:
+                try:
+                    event = subscriber.get(timeout=15)
+                except queue.Empty:
+                    # Keeps proxies from closing the idle connection and notices gone clients
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                if event is None:
+                    break
+                if min_score is not None and (event.get('job', {}).get('score') or 0) < min_score:
+                    continue
+                data = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+                self.wfile.write(f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            bus.unsubscribe(subscriber)
+
+    def _detail(self, index: JobIndex, project_id: str) -> None:
+        if not project_id.isdigit():
+            self._send_json(400, {'error': 'Invalid project ID'})
+            return
+        etag = '"' + hashlib.sha1(json.dumps([index.version, project_id]).encode('utf-8')).hexdigest()[:20] + '"'
+        if self._not_modified(etag):
+            return
+        job = index.store.get(project_id)
+        if job is None:
+            self._send_json(404, {'error': 'Job not found'})
+        else:
+            self._send_json(200, job, etag)
+
+def serve(host: str = '127.0.0.1', port: int = 5003, store: Optional[job_store.JobStore] = None,
+          events_port: int = None) -> ThreadingHTTPServer:
+    """
+    Create the API server (call serve_forever() on it)
+
+    Args:
+        events_port: UDP port for the pipeline's job events, None for config.JOB_EVENTS_PORT
+    """
+    server = ThreadingHTTPServer((host, port), JobsHandler)
+    server.daemon_threads = True
+    server.index = JobIndex(store or job_store.shared())
+    server.events = job_events.EventBus()
+    # A saved job shows up in the list right away, not with the next sync interval
+    job_events.listen(server.events, events_port, on_event=lambda event: server.index.sync(force=True))
+    return server
+
+def main():
+    import config
+    parser = argparse.ArgumentParser(description="HTTP API for saved jobs")
+    parser.add_argument('--host', default=getattr(config, 'JOBS_API_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=getattr(config, 'JOBS_API_PORT', 5003))
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port)
+    print(f"🌐 Jobs API listening on http://{args.host}:{args.port}/api/jobs "
+          f"({server.index.version[0]} jobs in the index)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
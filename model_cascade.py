@@ -0,0 +1,86 @@
+"""
+Two-stage model cascade for the ranking.
+
+Stage 1 sends every project that got past the filters to a cheap, fast model.
+That includes the local pre-scorer, which already keeps clear misses away from
+any LLM. The response is streamed and closed right after the score, so the
+first pass costs the prompt plus a handful of completion tokens.
+
+Only projects whose first-pass score is above the score limit, or within
+``band`` points below it, go to stage 2. There a stronger model writes the
+score, explanation and bid teaser. Everything else keeps the first-pass score.
+
+Every stage records its model and latency. The ranking keeps them in
+ranking['stages'], and the token log (cache/token_usage.jsonl) has them per
+call, so the band and the model choice can be tuned on cost and latency.
+"""
+import threading
+from typing import Dict, Optional
+
+class Cascade:
+    def __init__(self, first_model: str = 'gpt-4o-mini', final_model: str = 'gpt-4o', band: int = 15):
+        """
+        Args:
+            first_model: Cheap model that only produces the score
+            final_model: Stronger model for the finalists (score, explanation, bid teaser)
+            band: First-pass scores this far below the score limit are still escalated
+        """
+        self.first_model = first_model
+        self.final_model = final_model
+        self.band = band
+        self._lock = threading.Lock()
+        self.stats = self._empty_stats()
+        self.cycle_stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {'first_pass': 0, 'escalated': 0, 'first_seconds': 0.0, 'final_seconds': 0.0}
+
+    def escalate(self, score: Optional[int], score_limit: int) -> bool:
+        """Whether a first-pass score needs the strong model; None (no score found) always does"""
+        return score is None or score >= score_limit - self.band
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Count a finished stage ('first_pass' or 'final')"""
+        with self._lock:
+            for stats in (self.stats, self.cycle_stats):
+                if stage == 'first_pass':
+                    stats['first_pass'] += 1
+                    stats['first_seconds'] += seconds
+                else:
+                    stats['escalated'] += 1
+                    stats['final_seconds'] += seconds
+
+    def cycle_report(self, reset: bool = True) -> Optional[str]:
+        """One line with the cascade numbers of the current cycle, None if nothing was ranked"""
+        with self._lock:
+            stats = self.cycle_stats
+            if reset:
+                self.cycle_stats = self._empty_stats()
+        if not stats['first_pass']:
+            return None
+        line = (f"Cascade: {stats['first_pass']} first pass ({self.first_model}, "
+                f"avg {stats['first_seconds'] / stats['first_pass']:.1f}s)")
+        if stats['escalated']:
+            line += (f", {stats['escalated']} escalated ({self.final_model}, "
+                     f"avg {stats['final_seconds'] / stats['escalated']:.1f}s)")
+        return line
+
+def from_settings(settings) -> Optional[Cascade]:
+    """
+    Cascade for a run, or None if it is disabled (settings.cascade or no config.RANKING_CASCADE_FINAL_MODEL)
+
+    The cascade is opt-in: the final model costs a multiple of the single ranking
+    model, so it only runs where config.py names one.
+    """
+    if not getattr(settings, 'cascade', True):
+        return None
+    import config
+    final_model = getattr(config, 'RANKING_CASCADE_FINAL_MODEL', None)
+    if not final_model:
+        return None
+    return Cascade(
+        first_model=getattr(config, 'RANKING_CASCADE_FIRST_MODEL', 'gpt-4o-mini'),
+        final_model=final_model,
+        band=getattr(config, 'RANKING_CASCADE_BAND', 15)
+    )
@@ -0,0 +1,348 @@
+"""
+Near-duplicate detection for reposted projects.
+
+Employers often post the same project again under a new ID. The rankers cache
+by project ID only, so every repost used to cost a new LLM ranking. This index
+keeps a 64 bit SimHash of title and description (word 3-gram shingles) for
+every ranked project together with its ranking and bid teaser. A new project
+within ``max_distance`` bits of a known one reuses that ranking instead of
+calling the LLM. Every ranking is stored with the prompt and context hashes it
+was made with (ProjectRanker.ranking_versions()), and only rankings made with
+the current ones are reused; a re-score after a prompt or context change can't
+get the old ranking back from a repost.
+
+Lookup uses the pigeonhole principle: the signature is split into
+``max_distance + 1`` bands, two signatures that differ in at most
+``max_distance`` bits share at least one band exactly, so only projects with
+a matching band are compared.
+
+Every reuse is recorded in the ``reuses`` table:
+
+    python near_duplicates.py      # reuse statistics
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BITS = 64
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def _shingles(text: str, size: int = 3) -> List[str]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+def simhash(text: str) -> Optional[int]:
+    """64 bit SimHash over word 3-grams, None for texts without words"""
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    counts = {}
+    for shingle in shingles:
+        counts[shingle] = counts.get(shingle, 0) + 1
+    vector = [0] * BITS
+    for shingle, weight in counts.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(BITS):
+            vector[bit] += weight if h >> bit & 1 else -weight
+    return sum(1 << bit for bit in range(BITS) if vector[bit] > 0)
+
+def project_text(project: Dict) -> str:
+    return f"{project.get('title', '')}\n{project.get('description', '') or ''}"
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64 bit
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << BITS) if value < 0 else value
+
+class NearDuplicateIndex:
+    def __init__(self, db_path: str = 'cache/near_duplicates.sqlite3', max_distance: int = 6,
+                 min_words: int = 12, jobs_dir: str = 'jobs'):
+        """
+        Open (and create if needed) the signature database
+
+        Args:
+            db_path: SQLite file holding signatures, rankings and reuses
+            max_distance: Maximum differing bits (of 64) for a near-duplicate
+            min_words: Shorter texts are not matched, they collide too easily
+            jobs_dir: Saved jobs, searched for bid teasers generated after the ranking
+        """
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self.jobs_dir = jobs_dir
+        self.bands = max_distance + 1
+        self._lock = threading.Lock()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                project_id TEXT PRIMARY KEY,
+                simhash INTEGER NOT NULL,
+                title TEXT,
+                ranking TEXT,
+                bid_teaser TEXT,
+                prompt_version TEXT,
+                context_version TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                project_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_bands ON bands (band, value);
+            CREATE TABLE IF NOT EXISTS reuses (
+                project_id TEXT NOT NULL,
+                original_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                distance INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (project_id, kind)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        # Indexes created before rankings were versioned; their rankings are never reused
+        columns = [row['name'] for row in self._conn.execute('PRAGMA table_info(signatures)')]
+        for column in ('prompt_version', 'context_version'):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE signatures ADD COLUMN {column} TEXT')
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'bands'").fetchone()
+        if row is None or int(row['value']) != self.bands:
+            self._rebuild_bands()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _band_values(self, signature: int) -> List[int]:
+        width = BITS // self.bands
+        values = []
+        for band in range(self.bands):
+            start = band * width
+            end = BITS if band == self.bands - 1 else start + width
+            values.append(_to_signed(signature >> start & ((1 << (end - start)) - 1)))
+        return values
+
+    def _rebuild_bands(self) -> None:
+        """The band layout depends on max_distance; recompute it after a change"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('DELETE FROM bands')
+                for row in self._conn.execute('SELECT project_id, simhash FROM signatures').fetchall():
+                    self._insert_bands(row['project_id'], _to_unsigned(row['simhash']))
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('bands', ?)", (str(self.bands),))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _insert_bands(self, project_id: str, signature: int) -> None:
+        self._conn.executemany(
+            'INSERT INTO bands (band, value, project_id) VALUES (?, ?, ?)',
+            [(band, value, project_id) for band, value in enumerate(self._band_values(signature))]
+        )
+
+    def signature(self, project: Dict) -> Optional[int]:
+        text = project_text(project)
+        if len(WORD_PATTERN.findall(text)) < self.min_words:
+            return None
+        return simhash(text)
+
+    def find(self, project: Dict, versions: tuple = None) -> Optional[Dict]:
+        """
+        Closest known near-duplicate of a project
+
+        Args:
+            versions: (prompt, context) hashes; only near-duplicates ranked with these are considered
+
+        Returns:
+            Dict with project_id, distance, similarity, ranking and bid_teaser, or None
+        """
+        signature = self.signature(project)
+        if signature is None:
+            return None
+        own_id = str(project.get('id', ''))
+        conditions = ' OR '.join(['(b.band = ? AND b.value = ?)'] * self.bands)
+        params = []
+        for band, value in enumerate(self._band_values(signature)):
+            params += [band, value]
+        version_sql = ''
+        if versions is not None:
+            version_sql = ' AND s.prompt_version = ? AND s.context_version = ?'
+            params += list(versions)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT DISTINCT s.project_id, s.simhash, s.ranking, s.bid_teaser FROM bands b
+                    JOIN signatures s ON s.project_id = b.project_id
+                    WHERE ({conditions}) AND s.ranking IS NOT NULL{version_sql}""",
+                params
+            ).fetchall()
+
+        best = None
+        for row in rows:
+            if row['project_id'] == own_id:
+                continue
+            distance = bin(signature ^ _to_unsigned(row['simhash'])).count('1')
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, row)
+        if best is None:
+            return None
+
+        distance, row = best
+        bid_teaser = json.loads(row['bid_teaser']) if row['bid_teaser'] else {}
+        if not bid_teaser.get('first_paragraph'):
+            bid_teaser = self._bid_teaser_from_jobs(row['project_id']) or bid_teaser
+        return {
+            'project_id': row['project_id'],
+            'distance': distance,
+            'similarity': 1 - distance / BITS,
+            'ranking': json.loads(row['ranking']),
+            'bid_teaser': bid_teaser
+        }
+
+    def reuse_ranking(self, project_id, project: Dict, versions: tuple) -> Optional[Dict]:
+        """
+        Ranking of a near-duplicate for a project that hasn't been ranked yet
+
+        The reuse is recorded and the project is added under its own ID, so later
+        reposts of the repost are found as well.
+
+        Args:
+            versions: (prompt, context) hashes of the current ranking prompt, rankings made
+                with other ones are not reused
+
+        Returns:
+            Copy of the earlier ranking with 'duplicate_of' and 'duplicate_similarity', or None
+        """
+        duplicate = self.find(project, versions)
+        if duplicate is None:
+            return None
+        ranking = dict(duplicate['ranking'])
+        ranking['success'] = True
+        ranking['duplicate_of'] = duplicate['project_id']
+        ranking['duplicate_similarity'] = round(duplicate['similarity'], 3)
+        self.record_reuse(project_id, duplicate['project_id'], duplicate['distance'], 'ranking')
+        if duplicate['bid_teaser']:
+            ranking['bid_teaser'] = duplicate['bid_teaser']
+            self.record_reuse(project_id, duplicate['project_id'], duplicate['distance'], 'bid_teaser')
+        self.add(project_id, project, ranking, versions)
+        return ranking
+
+    def _bid_teaser_from_jobs(self, project_id: str) -> Optional[Dict]:
+        # Teasers generated later by the frontend only end up in the saved job
+        for path in sorted(glob.glob(os.path.join(self.jobs_dir, f"job_{project_id}_*.json")), reverse=True):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    bid_teaser = json.load(f).get('ranking', {}).get('bid_teaser') or {}
+            except (OSError, ValueError):
+                continue
+            if bid_teaser.get('first_paragraph'):
+                return bid_teaser
+        return None
+
+    def add(self, project_id, project: Dict, ranking: Dict = None, versions: tuple = None) -> bool:
+        """
+        Store the signature and ranking of a project; False if the text is too short
+
+        Args:
+            versions: (prompt, context) hashes the ranking was made with
+        """
+        signature = self.signature(project)
+        if signature is None:
+            return False
+        project_id = str(project_id)
+        stored_ranking = None
+        bid_teaser = None
+        if ranking is not None:
+            stored_ranking = {key: value for key, value in ranking.items()
+                              if not key.startswith('_') and key != 'bid_teaser'}
+            if ranking.get('bid_teaser'):
+                bid_teaser = json.dumps(ranking['bid_teaser'], ensure_ascii=False)
+            stored_ranking = json.dumps(stored_ranking, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                prompt_version, context_version = versions if ranking is not None and versions else (None, None)
+                self._conn.execute(
+                    """INSERT INTO signatures (project_id, simhash, title, ranking, bid_teaser, prompt_version,
+                                               context_version, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(project_id) DO UPDATE SET
+                           simhash = excluded.simhash, title = excluded.title,
+                           prompt_version = CASE WHEN excluded.ranking IS NULL THEN prompt_version
+                                                 ELSE excluded.prompt_version END,
+                           context_version = CASE WHEN excluded.ranking IS NULL THEN context_version
+                                                  ELSE excluded.context_version END,
+                           ranking = COALESCE(excluded.ranking, ranking),
+                           bid_teaser = COALESCE(excluded.bid_teaser, bid_teaser)""",
+                    (project_id, _to_signed(signature), project.get('title', ''), stored_ranking, bid_teaser,
+                     prompt_version, context_version, time.time())
+                )
+                self._conn.execute('DELETE FROM bands WHERE project_id = ?', (project_id,))
+                self._insert_bands(project_id, signature)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return True
+
+    def set_bid_teaser(self, project_id, bid_teaser: Dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                'UPDATE signatures SET bid_teaser = ? WHERE project_id = ?',
+                (json.dumps(bid_teaser, ensure_ascii=False), str(project_id))
+            )
+
+    def record_reuse(self, project_id, original_id, distance: int, kind: str = 'ranking') -> None:
+        """Remember that ``kind`` ('ranking' or 'bid_teaser') of project_id came from original_id"""
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO reuses (project_id, original_id, kind, distance, created_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (str(project_id), str(original_id), kind, distance, time.time())
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            signatures = self._conn.execute('SELECT COUNT(*) FROM signatures').fetchone()[0]
+            reuses = {row['kind']: row['n'] for row in
+                      self._conn.execute('SELECT kind, COUNT(*) AS n FROM reuses GROUP BY kind')}
+        return {'signatures': signatures, 'reuses': reuses}
+
+def from_settings(settings) -> Optional[NearDuplicateIndex]:
+    """
+    Near-duplicate index for a run, or None if it is disabled
+
+    The threshold comes from config.NEAR_DUPLICATE_SIMILARITY (share of equal
+    SimHash bits, default 0.9 = up to 6 of 64 bits differ).
+    """
+    if not getattr(settings, 'near_duplicates', True):
+        return None
+    import config
+    similarity = getattr(config, 'NEAR_DUPLICATE_SIMILARITY', 0.9)
+    return NearDuplicateIndex(max_distance=int(round((1 - similarity) * BITS)))
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'cache/near_duplicates.sqlite3'
+    if not os.path.exists(path):
+        print(f"No near-duplicate index found ({path})")
+        sys.exit(1)
+    index = NearDuplicateIndex(path)
+    stats = index.stats()
+    print(f"Signatures:        {stats['signatures']}")
+    print(f"Reused rankings:   {stats['reuses'].get('ranking', 0)} (LLM calls saved)")
+    print(f"Reused bid texts:  {stats['reuses'].get('bid_teaser', 0)}")
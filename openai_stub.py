@@ -0,0 +1,281 @@
+"""
+Local OpenAI-compatible stand-in for load and latency testing.
+
+Serves POST /v1/chat/completions with deterministic, schema-valid answers for
+the requests the rankers send, so ranking throughput, concurrency, retries and
+backoff can be measured offline without spending API budget:
+
+- ranking (schema ``project_ranking`` or JSON mode): score, explanation and a
+  bid teaser for scores from 50 up, null (left out in JSON mode) below
+- batch ranking (schema ``project_batch_ranking``): one score per "### Project <id>"
+- bid text (a "Matching Score:" message): {"bid_teaser": {...}}
+
+The score is a hash of the project message, so the same project always gets
+the same score and repeated benchmark runs are comparable. Streaming
+(``stream=True``, incl. ``stream_options.include_usage``) is supported, so
+cancelled streams and the cascade first pass behave like against the real API.
+
+Latency, rate limits and timeouts are configurable:
+
+    python openai_stub.py --port 8099 --latency lognormal:0.8,0.5 --token-ms 8 \\
+        --rate-limit 0.05 --timeouts 0.01
+
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 python daemon.py ...
+
+(or config.OPENAI_BASE_URL). GET /stats returns the request counters as JSON.
+
+Latency specs: ``fixed:S``, ``uniform:LOW,HIGH``, ``normal:MEAN,SD`` and
+``lognormal:MEDIAN,SIGMA``, all in seconds until the first token. Every
+completion token adds ``--token-ms`` on top.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+import token_budget
+
+TEASER = {
+    "first_paragraph": "We have built several comparable solutions and can start with a short technical review of your setup.",
+    "second_paragraph": "Clear requirements, a good fit for our stack and a realistic scope.",
+    "third_paragraph": "We would split the work into small milestones with a working result after each one.",
+    "question": "Which systems does the solution need to integrate with?"
+}
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Sampler for a latency spec like 'lognormal:0.8,0.5' (seconds)"""
+    name, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',') if value.strip()]
+    if name == 'fixed' and len(values) == 1:
+        return lambda rng: values[0]
+    if name == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == 'normal' and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if name == 'lognormal' and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid latency spec: {spec} (fixed:S, uniform:LOW,HIGH, normal:MEAN,SD, lognormal:MEDIAN,SIGMA)")
+
+def stable_score(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:4], 'big') % 101
+
+def _ranking(text: str) -> Dict:
+    score = stable_score(text)
+    return {
+        "score": score,
+        "explanation": (f"Stub ranking with score {score}. The project text hashes to this score, so repeated "
+                        f"runs give the same result. No model was asked."),
+        "bid_teaser": dict(TEASER) if score >= 50 else None
+    }
+
+def _batch_ranking(text: str) -> Dict:
+    blocks = re.split(r'(?m)^### Project ', text)[1:]
+    return {"rankings": [{"id": block.split('\n', 1)[0].strip(), "score": stable_score(block)} for block in blocks]}
+
+def completion_for(request: Dict) -> str:
+    """Deterministic JSON answer for a chat completion request"""
+    messages: List[Dict] = request.get('messages', [])
+    text = messages[-1].get('content') or '' if messages else ''
+    schema_name = (request.get('response_format') or {}).get('json_schema', {}).get('name')
+    if schema_name == 'project_batch_ranking' or text.startswith('### Project '):
+        return json.dumps(_batch_ranking(text))
+    if any('Matching Score:' in (message.get('content') or '') for message in messages):
+        return json.dumps({"bid_teaser": dict(TEASER)})
+    ranking = _ranking(text)
+    if schema_name is None and ranking['bid_teaser'] is None:
+        # JSON mode (freelancer_api) has no null teaser, it just leaves it out
+        del ranking['bid_teaser']
+    return json.dumps(ranking)
+
+class StubState:
+    def __init__(self, latency: str = 'fixed:0.3', token_ms: float = 5, rate_limit: float = 0.0,
+                 timeouts: float = 0.0, hang_seconds: float = 120, seed: int = 0):
+        """
+        Args:
+            latency: Latency spec until the first token, see parse_latency()
+            token_ms: Milliseconds per completion token
+            rate_limit: Share of requests answered with 429
+            timeouts: Share of requests that hang for ``hang_seconds`` (client timeouts)
+            seed: Seed for the latency and error draws
+        """
+        self.sample_latency = parse_latency(latency)
+        self.token_ms = token_ms
+        self.rate_limit = rate_limit
+        self.timeouts = timeouts
+        self.hang_seconds = hang_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'ok': 0, 'streamed': 0, 'rate_limited': 0, 'timeouts': 0,
+                      'disconnected': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def draw(self) -> tuple:
+        """(outcome, first token latency) for the next request"""
+        with self._lock:
+            self.stats['requests'] += 1
+            roll = self._rng.random()
+            latency = self.sample_latency(self._rng)
+        if roll < self.rate_limit:
+            return 'rate_limited', latency
+        if roll < self.rate_limit + self.timeouts:
+            return 'timeout', latency
+        return 'ok', latency
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'openai-stub/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data: Dict, headers: Dict = None) -> None:
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send_json(200, self.server.state.stats)
+        else:
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+
+        state = self.server.state
+        outcome, latency = state.draw()
+        try:
+            if outcome == 'rate_limited':
+                state.count('rate_limited')
+                self._send_json(429, {'error': {'message': 'Rate limit reached (stub)', 'type': 'requests',
+                                                'code': 'rate_limit_exceeded'}},
+                                headers={'retry-after-ms': str(int(latency * 1000))})
+                return
+            if outcome == 'timeout':
+                state.count('timeouts')
+                time.sleep(state.hang_seconds)
+                self._send_json(504, {'error': {'message': 'Upstream timeout (stub)', 'type': 'server_error'}})
+                return
+            self._complete(request, latency)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout) or closed a stream after the score
+            state.count('disconnected')
+
+    def _complete(self, request: Dict, latency: float) -> None:
+        state = self.server.state
+        model = request.get('model', 'gpt-4o-mini')
+        text = completion_for(request)
+        max_tokens = request.get('max_tokens')
+        pieces = re.findall(r'.{1,4}', text, re.S)
+        if max_tokens:
+            # Like the real API the answer is cut off, the client has to repair or retry
+            pieces = pieces[:max_tokens]
+            text = ''.join(pieces)
+        prompt_tokens = token_budget.count_message_tokens(request.get('messages', []), model)
+        completion_tokens = len(pieces)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        time.sleep(latency)
+
+        if not request.get('stream'):
+            time.sleep(completion_tokens * state.token_ms / 1000)
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                             'finish_reason': 'length' if max_tokens and len(pieces) == max_tokens else 'stop'}],
+                'usage': usage
+            })
+            state.count('ok')
+            state.count('prompt_tokens', prompt_tokens)
+            state.count('completion_tokens', completion_tokens)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(choices: list, chunk_usage: Dict = None) -> None:
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': choices}
+            if chunk_usage is not None:
+                chunk['usage'] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        state.count('streamed')
+        sent = 0
+        for piece in pieces:
+            event([{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+            sent += 1
+            time.sleep(state.token_ms / 1000)
+        event([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        if (request.get('stream_options') or {}).get('include_usage'):
+            event([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        state.count('ok')
+        state.count('prompt_tokens', prompt_tokens)
+        state.count('completion_tokens', sent)
+
+def serve(host: str = '127.0.0.1', port: int = 8099, **options) -> ThreadingHTTPServer:
+    """Create the stub server (call serve_forever() on it), options as for StubState"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(**options)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub for load and latency tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', default='fixed:0.3',
+                        help="Time to first token: fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MEDIAN,SIGMA")
+    parser.add_argument('--token-ms', type=float, default=5, help="Milliseconds per completion token")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument('--timeouts', type=float, default=0.0, help="Share of requests that hang (client timeout)")
+    parser.add_argument('--hang-seconds', type=float, default=120, help="How long a hanging request hangs")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, latency=args.latency, token_ms=args.token_ms, rate_limit=args.rate_limit,
+                   timeouts=args.timeouts, hang_seconds=args.hang_seconds, seed=args.seed)
+    print(f"🧪 OpenAI stub listening on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency}, {args.rate_limit:.0%} 429s, {args.timeouts:.0%} timeouts)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {json.dumps(server.state.stats)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""
+Local relevance pre-scorer that runs before the LLM ranking.
+
+Every project that passes the filters used to cost a full OpenAI round trip,
+including the ones that are obviously not our kind of work (video editing,
+mobile apps, 3D, ...). The pre-scorer estimates the AI score on the CPU from
+
+- BM25 of the project text against the paragraphs of vyftec-context.md that
+  describe what we do,
+- BM25 against the paragraphs that describe what we avoid,
+- the skill match strength from the SkillMatcher,
+
+and rejects a project without an LLM call when the estimate lies more than
+``margin`` points below the score limit. The estimate only has to be good
+enough to spot projects far below the limit, borderline projects always go to
+the LLM.
+
+To measure how often it gets that wrong, a small share of the rejected
+projects is still sent to the LLM ("audit"). Every project that the LLM ranks
+is logged together with its estimate in cache/prescore_log.jsonl:
+
+    python prescorer.py                  # agreement report from the log
+    python prescorer.py --margin 20      # what a different margin would have done
+"""
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'for', 'from', 'has', 'have',
+    'i', 'if', 'in', 'into', 'is', 'it', 'its', 'me', 'my', 'need', 'needs', 'of', 'on', 'or',
+    'our', 'so', 'that', 'the', 'their', 'them', 'then', 'there', 'these', 'this', 'to', 'us',
+    'was', 'we', 'will', 'with', 'you', 'your', 'looking', 'project', 'work', 'job', 'someone',
+    'der', 'die', 'das', 'und', 'oder', 'ein', 'eine', 'ist', 'mit', 'für', 'wir', 'sie', 'von'
+}
+
+# Section headers in the context file that switch between "we do" and "we avoid"
+NEGATIVE_SECTION = re.compile(r"what we avoid|we don't do|we do not do|low-score", re.IGNORECASE)
+POSITIVE_SECTION = re.compile(r"what we do|high-score|key differentiators|technologies", re.IGNORECASE)
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def split_context(text: str) -> Dict[str, List[str]]:
+    """
+    Split the company context into paragraphs and sort them into the
+    'positive' (what we do) and 'negative' (what we avoid) section
+
+    Lines of bullet lists are treated as separate paragraphs so every avoided
+    topic ("everything mobile app") becomes its own short document.
+    """
+    sections = {'positive': [], 'negative': []}
+    current = 'positive'
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            sections[current].append(' '.join(paragraph))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if NEGATIVE_SECTION.search(stripped):
+            flush()
+            current = 'negative'
+            continue
+        if POSITIVE_SECTION.search(stripped) and len(stripped) < 80:
+            flush()
+            current = 'positive'
+            continue
+        if not stripped or stripped.startswith('---'):
+            flush()
+        elif stripped.startswith('- '):
+            flush()
+            paragraph.append(stripped[2:])
+            flush()
+        else:
+            paragraph.append(stripped)
+    flush()
+    return sections
+
+class BM25Index:
+    """Okapi BM25 over a small, fixed set of documents"""
+
+    def __init__(self, documents: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = [Counter(tokenize(document)) for document in documents]
+        self.documents = [terms for terms in self.documents if terms]
+        self.lengths = [sum(terms.values()) for terms in self.documents]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+
+        document_frequency = Counter()
+        for terms in self.documents:
+            document_frequency.update(terms.keys())
+        count = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, query_terms: Iterable[str], top: int = 3) -> float:
+        """Sum of the ``top`` best document scores for the (deduplicated) query terms"""
+        terms = [term for term in set(query_terms) if term in self.idf]
+        if not terms:
+            return 0.0
+        scores = []
+        for doc_terms, length in zip(self.documents, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length)
+            for term in terms:
+                tf = doc_terms.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score:
+                scores.append(score)
+        scores.sort(reverse=True)
+        return sum(scores[:top])
+
+class PreScorer:
+    def __init__(self, context_path: str = 'vyftec-context.md', skill_matcher=None, margin: float = 30,
+                 audit_rate: float = 0.05, weights: Dict[str, float] = None, saturation: float = 8.0,
+                 log_path: str = 'cache/prescore_log.jsonl'):
+        """
+        Build the BM25 indexes from the company context
+
+        Args:
+            context_path: Company context file (same one the LLM prompt uses)
+            skill_matcher: SkillMatcher for the skill feature; if None the caller passes the match
+            margin: Reject when the estimate is more than this many points below the score limit
+            audit_rate: Share of rejected projects that still go to the LLM to measure disagreement
+            weights: Feature weights 'skills', 'context', 'avoid'
+            saturation: BM25 score at which a feature reaches 0.5 (score / (score + saturation))
+            log_path: JSONL file for estimate vs. LLM score pairs, None to disable
+        """
+        with open(context_path, 'r', encoding='utf-8') as f:
+            sections = split_context(f.read())
+        self.positive = BM25Index(sections['positive'])
+        self.negative = BM25Index(sections['negative'])
+        self.skill_matcher = skill_matcher
+        self.margin = margin
+        self.audit_rate = audit_rate
+        self.weights = {'skills': 0.45, 'context': 0.55, 'avoid': 0.5}
+        self.weights.update(weights or {})
+        self.saturation = saturation
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.stats = self._empty_stats()
+        self.cycle_stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {
+            'evaluated': 0,
+            'rejected': 0,
+            'audited': 0,
+            'audit_false_rejects': 0,
+            'compared': 0,
+            'decision_agreements': 0,
+            'abs_error': 0.0
+        }
+
+    def _saturate(self, value: float) -> float:
+        return value / (value + self.saturation)
+
+    def estimate(self, project: Dict, skill_match: Dict = None) -> Dict:
+        """
+        Estimate the AI score of a project (0-100) with the features it is based on
+        """
+        skills = [job.get('name', '') for job in project.get('jobs', [])]
+        if skill_match is None and self.skill_matcher is not None:
+            skill_match = self.skill_matcher.match(skills)
+        skill_strength = (skill_match or {}).get('strength', 0.0)
+
+        terms = tokenize(' '.join([project.get('title', ''), project.get('description', '') or ''] + skills))
+        context = self._saturate(self.positive.score(terms))
+        avoid = self._saturate(self.negative.score(terms))
+
+        raw = (self.weights['skills'] * skill_strength
+               + self.weights['context'] * context
+               - self.weights['avoid'] * avoid)
+        return {
+            'score': round(100 * min(1.0, max(0.0, raw))),
+            'skills': round(skill_strength, 3),
+            'context': round(context, 3),
+            'avoid': round(avoid, 3)
+        }
+
+    def check(self, project: Dict, score_limit: int, skill_match: Dict = None) -> Dict:
+        """
+        Decide whether a project needs the LLM
+
+        Returns:
+            The estimate plus 'rank' (send to the LLM) and 'audit' (only sent to the
+            LLM to measure the pre-scorer, it would have been rejected otherwise)
+        """
+        result = self.estimate(project, skill_match)
+        reject = result['score'] < score_limit - self.margin
+        audit = reject and random.random() < self.audit_rate
+        result['threshold'] = score_limit - self.margin
+        result['rank'] = not reject or audit
+        result['audit'] = audit
+        with self._lock:
+            for stats in (self.stats, self.cycle_stats):
+                stats['evaluated'] += 1
+                if reject and not audit:
+                    stats['rejected'] += 1
+        return result
+
+    def record_llm_score(self, project_id, prescore: Dict, llm_score: int, score_limit: int) -> None:
+        """Compare an estimate with the score the LLM gave the same project"""
+        # Agreement of the actual gate decision: check() passes at score_limit - margin, not at the limit
+        threshold = prescore.get('threshold', score_limit - self.margin)
+        predicted_pass = prescore['score'] >= threshold
+        actual_pass = llm_score >= score_limit
+        with self._lock:
+            for stats in (self.stats, self.cycle_stats):
+                stats['compared'] += 1
+                stats['abs_error'] += abs(prescore['score'] - llm_score)
+                if predicted_pass == actual_pass:
+                    stats['decision_agreements'] += 1
+                if prescore.get('audit'):
+                    stats['audited'] += 1
+                    if actual_pass:
+                        stats['audit_false_rejects'] += 1
+        if self.log_path:
+            entry = {
+                'project_id': project_id,
+                'timestamp': time.time(),
+                'llm_score': llm_score,
+                'score_limit': score_limit,
+                'threshold': threshold,
+                **{key: prescore.get(key) for key in ('score', 'skills', 'context', 'avoid', 'audit')}
+            }
+            try:
+                Path(self.log_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except OSError as e:
+                print(f"⚠️ Could not write prescore log: {str(e)}")
+
+    def cycle_report(self, reset: bool = True) -> str:
+        """One line with the pre-scorer numbers of the current cycle"""
+        with self._lock:
+            stats = self.cycle_stats
+            line = f"Prescore: {stats['rejected']}/{stats['evaluated']} rejected (LLM calls saved)"
+            if stats['audited']:
+                line += f", audit {stats['audit_false_rejects']}/{stats['audited']} false rejects"
+            if stats['compared']:
+                line += (f", agrees with LLM on {stats['decision_agreements']}/{stats['compared']}"
+                         f", MAE {stats['abs_error'] / stats['compared']:.1f}")
+            if reset:
+                self.cycle_stats = self._empty_stats()
+        return line
+
+def from_settings(settings, skill_matcher=None) -> Optional[PreScorer]:
+    """
+    Pre-scorer for a run, or None if it is disabled
+
+    The margin comes from settings.prescore_margin (daemon flag) or
+    config.PRESCORE_MARGIN, the audit rate from config.PRESCORE_AUDIT_RATE.
+    """
+    if not getattr(settings, 'prescore', True):
+        return None
+    import config
+    margin = getattr(settings, 'prescore_margin', None)
+    if margin is None:
+        margin = getattr(config, 'PRESCORE_MARGIN', 30)
+    try:
+        return PreScorer(
+            skill_matcher=skill_matcher,
+            margin=float(margin),
+            audit_rate=getattr(config, 'PRESCORE_AUDIT_RATE', 0.05)
+        )
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"⚠️ Pre-scorer disabled, context not readable: {str(e)}")
+        return None
+
+def summarize_log(log_path: str = 'cache/prescore_log.jsonl', margin: float = None) -> Optional[Dict]:
+    """
+    Agreement between estimates and LLM scores from the prescore log
+
+    Args:
+        margin: Evaluate this margin instead of the one the log entries were made with
+    """
+    entries = []
+    try:
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+    except FileNotFoundError:
+        return None
+    if not entries:
+        return None
+
+    summary = {'compared': len(entries), 'decision_agreements': 0, 'abs_error': 0.0,
+               'would_reject': 0, 'false_rejects': 0}
+    for entry in entries:
+        limit = entry['score_limit']
+        threshold = limit - margin if margin is not None else entry.get('threshold', limit)
+        if (entry['score'] >= threshold) == (entry['llm_score'] >= limit):
+            summary['decision_agreements'] += 1
+        summary['abs_error'] += abs(entry['score'] - entry['llm_score'])
+        if margin is not None:
+            rejected = entry['score'] < limit - margin
+        else:
+            rejected = entry.get('audit', False)
+        if rejected:
+            summary['would_reject'] += 1
+            if entry['llm_score'] >= limit:
+                summary['false_rejects'] += 1
+    summary['mae'] = summary['abs_error'] / summary['compared']
+    return summary
+
+if __name__ == '__main__':
+    margin = None
+    if '--margin' in sys.argv:
+        margin = float(sys.argv[sys.argv.index('--margin') + 1])
+    result = summarize_log(margin=margin)
+    if result is None:
+        print("No prescore log found (cache/prescore_log.jsonl)")
+        sys.exit(1)
+    print(f"Compared with LLM:   {result['compared']}")
+    print(f"Decision agreement:  {result['decision_agreements']}/{result['compared']}")
+    print(f"Mean abs. error:     {result['mae']:.1f} points")
+    label = f"margin {margin:g}" if margin is not None else "audited"
+    print(f"Rejected ({label}):  {result['would_reject']}, of which the LLM would have saved {result['false_rejects']}")
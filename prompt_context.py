@@ -0,0 +1,106 @@
+"""
+Company context and pre-rendered static prompt prefixes.
+
+The rankers used to open and read vyftec-context.md on every attempt of every
+call and rebuilt the large system prompt each time. PromptContext reads the
+file once, checks its mtime/size at most once per ``check_interval`` seconds
+and only reloads it when it changed.
+
+Prompts are split into a static prefix (system prompt, company context,
+instructions) and the per-project messages that follow it. Each prefix is
+rendered once per context version and the same message list is returned for
+every call, so the prefix is byte-identical between requests and the
+provider-side prompt prefix cache can be used. Callers must not modify the
+returned messages, they only append their project specific ones:
+
+    messages = prompt_context.prefix('ranking', build_ranking_prefix) + [project_message]
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+class PromptContext:
+    def __init__(self, path: str = 'vyftec-context.md', check_interval: float = 1.0):
+        """
+        Args:
+            path: Company context file
+            check_interval: Seconds between two mtime checks of the file
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._stat = None
+        self._checked_at = None
+        self._text = ''
+        self._fingerprint = hashlib.sha256(b'').hexdigest()
+        self._prefixes = {}
+        self._warned = False
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if key == self._stat:
+                return
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            text = data.decode('utf-8')
+        except (OSError, UnicodeDecodeError) as e:
+            # Keep the last version we could read
+            if not self._warned:
+                print(f"Warning: Could not read {self.path}: {str(e)}")
+                self._warned = True
+            return
+        self._text = text
+        self._fingerprint = hashlib.sha256(data).hexdigest()
+        self._stat = key
+        self._prefixes = {}
+        self._warned = False
+        self.version += 1
+        if self.version > 1:
+            print(f"🔄 Reloaded {self.path}")
+
+    def text(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._text
+
+    def fingerprint(self) -> str:
+        """SHA-256 of the loaded file content"""
+        with self._lock:
+            self._refresh()
+            return self._fingerprint
+
+    def prefix(self, name: str, build: Callable[[str], List[Dict]]) -> List[Dict]:
+        """
+        Static prompt prefix ``name``, rendered by ``build(context_text)`` once per context version
+
+        Returns:
+            The cached message list (the same objects on every call until the context changes)
+        """
+        with self._lock:
+            self._refresh()
+            messages = self._prefixes.get(name)
+            if messages is None:
+                messages = build(self._text)
+                self._prefixes[name] = messages
+            return messages
+
+def shared(path: str = 'vyftec-context.md') -> PromptContext:
+    """One PromptContext per file and process, shared by all rankers"""
+    with _shared_lock:
+        context = _shared.get(path)
+        if context is None:
+            context = PromptContext(path)
+            _shared[path] = context
+        return context
@@ -0,0 +1,166 @@
+"""
+Versioned cache keys for LLM rankings.
+
+A ranking depends on more than the project ID: the project text, the prompt
+template (including config.bidscoreLimit, which is rendered into it) and the
+company context in vyftec-context.md. The cache key therefore contains a short
+hash of each:
+
+    project_id_<id>_<content>_<prompt>_<context>
+
+so an edited project, prompt or context simply misses the cache instead of
+serving a stale ranking. Bid count and employer metrics are left out of the
+content hash on purpose, they change all the time without changing the fit.
+
+RankingVersions remembers which versions every cached ranking was made with,
+one table per pipeline (each pipeline has its own prompt).
+After a prompt or context change rescore_stale() deletes only the affected
+cache files and puts the affected, still recent projects back into the work
+queue with a low priority, so they are re-scored in the background while new
+projects keep going first. There is no need to clear the whole cache anymore.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+def fingerprint(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+def content_fingerprint(project_data: Dict) -> str:
+    """Hash of the project fields that decide the fit"""
+    return fingerprint(
+        project_data.get('title', ''),
+        project_data.get('description', ''),
+        ','.join(skill.get('name', '') for skill in project_data.get('jobs', [])),
+        project_data.get('country', '')
+    )
+
+def ranking_cache_key(project_id, versions: Tuple[str, str, str]) -> str:
+    content, prompt, context = versions
+    return f"project_id_{project_id}_{content[:10]}_{prompt[:8]}_{context[:8]}"
+
+class RankingVersions:
+    def __init__(self, db_path: str = 'cache/ranking_versions.sqlite3'):
+        """
+        Open (and create if needed) the version table
+
+        Args:
+            db_path: SQLite file with one row per ranked project
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS ranking_versions (
+                project_id TEXT PRIMARY KEY,
+                cache_key TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                context_hash TEXT NOT NULL,
+                score INTEGER,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ranking_versions_prompt_context
+                ON ranking_versions (prompt_hash, context_hash);
+        """)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def record(self, project_id, cache_key: str, versions: Tuple[str, str, str], score: int = None) -> None:
+        content, prompt, context = versions
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO ranking_versions
+                   (project_id, cache_key, content_hash, prompt_hash, context_hash, score, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (str(project_id), cache_key, content, prompt, context, score, time.time())
+            )
+
+    def stale(self, prompt: str, context: str, max_age: float = None) -> List[Dict]:
+        """Rankings made with another prompt or context, optionally only the recent ones"""
+        since = time.time() - max_age if max_age else 0
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT * FROM ranking_versions
+                   WHERE (prompt_hash != ? OR context_hash != ?) AND updated_at >= ?""",
+                (prompt, context, since)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def forget(self, project_ids: List) -> None:
+        with self._lock:
+            self._conn.executemany('DELETE FROM ranking_versions WHERE project_id = ?',
+                                   [(str(project_id),) for project_id in project_ids])
+
+def rescore_stale(versions: RankingVersions, cache, work_queue, prompt: str, context: str,
+                  max_age: float = 72 * 3600) -> Dict[str, int]:
+    """
+    Invalidate rankings made with an outdated prompt or context
+
+    The cache files of the affected rankings are deleted. Projects ranked within
+    ``max_age`` seconds that are still in the work queue are queued again with
+    priority -1 and a 'rescore' marker; older ones are only invalidated. The
+    rankers skip the near-duplicate reuse for 'rescore' items (allow_reuse).
+
+    Returns:
+        Dict with the number of 'invalidated' and 'queued' rankings
+    """
+    stale = versions.stale(prompt, context)
+    if not stale:
+        return {'invalidated': 0, 'queued': 0}
+
+    recent_since = time.time() - max_age
+    queued = 0
+    forget = []
+    for row in stale:
+        cache.delete('openai', row['cache_key'])
+        item = work_queue.get(row['project_id']) if row['updated_at'] >= recent_since else None
+        if item is None:
+            forget.append(row['project_id'])
+            continue
+        if item['state'] == 'pending' and item['payload'].get('rescore'):
+            queued += 1
+            continue
+        payload = item['payload']
+        payload['rescore'] = True
+        payload['previous_score'] = row['score']
+        work_queue.reschedule(row['project_id'], payload, priority=-1)
+        queued += 1
+    versions.forget(forget)
+    return {'invalidated': len(stale), 'queued': queued}
+
+class RescoreMonitor:
+    """Runs rescore_stale() whenever the context file hash differs from the last check"""
+
+    def __init__(self, versions: RankingVersions, ranker, work_queue, max_age: float = 72 * 3600):
+        """
+        Args:
+            versions: Version table the ranker records into
+            ranker: ProjectRanker with cache, context_fingerprint() and prompt_version
+            work_queue: Queue the stale projects are put back into
+            max_age: Only projects ranked within this many seconds are re-scored
+        """
+        self.versions = versions
+        self.ranker = ranker
+        self.work_queue = work_queue
+        self.max_age = max_age
+        self._checked_context = None
+
+    def check(self) -> Dict[str, int]:
+        context = self.ranker.context_fingerprint()
+        if context == self._checked_context:
+            return {'invalidated': 0, 'queued': 0}
+        self._checked_context = context
+        return rescore_stale(self.versions, self.ranker.cache, self.work_queue, self.ranker.prompt_version,
+                             context, max_age=self.max_age)
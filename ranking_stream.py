@@ -0,0 +1,80 @@
+"""
+Streamed ranking responses with early cancellation.
+
+Both ranking prompts ask for the score as the first JSON field, and the
+structured-output schema puts it first too. When the response is streamed,
+the score is known after a handful of tokens. If it is far below the score
+limit, the explanation and bid teaser would never be shown. read() then
+closes the stream, which aborts the HTTP response and stops the generation,
+so neither the completion tokens nor the waiting time are spent.
+"""
+import re
+import time
+from typing import Dict, Optional
+
+# {"score": 42,  (also inside a ```json fence, or with the number quoted)
+LEADING_SCORE = re.compile(r'^\s*(?:```(?:json)?\s*)?\{\s*"score"\s*:\s*"?(\d{1,3})(?=[\s",}])')
+
+# The score has to show up within this many characters, otherwise we stop looking
+_SCORE_WINDOW = 60
+
+def leading_score(text: str) -> Optional[int]:
+    """Score at the start of a (partial) JSON response, None if it isn't complete yet"""
+    match = LEADING_SCORE.match(text)
+    if match:
+        score = int(match.group(1))
+        if 0 <= score <= 100:
+            return score
+    return None
+
+def read(stream, cancel_below: int = None, stop_after_score: bool = False) -> Dict:
+    """
+    Consume a chat completion stream
+
+    Args:
+        stream: Iterator of chat.completion.chunk objects (create(..., stream=True))
+        cancel_below: Close the stream as soon as the leading score is below this value
+        stop_after_score: Close the stream as soon as the leading score is known (first pass of a cascade)
+
+    Returns:
+        Dict with the 'text' received, 'usage' (None if the stream was cancelled),
+        the early 'score' (None unless parsed from the stream), 'cancelled' and 'seconds'
+    """
+    started = time.monotonic()
+    parts = []
+    received = 0
+    usage = None
+    score = None
+    cancelled = False
+    watch = cancel_below is not None or stop_after_score
+    try:
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            received += len(delta)
+            if watch:
+                text = ''.join(parts)
+                score = leading_score(text)
+                if score is not None:
+                    watch = False
+                    if stop_after_score or score < cancel_below:
+                        cancelled = True
+                        break
+                elif received > _SCORE_WINDOW:
+                    watch = False
+    finally:
+        if cancelled and hasattr(stream, 'close'):
+            stream.close()
+    return {
+        'text': ''.join(parts),
+        'usage': usage,
+        'score': score,
+        'cancelled': cancelled,
+        'seconds': time.monotonic() - started
+    }
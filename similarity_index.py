@@ -0,0 +1,451 @@
+"""
+Vector similarity index over previously ranked projects.
+
+Every project the LLM ranked is stored as a hashed n-gram vector (word
+unigrams and bigrams of title and description plus the skill names) in one
+NumPy matrix together with its score. For a new project the k nearest past
+projects are found with a single matrix product, and their scores give a kNN
+estimate of the LLM score:
+
+- a confident estimate far below the score limit skips the LLM call
+- otherwise the estimate is used as queue priority, so likely good projects
+  are ranked (and bid on) first
+
+Rows are L2-normalized float32 vectors of ``dim`` buckets (feature hashing with
+a sign bit), so the dot product is the cosine similarity. With the default
+512 dimensions 100k projects take ~200 MB and a lookup is one 100k x 512
+matrix-vector product (a few ms); several projects can be looked up in one
+batch with query_many().
+
+The index lives in cache/similarity_index.sqlite3, an append-only table of
+(project ID, score, vector) rows that all worker processes share: each process
+appends the projects it ranked and picks up the rows the others appended since
+its last sync, so no worker overwrites the additions of another. An empty
+index is seeded on first use from project_evaluations.json, the saved jobs,
+the finished work queue items and the cached OpenAI rankings:
+
+    python similarity_index.py            # (re)build from history and show stats
+    python similarity_index.py --bench    # lookup time at 100k projects
+
+NumPy is optional: without it from_settings() returns None and the pipelines
+run as before.
+"""
+import glob
+import json
+import math
+import os
+import pickle
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from prescorer import tokenize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def project_features(project: Dict) -> List[str]:
+    """Hashed features of a project: words, word bigrams and skills"""
+    words = tokenize(f"{project.get('title', '')} {project.get('description', '') or ''}")
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for job in project.get('jobs', []) or []:
+        name = job.get('name', '') if isinstance(job, dict) else str(job)
+        if name:
+            features.append(f"skill:{name.lower()}")
+    return features
+
+class SimilarityIndex:
+    def __init__(self, path: Optional[str] = 'cache/similarity_index.sqlite3', dim: int = 512,
+                 min_similarity: float = 0.3, save_every: int = 20, k: int = 10, margin: float = 25,
+                 min_confidence: float = 0.6, sync_interval: float = 5):
+        """
+        Load the index from disk (or start empty)
+
+        Args:
+            path: SQLite file shared by all processes, None keeps the index in memory only
+            dim: Number of hash buckets per vector
+            min_similarity: Neighbors below this cosine similarity are ignored
+            save_every: Write the added projects to disk after this many
+            k: Neighbors used for check()
+            margin: check() rejects confident estimates more than this many points below the score limit
+            min_confidence: Confidence needed before check() rejects a project
+            sync_interval: Minimum seconds between two lookups of the rows other processes added
+        """
+        if np is None:
+            raise ImportError("numpy is required for the similarity index")
+        self.path = path
+        self.dim = dim
+        self.min_similarity = min_similarity
+        self.save_every = save_every
+        self.k = k
+        self.margin = margin
+        self.min_confidence = min_confidence
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_row_id = 0
+        self._synced_at = None
+        self.ids = []
+        self.rows = {}
+        self.scores = np.zeros(0, dtype=np.float32)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.count = 0
+        self._conn = None
+        self._open()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _open(self) -> None:
+        if not self.path:
+            return
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        # AUTOINCREMENT: a re-added project gets a new, higher row id, so the other processes see it
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS projects (
+                row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id TEXT NOT NULL UNIQUE,
+                score REAL NOT NULL,
+                vector BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        if row is None or int(row[0]) != self.dim:
+            if row is not None:
+                print(f"ℹ️ Similarity index has {row[0]} dimensions instead of {self.dim}, rebuilding")
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute("DELETE FROM projects")
+            self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            self._conn.execute('COMMIT')
+        self.sync(force=True)
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Load the rows appended since the last sync (by any process)
+
+        Returns:
+            Number of rows loaded
+        """
+        if self._conn is None:
+            return 0
+        now = time.monotonic()
+        if not force and self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return 0
+        self._synced_at = now
+        try:
+            rows = self._conn.execute(
+                "SELECT row_id, project_id, score, vector FROM projects WHERE row_id > ? ORDER BY row_id",
+                (self._last_row_id,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not load similarity index: {str(e)}")
+            return 0
+        with self._lock:
+            for row_id, project_id, score, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if len(vector) == self.dim:
+                    self._set(project_id, vector, score)
+                self._last_row_id = row_id
+        return len(rows)
+
+    def save(self) -> None:
+        """Append the projects added since the last save"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if self._conn is None or not pending:
+            return
+        try:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO projects (project_id, score, vector) VALUES (?, ?, ?)", pending
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not save similarity index: {str(e)}")
+            with self._lock:
+                self._pending = pending + self._pending
+
+    def _set(self, project_id: str, vector, score: float) -> None:
+        # Caller holds self._lock
+        row = self.rows.get(project_id)
+        if row is None:
+            row = self.count
+            if row >= len(self.vectors):
+                # Grow by doubling so adding stays amortized O(1)
+                capacity = max(64, 2 * len(self.vectors))
+                vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+                vectors[:self.count] = self.vectors[:self.count]
+                scores = np.zeros(capacity, dtype=np.float32)
+                scores[:self.count] = self.scores[:self.count]
+                self.vectors, self.scores = vectors, scores
+            self.ids.append(project_id)
+            self.rows[project_id] = row
+            self.count += 1
+        self.vectors[row] = vector
+        self.scores[row] = score
+
+    def vectorize(self, project: Dict):
+        """Signed feature hashing with sublinear term frequency, L2-normalized"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts = {}
+        for feature in project_features(project):
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode('utf-8'))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * (1 + math.log(count))
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def add(self, project_id, project: Dict, score: float) -> None:
+        """Add (or update) a ranked project"""
+        vector = self.vectorize(project)
+        project_id = str(project_id)
+        with self._lock:
+            self._set(project_id, vector, score)
+            self._pending.append((project_id, float(score), vector.tobytes()))
+            save = len(self._pending) >= self.save_every
+        if save:
+            self.save()
+
+    def query_many(self, projects: List[Dict], k: int = 10, exclude_ids: Iterable = None) -> List[List[Dict]]:
+        """
+        k nearest ranked projects for several projects with one matrix product
+
+        Returns:
+            Per project a list of neighbors (project_id, score, similarity), best first
+        """
+        if not projects:
+            return []
+        # Projects the other workers ranked in the meantime
+        self.sync()
+        queries = np.stack([self.vectorize(project) for project in projects])
+        exclude = {str(i) for i in (exclude_ids or [])}
+        with self._lock:
+            count = self.count
+            if not count:
+                return [[] for _ in projects]
+            similarities = queries @ self.vectors[:count].T
+            scores = self.scores[:count].copy()
+            ids = self.ids[:count]
+        results = []
+        take = min(k + len(exclude), count)
+        for row in similarities:
+            if take < count:
+                top = np.argpartition(-row, take - 1)[:take]
+            else:
+                top = np.arange(count)
+            top = top[np.argsort(-row[top])]
+            neighbors = []
+            for i in top:
+                if row[i] < self.min_similarity or ids[i] in exclude:
+                    continue
+                neighbors.append({'project_id': ids[i], 'score': float(scores[i]), 'similarity': float(row[i])})
+                if len(neighbors) >= k:
+                    break
+            results.append(neighbors)
+        return results
+
+    def predict(self, project: Dict, k: int = 10, exclude_ids: Iterable = None) -> Dict:
+        """
+        kNN estimate of the LLM score
+
+        Returns:
+            Dict with 'score' (similarity weighted mean, None without neighbors),
+            'confidence' (0-1, high when there are many close neighbors that agree)
+            and 'neighbors'
+        """
+        return self._predict(self.query_many([project], k, exclude_ids)[0], k)
+
+    def check(self, project: Dict, score_limit: int) -> Dict:
+        """
+        Decide whether a project needs the LLM
+
+        Returns:
+            The prediction plus 'rank' (False if the neighbors agree that the project
+            lies far below the score limit) and the 'threshold' used
+        """
+        result = self.predict(project, self.k, exclude_ids=[project.get('id')])
+        result['threshold'] = score_limit - self.margin
+        result['rank'] = not (result['score'] is not None
+                              and result['confidence'] >= self.min_confidence
+                              and result['score'] < result['threshold'])
+        return result
+
+    @staticmethod
+    def _predict(neighbors: List[Dict], k: int) -> Dict:
+        if not neighbors:
+            return {'score': None, 'confidence': 0.0, 'neighbors': []}
+        weights = [n['similarity'] ** 2 for n in neighbors]
+        total = sum(weights)
+        score = sum(w * n['score'] for w, n in zip(weights, neighbors)) / total
+        spread = math.sqrt(sum(w * (n['score'] - score) ** 2 for w, n in zip(weights, neighbors)) / total)
+        mean_similarity = sum(n['similarity'] for n in neighbors) / len(neighbors)
+        confidence = mean_similarity * max(0.0, 1 - spread / 30) * min(1.0, len(neighbors) / min(k, 5))
+        return {'score': round(score), 'confidence': round(confidence, 3), 'spread': round(spread, 1),
+                'neighbors': neighbors}
+
+def _history_from_evaluations(path: str) -> Iterable:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            evaluations = json.load(f)
+    except (OSError, ValueError):
+        return
+    for evaluation in evaluations:
+        match = re.search(r'Score:\s*(\d+)', evaluation.get('evaluation', ''))
+        if match and evaluation.get('project'):
+            project_id = f"eval_{evaluation.get('completion_id') or evaluation.get('timestamp')}"
+            yield project_id, {'title': '', 'description': evaluation['project']}, int(match.group(1))
+
+def _history_from_jobs(jobs_dir: str) -> Iterable:
+    for path in glob.glob(os.path.join(jobs_dir, 'job_*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            continue
+        project = job.get('project_details', {})
+        score = job.get('ranking', {}).get('score', job.get('bid_score'))
+        if project.get('id') and score is not None:
+            yield project['id'], project, score
+
+def _history_from_work_queue(db_path: str) -> Iterable:
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        rows = conn.execute("SELECT project_id, payload, result FROM work_items WHERE state = 'done'").fetchall()
+    finally:
+        conn.close()
+    for project_id, payload, result in rows:
+        try:
+            ranking = json.loads(result) if result else {}
+            project = json.loads(payload).get('project_data', {})
+        except ValueError:
+            continue
+        if 'score' in ranking:
+            yield project_id, project, ranking['score']
+
+def _history_from_cache(cache_dir: str) -> Iterable:
+    # Rankings are cached as openai/project_id_<id>.pkl, the project itself only sometimes
+    for path in glob.glob(os.path.join(cache_dir, 'openai', 'project_id_*.pkl')):
+        # project_id_<id>_<content>_<prompt>_<context>.pkl since the keys are versioned
+        project_id = os.path.basename(path)[len('project_id_'):-len('.pkl')].split('_')[0]
+        project = None
+        for candidate in (f"id_{project_id}.pkl", f"id_id_{project_id}.pkl"):
+            project_path = os.path.join(cache_dir, 'project_details', candidate)
+            if os.path.exists(project_path):
+                try:
+                    with open(project_path, 'rb') as f:
+                        project = pickle.load(f)
+                except Exception:
+                    project = None
+                break
+        if not isinstance(project, dict):
+            continue
+        try:
+            with open(path, 'rb') as f:
+                ranking = pickle.load(f)
+        except Exception:
+            continue
+        if ranking.get('success', True) and 'score' in ranking:
+            yield project_id, project, ranking['score']
+
+def seed_from_history(index: SimilarityIndex, evaluations_path: str = 'project_evaluations.json',
+                      jobs_dir: str = 'jobs', work_queue_pattern: str = 'cache/work_queue*.sqlite3',
+                      cache_dir: str = 'cache') -> int:
+    """Add every ranked project we still have on disk; returns the number of projects added"""
+    added = 0
+    sources = [
+        _history_from_evaluations(evaluations_path),
+        _history_from_jobs(jobs_dir),
+        # One work queue per pipeline
+        *[_history_from_work_queue(path) for path in sorted(glob.glob(work_queue_pattern))],
+        _history_from_cache(cache_dir)
+    ]
+    for source in sources:
+        for project_id, project, score in source:
+            index.add(project_id, project, score)
+            added += 1
+    index.save()
+    return added
+
+def from_settings(settings) -> Optional[SimilarityIndex]:
+    """
+    Similarity index for a run, or None if it is disabled or numpy is missing
+
+    An empty index is seeded from the ranking history first.
+    """
+    if not getattr(settings, 'knn', True):
+        return None
+    if np is None:
+        print("ℹ️ numpy not installed, kNN score estimate disabled")
+        return None
+    import config
+    index = SimilarityIndex(dim=getattr(config, 'KNN_DIM', 512),
+                            min_similarity=getattr(config, 'KNN_MIN_SIMILARITY', 0.3),
+                            k=getattr(config, 'KNN_K', 10),
+                            margin=getattr(config, 'KNN_MARGIN', 25),
+                            min_confidence=getattr(config, 'KNN_MIN_CONFIDENCE', 0.6))
+    if not len(index):
+        added = seed_from_history(index)
+        print(f"🧭 Similarity index seeded with {added} ranked projects")
+    return index
+
+def benchmark(size: int = 100000, dim: int = 512, batch: int = 20, k: int = 10) -> Dict:
+    """Lookup time on a synthetic index of ``size`` projects"""
+    index = SimilarityIndex(path=None, dim=dim)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index.vectors = vectors
+    index.scores = rng.integers(0, 100, size).astype(np.float32)
+    index.ids = [str(i) for i in range(size)]
+    index.rows = {project_id: row for row, project_id in enumerate(index.ids)}
+    index.count = size
+    index.min_similarity = -1.0
+
+    projects = [{'title': f'Laravel dashboard {i}', 'description': 'PHP developer for a Vue.js admin panel'}
+                for i in range(batch)]
+    start = time.perf_counter()
+    index.predict(projects[0], k)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    index.query_many(projects, k)
+    batched = time.perf_counter() - start
+    return {'size': size, 'single_ms': single * 1000, 'batch': batch, 'batch_ms': batched * 1000}
+
+if __name__ == '__main__':
+    if np is None:
+        print("numpy is required: pip install numpy")
+        sys.exit(1)
+    if '--bench' in sys.argv:
+        result = benchmark()
+        print(f"Index size:    {result['size']}")
+        print(f"Single lookup: {result['single_ms']:.1f} ms")
+        print(f"Batch of {result['batch']}:   {result['batch_ms']:.1f} ms")
+        sys.exit(0)
+    index = SimilarityIndex()
+    added = seed_from_history(index)
+    print(f"Added {added} ranked projects, index holds {len(index)}")
@@ -0,0 +1,148 @@
+"""
+Single-flight coalescing of concurrent ranking calls.
+
+The ranking cache is only written after the LLM call returns. Until then a
+second caller for the same project (another worker thread, a sharded worker
+process, a re-score or a manual run next to the daemon) misses the cache and
+pays for the same call again. SingleFlight lets only the first caller per key
+do the work; everybody else waits for it and reuses its result.
+
+- Within a process the followers wait on an Event and get a copy of the leader's
+  result, failed rankings included.
+- Across processes the leader holds a lease file ``<lease_dir>/<key>.lease``
+  (created with O_EXCL, like the claims in coordinator.py). Followers poll the
+  ranking cache until the result shows up or the lease is gone. A lease older
+  than ``lease_ttl`` belongs to a process that died mid-call and is taken over.
+  If the leader released its lease without caching anything (the ranking
+  failed), the follower does the call itself.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self, lease_dir: str = 'cache/inflight', lease_ttl: float = 300, poll_interval: float = 0.5):
+        """
+        Args:
+            lease_dir: Directory for the cross-process lease files, shared by all workers
+            lease_ttl: Seconds after which a lease is considered abandoned
+            poll_interval: Seconds between cache lookups while another process holds the lease
+        """
+        self.lease_dir = Path(lease_dir)
+        self.lease_dir.mkdir(parents=True, exist_ok=True)
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {'calls': 0, 'coalesced': 0, 'waited_on_lease': 0}
+
+    def _lease_path(self, key: str) -> Path:
+        safe_key = ''.join(char if char.isalnum() or char in '-_.' else '_' for char in str(key))
+        return self.lease_dir / f"{safe_key}.lease"
+
+    def _acquire(self, path: Path) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                expired = time.time() - os.path.getmtime(path) > self.lease_ttl
+            except FileNotFoundError:
+                return self._acquire(path)
+            if not expired:
+                return False
+            # Abandoned lease, e.g. from a worker that crashed mid-ranking: take it over
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return self._acquire(path)
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{os.getpid()} {threading.get_ident()}")
+        return True
+
+    @staticmethod
+    def _release(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _wait_for_lease(self, path: Path, lookup: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """Poll the cache while another process holds the lease; None once the lease is free"""
+        while True:
+            result = lookup()
+            if result:
+                return result
+            if self._acquire(path):
+                return None
+            time.sleep(self.poll_interval)
+
+    def do(self, key: str, fn: Callable[[], Dict], lookup: Callable[[], Optional[Dict]]) -> Dict:
+        """
+        Run fn() once per key at a time
+
+        Args:
+            key: Ranking cache key
+            fn: The actual ranking call
+            lookup: Cache lookup for the key, used to pick up the result of another process
+
+        Returns:
+            The result of fn(), or of the caller that was already ranking the same key
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self.stats['calls'] += 1
+            if not leader:
+                self.stats['coalesced'] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Own copy, callers add their own keys to the ranking
+            return dict(call.result) if isinstance(call.result, dict) else call.result
+
+        path = self._lease_path(key)
+        try:
+            if not self._acquire(path):
+                with self._lock:
+                    self.stats['waited_on_lease'] += 1
+                result = self._wait_for_lease(path, lookup)
+                if result:
+                    call.result = result
+                    return result
+            try:
+                call.result = fn()
+                return call.result
+            finally:
+                self._release(path)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+_shared: Dict[str, SingleFlight] = {}
+_shared_lock = threading.Lock()
+
+def shared(lease_dir: str = 'cache/inflight') -> SingleFlight:
+    """One SingleFlight per lease directory and process, shared by all rankers"""
+    with _shared_lock:
+        flight = _shared.get(lease_dir)
+        if flight is None:
+            import config
+            flight = SingleFlight(lease_dir, lease_ttl=getattr(config, 'RANKING_LEASE_TTL', 300))
+            _shared[lease_dir] = flight
+        return flight
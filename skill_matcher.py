@@ -0,0 +1,272 @@
+"""
+Precompiled matcher for project skills against our own skill list.
+
+Replaces the nested substring loop in bidder.run(), which renormalized our
+skills for every project and compared every project skill with every one of
+ours. Everything that only depends on our skills is built once:
+
+- exact: normalized name -> our skill
+- synonyms: common alternative spellings -> our skill
+- contained: every substring of our normalized names -> our skills
+  (answers "project skill is part of one of ours" with one dict lookup)
+- an Aho-Corasick automaton over our normalized names
+  (finds all of our skills that occur inside a project skill in one pass)
+
+Together these give the same matches as the old bidirectional substring check
+plus the synonyms.
+
+Benchmark against the old loop on recorded project pages:
+
+    python skill_matcher.py                      # cached project_details pickles
+    python skill_matcher.py pages/*.json         # saved API responses
+"""
+import glob
+import json
+import os
+import pickle
+import sys
+import time
+from collections import deque
+from typing import Dict, Iterable, List
+
+# Alternative names used by employers -> our skill name (both normalized)
+SKILL_SYNONYMS = {
+    'js': 'javascript',
+    'ecmascript': 'javascript',
+    'ts': 'typescript',
+    'vue': 'vue.js',
+    'vuejs': 'vue.js',
+    'vue js': 'vue.js',
+    'reactjs': 'react',
+    'react.js': 'react',
+    'react js': 'react',
+    'html5': 'html',
+    'css3': 'css',
+    'tailwind': 'tailwind css',
+    'tailwindcss': 'tailwind css',
+    'postgres': 'postgresql',
+    'mongo': 'mongodb',
+    'wp': 'wordpress',
+    'rest api': 'restful api',
+    'rest': 'restful api',
+    'api': 'api development',
+    'api integration': 'api development',
+    'ui/ux': 'ux/ui design',
+    'ui design': 'ux/ui design',
+    'ux design': 'ux/ui design',
+    'website design': 'web design',
+    'dashboard': 'dashboard development',
+    'dashboards': 'dashboard development',
+    'bi': 'business intelligence',
+    'payment integration': 'payment gateway integration',
+    'payment gateway': 'payment gateway integration',
+    'cms': 'cms development',
+}
+
+def normalize_skill(skill: str) -> str:
+    return ' '.join(skill.lower().replace('-', ' ').replace('_', ' ').split())
+
+class _AhoCorasick:
+    """Minimal Aho-Corasick automaton returning the patterns found in a text"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                node = nxt
+            self._out[node].add(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> set:
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            if self._out[node]:
+                found |= self._out[node]
+        return found
+
+class SkillMatcher:
+    def __init__(self, our_skills: List[Dict], synonyms: Dict[str, str] = None):
+        """
+        Compile the match index
+
+        Args:
+            our_skills: Our skills as dicts with at least a 'name' key
+            synonyms: Normalized alternative name -> normalized name of one of our skills
+        """
+        self.skill_names = {}
+        for skill in our_skills:
+            self.skill_names[normalize_skill(skill['name'])] = skill['name']
+
+        self.exact = dict(self.skill_names)
+        for alias, target in (SKILL_SYNONYMS if synonyms is None else synonyms).items():
+            if target in self.skill_names and alias not in self.exact:
+                self.exact[normalize_skill(alias)] = self.skill_names[target]
+
+        # Every substring of our names -> the skills containing it
+        self.contained = {}
+        for normalized, name in self.skill_names.items():
+            length = len(normalized)
+            for start in range(length):
+                for end in range(start + 1, length + 1):
+                    self.contained.setdefault(normalized[start:end], set()).add(name)
+
+        self._automaton = _AhoCorasick(self.skill_names)
+
+    def match_skill(self, project_skill: str) -> Dict[str, float]:
+        """Our skills matching a single project skill, with a strength between 0 and 1"""
+        normalized = normalize_skill(project_skill)
+        if not normalized:
+            return {}
+
+        name = self.exact.get(normalized)
+        if name:
+            return {name: 1.0}
+
+        matches = {}
+        # Project skill is part of one of ours, e.g. "sql" -> "MySQL", "PostgreSQL"
+        for name in self.contained.get(normalized, ()):
+            matches[name] = len(normalized) / len(normalize_skill(name))
+        # One of ours is part of the project skill, e.g. "php" in "php developer"
+        for found in self._automaton.find(normalized):
+            name = self.skill_names[found]
+            matches[name] = max(matches.get(name, 0), len(found) / len(normalized))
+        return matches
+
+    def match(self, project_skills: Iterable[str]) -> Dict:
+        """
+        Match all skills of a project in one pass
+
+        Returns:
+            Dict with 'matched' (our skill name -> best strength), 'exact' (our skills
+            matched exactly or via synonym) and 'strength' (average best strength per
+            project skill, 0 = nothing matched, 1 = every skill matched exactly)
+        """
+        matched = {}
+        exact = []
+        total = 0.0
+        count = 0
+        for project_skill in project_skills:
+            count += 1
+            skill_matches = self.match_skill(project_skill)
+            if not skill_matches:
+                continue
+            best = 0.0
+            for name, strength in skill_matches.items():
+                if strength > matched.get(name, 0):
+                    matched[name] = strength
+                if strength == 1.0 and name not in exact:
+                    exact.append(name)
+                best = max(best, strength)
+            total += best
+        return {
+            'matched': matched,
+            'exact': exact,
+            'strength': total / count if count else 0.0
+        }
+
+    def has_match(self, project_skills: Iterable[str]) -> bool:
+        return any(self.match_skill(skill) for skill in project_skills)
+
+def _legacy_has_match(project_skills: List[str], skill_names_lower: List[str]) -> bool:
+    """The nested loop bidder.run() used before, kept for the benchmark"""
+    def normalize_skill(skill):
+        return skill.lower().replace('-', ' ').replace('_', ' ').strip()
+
+    normalized_project_skills = [normalize_skill(skill) for skill in project_skills]
+    normalized_our_skills = [normalize_skill(skill) for skill in skill_names_lower]
+    if set(normalized_project_skills) & set(normalized_our_skills):
+        return True
+    for project_skill in normalized_project_skills:
+        for our_skill in normalized_our_skills:
+            if our_skill in project_skill or project_skill in our_skill:
+                return True
+    return False
+
+def _load_recorded_projects(paths: List[str]) -> List[Dict]:
+    projects = []
+    if not paths:
+        paths = glob.glob(os.path.join('cache', 'project_details', '*.pkl'))
+    for path in paths:
+        try:
+            if path.endswith('.pkl'):
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+        except Exception as e:
+            print(f"Skipping {path}: {str(e)}")
+            continue
+        if isinstance(data, dict) and 'result' in data:
+            projects.extend(data['result'].get('projects', []))
+        elif isinstance(data, dict) and 'project_details' in data:
+            projects.append(data['project_details'])
+        elif isinstance(data, dict):
+            projects.append(data)
+    return projects
+
+def benchmark(projects: List[Dict], our_skills: List[Dict], rounds: int = 20) -> Dict:
+    """Compare the legacy nested loop with the compiled matcher on the given projects"""
+    skill_lists = [[job.get('name', '') for job in project.get('jobs', [])] for project in projects]
+    skill_names_lower = [skill['name'].lower() for skill in our_skills]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy = [_legacy_has_match(skills, skill_names_lower) for skills in skill_lists]
+    legacy_time = (time.perf_counter() - start) / rounds
+
+    compile_start = time.perf_counter()
+    matcher = SkillMatcher(our_skills)
+    compile_time = time.perf_counter() - compile_start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        compiled = [bool(matcher.match(skills)['matched']) for skills in skill_lists]
+    compiled_time = (time.perf_counter() - start) / rounds
+
+    return {
+        'projects': len(skill_lists),
+        'legacy_ms': legacy_time * 1000,
+        'compiled_ms': compiled_time * 1000,
+        'compile_ms': compile_time * 1000,
+        'legacy_matches': sum(legacy),
+        'compiled_matches': sum(compiled),
+        'disagreements': sum(1 for a, b in zip(legacy, compiled) if a != b)
+    }
+
+if __name__ == '__main__':
+    from bidder import OUR_SKILLS
+    recorded = _load_recorded_projects(sys.argv[1:])
+    if not recorded:
+        print("No recorded projects found (cache/project_details/*.pkl or given JSON files)")
+        sys.exit(1)
+    result = benchmark(recorded, OUR_SKILLS)
+    print(f"Projects:          {result['projects']}")
+    print(f"Legacy loop:       {result['legacy_ms']:.2f} ms per page set")
+    print(f"Compiled matcher:  {result['compiled_ms']:.2f} ms per page set (+{result['compile_ms']:.2f} ms once)")
+    print(f"Matches:           legacy {result['legacy_matches']}, compiled {result['compiled_matches']} "
+          f"({result['disagreements']} disagreements, synonyms only add matches)")
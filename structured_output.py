@@ -0,0 +1,279 @@
+"""
+JSON schemas and parsing for structured LLM responses.
+
+The schemas are sent as ``response_format`` (OpenAI structured outputs, strict
+mode), so the model can only produce JSON that matches them. validate() checks
+the parsed result against the same schema locally. That catches truncated
+responses and models or proxies that ignore the schema, and the caller gets a
+precise error instead of a KeyError somewhere later.
+
+parse() is the single entry point for LLM responses: it parses with orjson
+(json as fallback), runs a local repair step for near-valid JSON (code fences,
+text around the object, trailing commas, raw newlines in strings, a response
+cut off by max_tokens, "85" instead of 85) and validates the result. A format
+problem that can be repaired locally costs no second LLM call. ParseStats
+counts parsed, repaired and failed responses.
+
+Only the subset of JSON Schema that strict mode accepts is supported: type
+(also as list), properties, required, additionalProperties, items, enum and
+anyOf.
+"""
+import json
+import re
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+class StructuredOutputError(ValueError):
+    """Response is no valid JSON or does not match the schema, even after the repair step"""
+
+BID_TEASER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "first_paragraph": {"type": "string"},
+        "second_paragraph": {"type": "string"},
+        "third_paragraph": {"type": "string"},
+        "question": {"type": "string"}
+    },
+    "required": ["first_paragraph", "second_paragraph", "third_paragraph", "question"],
+    "additionalProperties": False
+}
+
+# Minimal ranking response (the freelancer_api prompt may add an optional bid_teaser)
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer"},
+        "explanation": {"type": "string"},
+        "bid_teaser": {"type": "object"}
+    },
+    "required": ["score", "explanation"]
+}
+
+# Score and explanation, plus the bid teaser for projects above the score limit (null otherwise)
+RANKING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer"},
+        "explanation": {"type": "string"},
+        "bid_teaser": {"anyOf": [BID_TEASER_SCHEMA, {"type": "null"}]}
+    },
+    "required": ["score", "explanation", "bid_teaser"],
+    "additionalProperties": False
+}
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+    'null': type(None)
+}
+
+def response_format(name: str, schema: Dict) -> Dict:
+    """``response_format`` argument for chat.completions.create()"""
+    return {'type': 'json_schema', 'json_schema': {'name': name, 'schema': schema, 'strict': True}}
+
+def _is_type(value, type_name: str) -> bool:
+    # bool is a subclass of int, but true is no integer in JSON
+    if isinstance(value, bool) and type_name in ('integer', 'number'):
+        return False
+    return isinstance(value, _TYPES[type_name])
+
+def validate(data, schema: Dict, path: str = '$') -> List[str]:
+    """
+    Check data against a schema
+
+    Returns:
+        List of errors ("$.bid_teaser.question: expected string"), empty if data is valid
+    """
+    if 'anyOf' in schema:
+        for option in schema['anyOf']:
+            if not validate(data, option, path):
+                return []
+        return [f"{path}: matches none of the allowed schemas"]
+
+    types = schema.get('type')
+    if types is not None:
+        types = types if isinstance(types, list) else [types]
+        if not any(_is_type(data, type_name) for type_name in types):
+            return [f"{path}: expected {' or '.join(types)}, got {type(data).__name__}"]
+    if 'enum' in schema and data not in schema['enum']:
+        return [f"{path}: {data!r} is not one of {schema['enum']}"]
+
+    errors = []
+    if isinstance(data, dict):
+        properties = schema.get('properties', {})
+        for key in schema.get('required', []):
+            if key not in data:
+                errors.append(f"{path}.{key}: missing")
+        for key, value in data.items():
+            if key in properties:
+                errors.extend(validate(value, properties[key], f"{path}.{key}"))
+            elif schema.get('additionalProperties') is False:
+                errors.append(f"{path}.{key}: unexpected property")
+    elif isinstance(data, list) and 'items' in schema:
+        for index, item in enumerate(data):
+            errors.extend(validate(item, schema['items'], f"{path}[{index}]"))
+    return errors
+
+def _close_and_escape(text: str) -> str:
+    """Escape raw control characters inside strings and close what a truncated response left open"""
+    out = []
+    closers = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == '\n':
+                char = '\\n'
+            elif char == '\r':
+                char = '\\r'
+            elif char == '\t':
+                char = '\\t'
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]' and closers:
+            closers.pop()
+        out.append(char)
+    if escaped:
+        out.pop()
+    if in_string:
+        out.append('"')
+    text = ''.join(out).rstrip()
+    # A key or a comma without anything after it
+    text = re.sub(r'(,\s*"[^"]*"\s*:?|,)\s*$', '', text)
+    return text + ''.join(reversed(closers))
+
+def repair(text: str) -> str:
+    """Best-effort fix of near-valid JSON; the result still has to be parsed"""
+    text = text.strip()
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text)
+    start = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=-1)
+    if start > 0:
+        text = text[start:]
+    end = max(text.rfind('}'), text.rfind(']'))
+    if 0 <= end < len(text) - 1 and not text[end + 1:].strip().startswith(('"', ',')):
+        text = text[:end + 1]
+    text = text.replace('\u201c', '"').replace('\u201d', '"')
+    text = re.sub(r',\s*([}\]])', r'\1', text)
+    return _close_and_escape(text)
+
+def coerce(data, schema: Dict):
+    """Convert values the model wrote with the wrong JSON type ("85" or 85.0 for an integer)"""
+    if 'anyOf' in schema:
+        for option in schema['anyOf']:
+            candidate = coerce(data, option)
+            if not validate(candidate, option):
+                return candidate
+        return data
+    types = schema.get('type')
+    types = types if isinstance(types, list) else [types]
+    if 'integer' in types and not isinstance(data, bool):
+        if isinstance(data, float) and data.is_integer():
+            return int(data)
+        if isinstance(data, str) and data.strip().isdigit():
+            return int(data.strip())
+    if 'number' in types and isinstance(data, str):
+        try:
+            return float(data)
+        except ValueError:
+            return data
+    if isinstance(data, dict):
+        properties = schema.get('properties', {})
+        return {key: coerce(value, properties[key]) if key in properties else value for key, value in data.items()}
+    if isinstance(data, list) and 'items' in schema:
+        return [coerce(item, schema['items']) for item in data]
+    return data
+
+class ParseStats:
+    """Counts of parsed, locally repaired and failed responses, in total and per cycle"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = self._empty_stats()
+        self.cycle_stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {'parsed': 0, 'repaired': 0, 'failed': 0}
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            self.stats[outcome] += 1
+            self.cycle_stats[outcome] += 1
+
+    def cycle_report(self, reset: bool = True) -> Optional[str]:
+        """One line for the current cycle, None if nothing was parsed"""
+        with self._lock:
+            stats = self.cycle_stats
+            if reset:
+                self.cycle_stats = self._empty_stats()
+        total = stats['parsed'] + stats['repaired'] + stats['failed']
+        if not total:
+            return None
+        return (f"JSON: {total} response(s), {stats['repaired']} repaired locally, "
+                f"{stats['failed']} unparseable")
+
+def parse(text: str, schema: Dict, stats: ParseStats = None, salvage: Dict = None) -> Dict:
+    """
+    Parse and validate an LLM response
+
+    Args:
+        text: Raw message content
+        schema: Schema the result has to match
+        stats: Optional ParseStats to count the outcome in
+        salvage: Defaults for top-level properties that may be dropped when they are invalid
+            (e.g. {'bid_teaser': None} keeps the score of a response cut off in the teaser)
+
+    Returns:
+        The parsed data
+
+    Raises:
+        StructuredOutputError: If the response can't be parsed or repaired into valid data
+    """
+    outcome = 'parsed'
+    try:
+        try:
+            data = _loads(text)
+        except ValueError:
+            outcome = 'repaired'
+            try:
+                data = _loads(repair(text or ''))
+            except ValueError as e:
+                raise StructuredOutputError(f"Invalid JSON: {str(e)}")
+        if validate(data, schema):
+            data = coerce(data, schema)
+            outcome = 'repaired'
+        if salvage and isinstance(data, dict) and validate(data, schema):
+            properties = schema.get('properties', {})
+            for key, default in salvage.items():
+                if key not in data or validate(data[key], properties.get(key, {})):
+                    data[key] = default
+                    outcome = 'repaired'
+        errors = validate(data, schema)
+        if errors:
+            raise StructuredOutputError(f"Response does not match the schema: {'; '.join(errors)}")
+    except StructuredOutputError:
+        if stats:
+            stats.record('failed')
+        raise
+    if stats:
+        stats.record(outcome)
+    return data
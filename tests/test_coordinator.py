@@ -0,0 +1,130 @@
+import multiprocessing
+import time
+
+from coordinator import SharedSeenStore, ShardCoordinator
+
+PROJECT_IDS = list(range(1000, 1300))
+WORKERS = ['w0', 'w1', 'w2']
+
+def _wait_for_workers(state_dir, count, timeout=10):
+    coordinator = ShardCoordinator('observer', state_dir=state_dir, membership_ttl=0)
+    deadline = time.monotonic() + timeout
+    while len([w for w in coordinator.live_workers() if w != 'observer']) < count:
+        assert time.monotonic() < deadline, "workers didn't start"
+        time.sleep(0.05)
+
+def _sharded_worker(worker_id, state_dir, claims_dir, start, results):
+    """Process the owned projects first, then race for all of them like a worker in the middle of a rebalance"""
+    coordinator = ShardCoordinator(worker_id, state_dir=state_dir, heartbeat_interval=0.2,
+                                   worker_timeout=5, membership_ttl=0).start()
+    seen = SharedSeenStore(claims_dir)
+    start.wait()
+    owned = [project_id for project_id in PROJECT_IDS if coordinator.owns_project(project_id)]
+    claimed = [project_id for project_id in owned if seen.claim(project_id, worker_id)]
+    claimed += [project_id for project_id in reversed(PROJECT_IDS)
+                if project_id not in owned and seen.claim(project_id, worker_id)]
+    results.put((worker_id, owned, claimed))
+    coordinator.stop()
+
+def _crashing_worker(worker_id, state_dir, claims_dir, ready):
+    ShardCoordinator(worker_id, state_dir=state_dir, heartbeat_interval=0.1, worker_timeout=1).start()
+    seen = SharedSeenStore(claims_dir, ttl=1)
+    seen.claim(PROJECT_IDS[0], worker_id)
+    ready.set()
+    time.sleep(60)
+
+def test_each_project_is_claimed_exactly_once(tmp_path):
+    state_dir, claims_dir = str(tmp_path / 'workers'), str(tmp_path / 'claims')
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=_sharded_worker, args=(worker_id, state_dir, claims_dir, start, results))
+                 for worker_id in WORKERS]
+    for process in processes:
+        process.start()
+    try:
+        _wait_for_workers(state_dir, len(WORKERS))
+        start.set()
+        outcome = {}
+        for _ in WORKERS:
+            worker_id, owned, claimed = results.get(timeout=30)
+            outcome[worker_id] = (owned, claimed)
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+    # Hash mode: the shards don't overlap and cover every project
+    owned = [project_id for worker_owned, _ in outcome.values() for project_id in worker_owned]
+    assert sorted(owned) == PROJECT_IDS
+    assert all(worker_owned for worker_owned, _ in outcome.values())
+    # The claim store lets exactly one worker through for every project
+    claimed = [project_id for _, worker_claimed in outcome.values() for project_id in worker_claimed]
+    assert sorted(claimed) == PROJECT_IDS
+
+def test_rebalance_when_heartbeat_expires(tmp_path):
+    state_dir, claims_dir = str(tmp_path / 'workers'), str(tmp_path / 'claims')
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    crashing = context.Process(target=_crashing_worker, args=('w2', state_dir, claims_dir, ready))
+    crashing.start()
+    survivors = [ShardCoordinator(worker_id, state_dir=state_dir, heartbeat_interval=0.1, worker_timeout=1,
+                                  membership_ttl=0).start()
+                 for worker_id in WORKERS[:2]]
+    try:
+        assert ready.wait(30)
+        for coordinator in survivors:
+            assert coordinator.live_workers() == WORKERS
+        before = {coordinator.worker_id: {project_id for project_id in PROJECT_IDS
+                                          if coordinator.owns_project(project_id)}
+                  for coordinator in survivors}
+        orphaned = set(PROJECT_IDS) - before['w0'] - before['w1']
+        assert orphaned
+
+        # Killed without deregistering: its heartbeat file stays until it is too old
+        crashing.kill()
+        crashing.join()
+        time.sleep(1.3)
+        for coordinator in survivors:
+            assert coordinator.live_workers() == WORKERS[:2]
+        after = {coordinator.worker_id: {project_id for project_id in PROJECT_IDS
+                                         if coordinator.owns_project(project_id)}
+                 for coordinator in survivors}
+        assert after['w0'] | after['w1'] == set(PROJECT_IDS)
+        assert not after['w0'] & after['w1']
+        # Rendezvous hashing only moves the dead worker's projects
+        assert before['w0'] <= after['w0'] and before['w1'] <= after['w1']
+        assert orphaned & after['w0'] and orphaned & after['w1']
+
+        # The dead worker's claim expires and the project can be processed again
+        seen = SharedSeenStore(claims_dir, ttl=1)
+        assert seen.claim(PROJECT_IDS[0], 'w0')
+        assert not seen.claim(PROJECT_IDS[0], 'w1')
+    finally:
+        for coordinator in survivors:
+            coordinator.stop()
+        if crashing.is_alive():
+            crashing.kill()
+
+def test_stopped_worker_hands_over_right_away(tmp_path):
+    state_dir = str(tmp_path / 'workers')
+    workers = [ShardCoordinator(worker_id, state_dir=state_dir, membership_ttl=0).start() for worker_id in WORKERS]
+    assert workers[0].live_workers() == WORKERS
+    workers[2].stop()
+    assert workers[0].live_workers() == WORKERS[:2]
+    for coordinator in workers[:2]:
+        coordinator.stop()
+
+def test_skills_mode_splits_the_query(tmp_path):
+    state_dir = str(tmp_path / 'workers')
+    workers = [ShardCoordinator(worker_id, shard_mode='skills', state_dir=state_dir, membership_ttl=0).start()
+               for worker_id in WORKERS]
+    skills = [f"skill_{i}" for i in range(10)]
+    slices = [coordinator.shard_items(skills) for coordinator in workers]
+    assert sorted(skill for shard in slices for skill in shard) == sorted(skills)
+    assert all(slices)
+    # Every worker still owns all projects of its slice
+    assert all(coordinator.owns_project(project_id) for coordinator in workers for project_id in PROJECT_IDS[:5])
+    for coordinator in workers:
+        coordinator.stop()
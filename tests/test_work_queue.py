@@ -0,0 +1,181 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from work_queue import DONE, FAILED, IN_PROGRESS, PENDING, RetryPolicy, WorkQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / 'queue.sqlite3'), visibility_timeout=300, max_attempts=3)
+    yield work_queue
+    work_queue.close()
+
+def test_enqueue_ignores_known_projects(queue):
+    assert queue.enqueue(1, {'title': 'first'})
+    assert not queue.enqueue(1, {'title': 'second'})
+    assert queue.get(1)['payload'] == {'title': 'first'}
+    assert queue.stats()[PENDING] == 1
+
+def test_claim_complete(queue):
+    queue.enqueue(1, {'title': 'a'})
+    item = queue.claim('w0')
+    assert item == {'project_id': '1', 'payload': {'title': 'a'}, 'attempts': 1}
+    assert queue.get(1)['state'] == IN_PROGRESS
+    assert queue.get(1)['claimed_by'] == 'w0'
+    # Claimed items are invisible to other workers
+    assert queue.claim('w1') is None
+
+    queue.complete(1, {'score': 80})
+    done = queue.get(1)
+    assert done['state'] == DONE
+    assert done['result'] == {'score': 80}
+    assert queue.claim('w1') is None
+
+def test_claim_order(queue):
+    queue.enqueue(1, {})
+    queue.enqueue(2, {}, priority=5)
+    queue.enqueue(3, {})
+    assert [queue.claim()['project_id'] for _ in range(3)] == ['2', '1', '3']
+    assert queue.claim() is None
+
+def test_visibility_timeout_reclaim(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite3'), visibility_timeout=0.2)
+    queue.enqueue(1, {})
+    assert queue.claim('w0')['attempts'] == 1
+    assert queue.claim('w1') is None
+    time.sleep(0.3)
+    # The first worker didn't finish in time, another one takes the item over
+    item = queue.claim('w1')
+    assert item['project_id'] == '1'
+    assert item['attempts'] == 2
+    assert queue.get(1)['claimed_by'] == 'w1'
+    queue.close()
+
+def test_fail_retries_after_delay(queue):
+    queue.enqueue(1, {})
+    queue.claim()
+    assert queue.fail(1, 'timeout', delay=0.2) == PENDING
+    item = queue.get(1)
+    assert item['last_error'] == 'timeout'
+    assert item['claimed_by'] is None
+    assert queue.claim() is None
+    time.sleep(0.3)
+    assert queue.claim()['attempts'] == 2
+
+def test_fail_gives_up_after_max_attempts(queue):
+    queue.enqueue(1, {})
+    for attempt in range(1, 3):
+        queue.claim()
+        assert queue.fail(1, f'error {attempt}') == PENDING
+    queue.claim()
+    assert queue.fail(1, 'error 3') == FAILED
+    assert queue.claim() is None
+    assert queue.stats()[FAILED] == 1
+
+def test_fail_unknown_project(queue):
+    assert queue.fail(404, 'gone') == FAILED
+
+def test_requeue(queue):
+    queue.enqueue(1, {})
+    for _ in range(3):
+        queue.claim()
+        queue.fail(1, 'error')
+    assert queue.get(1)['state'] == FAILED
+    queue.enqueue(2, {})
+    queue.claim()
+    # Without project IDs only failed items are put back
+    assert queue.requeue() == 1
+    item = queue.get(1)
+    assert item['state'] == PENDING
+    assert item['attempts'] == 0
+    assert queue.claim()['project_id'] == '1'
+    # Given IDs are made pending right away, whatever their state
+    assert queue.requeue(['2'], reset_attempts=False) == 1
+    item = queue.claim()
+    assert item['project_id'] == '2'
+    assert item['attempts'] == 2
+
+def test_recover_by_worker_id(queue):
+    queue.enqueue(1, {})
+    queue.enqueue(2, {})
+    queue.claim('w0')
+    queue.claim('w1')
+    assert queue.recover('w0') == 1
+    assert queue.get(1)['state'] == PENDING
+    assert queue.get(2)['state'] == IN_PROGRESS
+    assert queue.claim('w0')['project_id'] == '1'
+
+def test_recover_dead_processes(queue):
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    queue.enqueue(1, {})
+    queue.enqueue(2, {})
+    queue.claim(f'pid_{process.pid}')
+    queue.claim()
+    # Only the item of the process that no longer exists
+    assert queue.recover() == 1
+    assert queue.get(1)['state'] == PENDING
+    assert queue.get(2)['state'] == IN_PROGRESS
+
+def test_reschedule(queue):
+    queue.enqueue(1, {'title': 'a'})
+    queue.claim()
+    queue.complete(1, {'score': 40})
+    assert queue.reschedule(1, {'title': 'a', 'rescore': True}, priority=-1)
+    item = queue.claim()
+    assert item['payload']['rescore']
+    assert item['attempts'] == 1
+    assert not queue.reschedule(2, {})
+
+def test_purge_done(queue):
+    queue.enqueue(1, {})
+    queue.enqueue(2, {})
+    queue.claim()
+    queue.complete(1)
+    assert queue.purge_done(older_than=3600) == 0
+    assert queue.purge_done(older_than=0) == 1
+    assert queue.get(1) is None
+    assert queue.get(2)['state'] == PENDING
+
+def test_retry_budget_is_shared(queue):
+    first = RetryPolicy(budget=2, budget_window=60, work_queue=queue)
+    second = RetryPolicy(budget=2, budget_window=60, work_queue=queue)
+    first.next_delay(1)
+    second.next_delay(1)
+    assert first.retries_scheduled == second.retries_scheduled == 1
+    # Both policies count into the queue's table, the budget is used up for both
+    first.next_delay(1)
+    second.next_delay(1)
+    assert first.retries_deferred == second.retries_deferred == 1
+
+def test_retry_budget_defers_instead_of_giving_up(queue):
+    policy = RetryPolicy(base_delay=1, budget=2, budget_window=60, work_queue=queue)
+    for project_id in range(3):
+        queue.enqueue(project_id, {})
+    delays = []
+    for project_id in range(3):
+        item = queue.claim()
+        delay = policy.next_delay(item['attempts'])
+        delays.append(delay)
+        assert queue.fail(item['project_id'], 'rate limited', delay=delay) == PENDING
+    assert all(0.5 <= delay <= 1 for delay in delays[:2])
+    # The third retry waits until the window has room again, plus its backoff
+    assert 59 <= delays[2] <= 61
+    assert policy.retries_scheduled == 2
+    assert policy.retries_deferred == 1
+    assert queue.stats()[FAILED] == 0
+
+def test_retry_budget_in_process():
+    policy = RetryPolicy(base_delay=0.01, budget=1, budget_window=0.2)
+    assert policy.next_delay(1) <= 0.01
+    # Deferred until the first retry leaves the window
+    assert policy.next_delay(1) >= 0.15
+    time.sleep(0.25)
+    assert policy.next_delay(1) <= 0.01
+
+def test_backoff_grows_and_is_capped():
+    policy = RetryPolicy(base_delay=5, max_delay=60)
+    for attempts, delay in ((1, 5), (2, 10), (3, 20), (10, 60)):
+        assert delay / 2 <= policy.backoff(attempts) <= delay
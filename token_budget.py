@@ -0,0 +1,245 @@
+"""
+Token accounting for the LLM calls and a token budget for project descriptions.
+
+Some postings paste whole specifications into the description, which made the
+ranking prompt (and its latency and cost) unbounded. condense() keeps a
+description within a token budget: it keeps whole sentences from the start
+(what the client wants) and from the end (requirements, questions, deadlines)
+and marks the gap with "[...]".
+
+TokenMeter records prompt and completion tokens and the estimated cost of
+every call per project (cache/token_usage.jsonl) and prints a short summary
+per cycle. Token counts come from the API response when it reports them,
+otherwise they are counted locally.
+
+Counting uses tiktoken when it is installed (pip install tiktoken) and falls
+back to a character/word heuristic that is usually within ~10% for English
+and German text.
+"""
+import json
+import math
+import re
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# USD per 1M tokens (prompt, completion); config.TOKEN_PRICES overrides/extends these
+DEFAULT_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+GAP_MARKER = '\n[...]\n'
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # Encodings are downloaded on first use, offline we fall back to the heuristic
+        print(f"⚠️ tiktoken unavailable, estimating tokens: {str(e)}")
+        return None
+
+def count_tokens(text: str, model: str = 'gpt-3.5-turbo') -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(max(len(text) / 4, len(text.split()) * 1.3))
+
+def count_message_tokens(messages: List[Dict], model: str = 'gpt-3.5-turbo') -> int:
+    """Prompt tokens of a chat request (content plus the per-message overhead of the chat format)"""
+    return sum(count_tokens(message.get('content') or '', model) + 4 for message in messages) + 3
+
+def _cut(text: str, budget: int, model: str) -> str:
+    """Hard cut for text without sentence boundaries"""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    return text[:budget * 4]
+
+def _sentences(text: str) -> List[str]:
+    return [part for part in re.split(r'(?<=[.!?:])\s+|\n+', text) if part.strip()]
+
+def condense(text: str, budget: int, model: str = 'gpt-3.5-turbo', head_share: float = 0.7) -> str:
+    """
+    Shorten text to roughly ``budget`` tokens by keeping whole sentences
+
+    Args:
+        text: Project description
+        budget: Maximum tokens of the result, None or 0 disables the limit
+        head_share: Share of the budget for sentences from the start, the rest is filled from the end
+
+    Returns:
+        The text itself if it fits, otherwise head + "[...]" + tail
+    """
+    if not text or not budget or count_tokens(text, model) <= budget:
+        return text
+    sentences = _sentences(text)
+    costs = [count_tokens(sentence, model) + 1 for sentence in sentences]
+    budget -= count_tokens(GAP_MARKER, model)
+
+    head, used = [], 0
+    for sentence, cost in zip(sentences, costs):
+        if used + cost > budget * head_share:
+            break
+        head.append(sentence)
+        used += cost
+    if not head:
+        return _cut(text, budget, model) + GAP_MARKER.rstrip()
+
+    tail = []
+    for sentence, cost in zip(reversed(sentences[len(head):]), reversed(costs[len(head):])):
+        if used + cost > budget:
+            break
+        tail.insert(0, sentence)
+        used += cost
+    return ' '.join(head) + GAP_MARKER + ' '.join(tail)
+
+class TokenMeter:
+    def __init__(self, prices: Dict[str, tuple] = None, log_path: Optional[str] = 'cache/token_usage.jsonl'):
+        """
+        Args:
+            prices: USD per 1M tokens (prompt, completion) per model, merged into DEFAULT_PRICES
+            log_path: JSONL file with one entry per call, None to disable
+        """
+        self.prices = dict(DEFAULT_PRICES)
+        self.prices.update(prices or {})
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.stats = self._empty_stats()
+        self.cycle_stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0, 'condensed': 0,
+                'stopped_early': 0}
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def record(self, project_id, model: str, messages: List[Dict], response=None, kind: str = 'ranking',
+               condensed: bool = False, usage=None, completion: str = None, stopped_early: bool = False,
+               seconds: float = None) -> Dict:
+        """
+        Record the tokens of one call
+
+        Args:
+            messages: The request messages, counted locally if the response has no usage
+            response: Chat completion response (its usage is preferred), None for failed calls
+            kind: 'ranking', 'ranking_first_pass' or 'bid'
+            condensed: Whether the description was shortened to fit the budget
+            usage: Usage of a streamed response (None when the stream was cancelled)
+            completion: Text of a streamed response, counted locally without usage
+            stopped_early: The stream was cancelled after the score
+            seconds: Latency of the call, written to the log
+
+        Returns:
+            Dict with prompt_tokens, completion_tokens and cost
+        """
+        usage = usage or getattr(response, 'usage', None)
+        if usage is not None and getattr(usage, 'prompt_tokens', None) is not None:
+            prompt_tokens = usage.prompt_tokens
+            completion_tokens = usage.completion_tokens or 0
+        else:
+            prompt_tokens = count_message_tokens(messages, model)
+            if completion is None and response is not None:
+                completion = response.choices[0].message.content
+            completion_tokens = count_tokens(completion or '', model)
+        metrics = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cost': self.cost(model, prompt_tokens, completion_tokens)
+        }
+        with self._lock:
+            for stats in (self.stats, self.cycle_stats):
+                stats['calls'] += 1
+                stats['prompt_tokens'] += prompt_tokens
+                stats['completion_tokens'] += completion_tokens
+                stats['cost'] += metrics['cost']
+                if condensed:
+                    stats['condensed'] += 1
+                if stopped_early:
+                    stats['stopped_early'] += 1
+        if self.log_path:
+            entry = {'project_id': project_id, 'timestamp': time.time(), 'kind': kind, 'model': model,
+                     'condensed': condensed, 'stopped_early': stopped_early, **metrics}
+            if seconds is not None:
+                entry['seconds'] = round(seconds, 3)
+            try:
+                Path(self.log_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except OSError as e:
+                print(f"⚠️ Could not write token log: {str(e)}")
+        return metrics
+
+    def cycle_report(self, reset: bool = True) -> Optional[str]:
+        """One line with the token numbers of the current cycle, None if there were no calls"""
+        with self._lock:
+            stats = self.cycle_stats
+            if reset:
+                self.cycle_stats = self._empty_stats()
+        if not stats['calls']:
+            return None
+        line = (f"Tokens: {stats['calls']} call(s), {stats['prompt_tokens']} prompt + "
+                f"{stats['completion_tokens']} completion, ${stats['cost']:.4f}")
+        if stats['condensed']:
+            line += f", {stats['condensed']} description(s) condensed"
+        if stats['stopped_early']:
+            line += f", {stats['stopped_early']} stopped after the score"
+        return line
+
+def summarize_log(log_path: str = 'cache/token_usage.jsonl') -> Optional[Dict]:
+    """Totals and per-project averages from the token log"""
+    totals = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0, 'condensed': 0}
+    projects = set()
+    try:
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                totals['calls'] += 1
+                totals['prompt_tokens'] += entry['prompt_tokens']
+                totals['completion_tokens'] += entry['completion_tokens']
+                totals['cost'] += entry['cost']
+                totals['condensed'] += int(entry.get('condensed', False))
+                projects.add(entry['project_id'])
+    except FileNotFoundError:
+        return None
+    if not totals['calls']:
+        return None
+    totals['projects'] = len(projects)
+    totals['cost_per_project'] = totals['cost'] / len(projects)
+    totals['prompt_tokens_per_call'] = totals['prompt_tokens'] / totals['calls']
+    return totals
+
+def from_config() -> TokenMeter:
+    import config
+    return TokenMeter(prices=getattr(config, 'TOKEN_PRICES', None))
+
+if __name__ == '__main__':
+    result = summarize_log()
+    if result is None:
+        print("No token log found (cache/token_usage.jsonl)")
+        raise SystemExit(1)
+    print(f"Calls:                  {result['calls']} for {result['projects']} project(s)")
+    print(f"Prompt tokens:          {result['prompt_tokens']} ({result['prompt_tokens_per_call']:.0f} per call)")
+    print(f"Completion tokens:      {result['completion_tokens']}")
+    print(f"Descriptions condensed: {result['condensed']}")
+    print(f"Cost:                   ${result['cost']:.4f} (${result['cost_per_project']:.5f} per project)")
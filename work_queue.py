@@ -0,0 +1,349 @@
+"""
+Durable on-disk work queue for projects waiting to be ranked.
+
+Projects that passed all filters are stored together with everything the
+ranking stage needs, so a crash or Ctrl-C loses nothing: after a restart the
+pending items are ranked without fetching or filtering them again.
+
+Item states:
+
+- ``pending``: waiting for a worker (``available_at`` may lie in the future)
+- ``in_progress``: claimed by a worker; if the worker doesn't finish within the
+  visibility timeout the item becomes claimable again. After a crash,
+  ``recover()`` makes the items of the crashed worker claimable right away.
+- ``done``: ranked, the ranking is stored in ``result``
+- ``failed``: gave up after ``max_attempts`` attempts
+
+The queue is a single SQLite file, so several worker processes can share it.
+Available items are claimed highest ``priority`` first, then oldest first.
+
+Failed attempts are not retried inline: ``RetryPolicy`` computes a jittered
+exponential backoff and the item is simply made invisible until then, so the
+polling loop moves on to the next project right away. Retries are capped by a
+budget per time window; when it is used up (e.g. the API is down), failed items
+are deferred until the window has room again instead of piling up more retries.
+Only items that used up ``max_attempts`` end up failed, ``requeue()`` puts them
+back.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+def _process_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # os.kill() would terminate the process on Windows, leave those items to the visibility timeout
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class RetryPolicy:
+    """Jittered exponential backoff with a global retry budget"""
+
+    def __init__(self, base_delay: float = 5, max_delay: float = 600, budget: int = 20,
+                 budget_window: float = 60, work_queue: 'WorkQueue' = None):
+        """
+        Args:
+            base_delay: Delay after the first failed attempt, doubled for every further attempt
+            max_delay: Upper bound for a single delay
+            budget: Retries allowed per ``budget_window`` seconds across all items; once it is
+                used up, failed items wait until the window has room again
+            budget_window: Window length in seconds for the retry budget
+            work_queue: Count the retries in this queue's database, so the budget is shared by
+                every process using the queue; without it only this process is counted
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.budget_window = budget_window
+        self.work_queue = work_queue
+        self._retry_times = []
+        self._lock = threading.Lock()
+        self.retries_scheduled = 0
+        self.retries_deferred = 0
+
+    def backoff(self, attempts: int) -> float:
+        """Equal jitter: half of the exponential delay is fixed, the other half random"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _take_retry(self) -> float:
+        if self.work_queue is not None:
+            return self.work_queue.take_retry(self.budget, self.budget_window)
+        now = time.time()
+        with self._lock:
+            # Retries are counted when they are issued, not when they are due
+            self._retry_times = [t for t in self._retry_times if t > now - self.budget_window]
+            if len(self._retry_times) >= self.budget:
+                return min(self._retry_times) + self.budget_window - now
+            self._retry_times.append(now)
+            return 0
+
+    def next_delay(self, attempts: int) -> float:
+        """
+        Delay before the next attempt of an item that failed ``attempts`` times
+
+        When the retry budget is used up, the item waits until the oldest retry leaves the
+        window, plus the backoff so the deferred items don't all come back at once.
+        """
+        wait = self._take_retry()
+        if wait > 0:
+            self.retries_deferred += 1
+            return wait + self.backoff(attempts)
+        self.retries_scheduled += 1
+        return self.backoff(attempts)
+
+class WorkQueue:
+    def __init__(self, db_path: str = 'cache/work_queue.sqlite3', visibility_timeout: float = 300,
+                 max_attempts: int = 5):
+        """
+        Open (and create if needed) the queue database
+
+        Args:
+            db_path: SQLite file holding the queue
+            visibility_timeout: Seconds an in-progress item stays invisible to other workers
+            max_attempts: Attempts before an item is marked as failed
+        """
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS work_items (
+                project_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                claimed_by TEXT,
+                last_error TEXT,
+                result TEXT,
+                priority REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_work_items_state_available
+                ON work_items (state, available_at);
+            CREATE TABLE IF NOT EXISTS retries (
+                issued_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_retries_issued_at ON retries (issued_at);
+        """)
+        # Queues created before priorities existed
+        columns = [row['name'] for row in self._conn.execute('PRAGMA table_info(work_items)')]
+        if 'priority' not in columns:
+            self._conn.execute('ALTER TABLE work_items ADD COLUMN priority REAL NOT NULL DEFAULT 0')
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def enqueue(self, project_id, payload: Dict, priority: float = 0) -> bool:
+        """Add a project; returns False if it is already queued (in any state)"""
+        now = time.time()
+        cursor = self._conn.execute(
+            """INSERT OR IGNORE INTO work_items
+               (project_id, payload, state, attempts, available_at, priority, created_at, updated_at)
+               VALUES (?, ?, ?, 0, ?, ?, ?, ?)""",
+            (str(project_id), json.dumps(payload, ensure_ascii=False), PENDING, now, priority, now, now)
+        )
+        return cursor.rowcount > 0
+
+    def claim(self, worker_id: str = None) -> Optional[Dict]:
+        """
+        Claim the available item with the highest priority (oldest first on ties)
+
+        Returns:
+            Dict with project_id, payload and attempts (already incremented for this
+            attempt), or None if nothing is available right now
+        """
+        worker_id = worker_id or f"pid_{os.getpid()}"
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._conn.execute(
+                """SELECT project_id, payload, attempts FROM work_items
+                   WHERE state IN (?, ?) AND available_at <= ?
+                   ORDER BY priority DESC, available_at LIMIT 1""",
+                (PENDING, IN_PROGRESS, now)
+            ).fetchone()
+            if row is None:
+                self._conn.execute('COMMIT')
+                return None
+            self._conn.execute(
+                """UPDATE work_items
+                   SET state = ?, attempts = attempts + 1, available_at = ?, claimed_by = ?, updated_at = ?
+                   WHERE project_id = ?""",
+                (IN_PROGRESS, now + self.visibility_timeout, worker_id, now, row['project_id'])
+            )
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        return {
+            'project_id': row['project_id'],
+            'payload': json.loads(row['payload']),
+            'attempts': row['attempts'] + 1
+        }
+
+    def recover(self, worker_id: str = None) -> int:
+        """
+        Make items left in progress by a crashed run claimable right away
+
+        Args:
+            worker_id: Recover the items of this worker (sharded workers keep their ID across
+                restarts); without it the items of processes that no longer exist are recovered
+
+        Returns:
+            Number of recovered items
+        """
+        rows = self._conn.execute(
+            "SELECT project_id, claimed_by FROM work_items WHERE state = ?", (IN_PROGRESS,)
+        ).fetchall()
+        if worker_id:
+            project_ids = [row['project_id'] for row in rows if row['claimed_by'] == worker_id]
+        else:
+            project_ids = [row['project_id'] for row in rows
+                           if (row['claimed_by'] or '').startswith('pid_') and row['claimed_by'][4:].isdigit()
+                           and not _process_alive(int(row['claimed_by'][4:]))]
+        if not project_ids:
+            return 0
+        now = time.time()
+        placeholders = ','.join('?' * len(project_ids))
+        cursor = self._conn.execute(
+            f"""UPDATE work_items SET state = ?, available_at = ?, claimed_by = NULL, updated_at = ?
+                WHERE state = ? AND project_id IN ({placeholders})""",
+            (PENDING, now, now, IN_PROGRESS, *project_ids)
+        )
+        return cursor.rowcount
+
+    def peek(self, limit: int = 10) -> List[Dict]:
+        """Next available pending items in claim order, without claiming them"""
+        rows = self._conn.execute(
+            """SELECT project_id, payload, attempts FROM work_items
+               WHERE state = ? AND available_at <= ?
+               ORDER BY priority DESC, available_at LIMIT ?""",
+            (PENDING, time.time(), limit)
+        ).fetchall()
+        return [{'project_id': row['project_id'], 'payload': json.loads(row['payload']), 'attempts': row['attempts']}
+                for row in rows]
+
+    def complete(self, project_id, result: Dict = None) -> None:
+        self._conn.execute(
+            "UPDATE work_items SET state = ?, result = ?, last_error = NULL, updated_at = ? WHERE project_id = ?",
+            (DONE, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+             time.time(), str(project_id))
+        )
+
+    def take_retry(self, budget: int, window: float) -> float:
+        """
+        Use up one of ``budget`` retries per ``window`` seconds (shared by all processes)
+
+        Returns:
+            0 if the retry was taken, otherwise seconds until the oldest retry leaves the window
+        """
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.execute("DELETE FROM retries WHERE issued_at <= ?", (now - window,))
+            used, oldest = self._conn.execute("SELECT COUNT(*), MIN(issued_at) FROM retries").fetchone()
+            if used < budget:
+                self._conn.execute("INSERT INTO retries (issued_at) VALUES (?)", (now,))
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        return 0 if used < budget else oldest + window - now
+
+    def fail(self, project_id, error: str, delay: float = 0) -> str:
+        """
+        Record a failed attempt; the item is retried after ``delay`` seconds unless
+        it has used up its attempts
+
+        Returns:
+            The new state of the item (pending or failed)
+        """
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT attempts FROM work_items WHERE project_id = ?", (str(project_id),)
+        ).fetchone()
+        if row is None:
+            return FAILED
+        state = FAILED if row['attempts'] >= self.max_attempts else PENDING
+        self._conn.execute(
+            """UPDATE work_items SET state = ?, available_at = ?, last_error = ?, claimed_by = NULL, updated_at = ?
+               WHERE project_id = ?""",
+            (state, now + delay, str(error)[:1000], now, str(project_id))
+        )
+        return state
+
+    def requeue(self, project_ids: List = None, reset_attempts: bool = True) -> int:
+        """Put failed (or the given) items back to pending; returns the number of items"""
+        now = time.time()
+        attempts_sql = ', attempts = 0' if reset_attempts else ''
+        if project_ids is None:
+            cursor = self._conn.execute(
+                f"UPDATE work_items SET state = ?, available_at = ?, updated_at = ?{attempts_sql} WHERE state = ?",
+                (PENDING, now, now, FAILED)
+            )
+        else:
+            placeholders = ','.join('?' * len(project_ids))
+            cursor = self._conn.execute(
+                f"""UPDATE work_items SET state = ?, available_at = ?, updated_at = ?{attempts_sql}
+                    WHERE project_id IN ({placeholders})""",
+                (PENDING, now, now, *[str(pid) for pid in project_ids])
+            )
+        return cursor.rowcount
+
+    def reschedule(self, project_id, payload: Dict, priority: float = 0) -> bool:
+        """Replace the payload of an item and make it pending again; False if it doesn't exist"""
+        now = time.time()
+        cursor = self._conn.execute(
+            """UPDATE work_items
+               SET payload = ?, state = ?, attempts = 0, available_at = ?, priority = ?, claimed_by = NULL,
+                   last_error = NULL, updated_at = ?
+               WHERE project_id = ?""",
+            (json.dumps(payload, ensure_ascii=False), PENDING, now, priority, now, str(project_id))
+        )
+        return cursor.rowcount > 0
+
+    def get(self, project_id) -> Optional[Dict]:
+        row = self._conn.execute("SELECT * FROM work_items WHERE project_id = ?", (str(project_id),)).fetchone()
+        if row is None:
+            return None
+        item = dict(row)
+        item['payload'] = json.loads(item['payload'])
+        item['result'] = json.loads(item['result']) if item['result'] else None
+        return item
+
+    def stats(self) -> Dict[str, int]:
+        """Number of items per state"""
+        counts = {PENDING: 0, IN_PROGRESS: 0, DONE: 0, FAILED: 0}
+        for row in self._conn.execute("SELECT state, COUNT(*) AS n FROM work_items GROUP BY state"):
+            counts[row['state']] = row['n']
+        return counts
+
+    def purge_done(self, older_than: float = 7 * 24 * 3600) -> int:
+        """Delete finished items older than ``older_than`` seconds"""
+        cursor = self._conn.execute(
+            "DELETE FROM work_items WHERE state = ? AND updated_at < ?",
+            (DONE, time.time() - older_than)
+        )
+        return cursor.rowcount